@@ -0,0 +1,302 @@
+"""
+Benchmark compile time, throughput, and memory use across backends.
+
+Each configuration (circuit, simulator, wire format, and compile profile)
+is measured in a fresh Python process so that its peak memory use can be
+reported on its own. Simulators whose tools are not installed are skipped. Results are
+written as JSON so that they can be compared between releases.
+
+Run from the repository root:
+
+    python benchmarks/benchmark.py --output benchmark.json
+    python benchmarks/benchmark.py --circuits c17 c880 --simulators native
+    python benchmarks/benchmark.py --simulators verilator \
+        --profiles default fast-compile fast-run
+
+"""
+import argparse
+import copy
+import json
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import circuitgraph as cg
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from circuitsim import CircuitSimulator  # noqa: E402
+from circuitsim.simulators import (  # noqa: E402
+    compile_args,
+    compile_profiles,
+    post_compile_args,
+    simulate_args,
+    wire_formats,
+)
+
+default_circuits = [
+    "c17",
+    "c432",
+    "c499",
+    "c880",
+    "c1355",
+    "c1908",
+    "c2670",
+    "c3540",
+    "c5315",
+    "c6288",
+    "c7552",
+    "b18_Cg",
+]
+default_simulators = ["native", "iverilog", "verilator", "vcs"]
+default_batch_sizes = [1, 100, 10000]
+default_num_processes = [1, 4]
+default_profiles = ["default"]
+
+
+def available(simulator):
+    """
+    Check if the tools to compile and run a simulator are installed.
+
+    Parameters
+    ----------
+    simulator: str
+            The simulator to check.
+
+    Returns
+    -------
+    bool
+            True if the simulator can be used.
+
+    """
+    if simulator == "native":
+        return True
+    commands = [compile_args[simulator], simulate_args[simulator]]
+    if simulator in post_compile_args:
+        commands.append(post_compile_args[simulator])
+    # Executables that the compiler builds are not installed tools
+    tools = [c[0] for c in commands if not c[0].startswith("./")]
+    return all(shutil.which(t) is not None for t in tools)
+
+
+def _peak_rss():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if platform.system() == "Darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+
+def _timed(f, *args, **kwargs):
+    start = time.perf_counter()
+    result = f(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def measure(
+    circuit, simulator, wire_format, profile, batch_sizes, num_processes, repeat
+):
+    """
+    Measure a single configuration.
+
+    Parameters
+    ----------
+    circuit: str
+            The name of the `circuitgraph` library circuit.
+    simulator: str
+            The simulator to use.
+    wire_format: str
+            The wire format to use.
+    profile: str
+            The compile profile to use.
+    batch_sizes: list of int
+            The numbers of vectors to simulate per call.
+    num_processes: list of int
+            The numbers of simulation processes to use per call.
+    repeat: int
+            The number of times to repeat each measurement. The fastest
+            time is reported.
+
+    Returns
+    -------
+    dict
+            The measurements. `phases` has the wall-clock time to load the
+            circuit, construct the simulator, and make the first call, which
+            compiles it, and `first_call` the `stats` breakdown of that
+            call. Each throughput point has the breakdown of its last call
+            in `stats`, and `stats` has the totals over every call.
+
+    """
+    phases = {}
+    phases["load"], ckt = _timed(cg.from_lib, circuit)
+    phases["setup"], sim = _timed(
+        CircuitSimulator,
+        ckt,
+        simulator=simulator,
+        wire_format=wire_format,
+        compile_profile=profile,
+    )
+
+    rng = np.random.default_rng(0)
+    vector = dict(zip(sim.inputs, rng.integers(0, 2, len(sim.inputs)).tolist()))
+    phases["first_call"], _ = _timed(sim.simulate, [vector])
+    first_call = copy.deepcopy(sim.stats.last)
+    compile_rss = _peak_rss()
+
+    throughput = []
+    for batch_size in batch_sizes:
+        vectors = rng.integers(0, 2, (batch_size, len(sim.inputs)), dtype=np.uint8)
+        dict_vectors = [dict(zip(sim.inputs, v)) for v in vectors.tolist()]
+        for p in num_processes if simulator != "native" else [1]:
+            for api, f, v in [
+                ("simulate", sim.simulate, dict_vectors),
+                ("simulate_array", sim.simulate_array, vectors),
+            ]:
+                elapsed = min(_timed(f, v, num_processes=p)[0] for _ in range(repeat))
+                throughput.append(
+                    {
+                        "api": api,
+                        "batch_size": batch_size,
+                        "num_processes": p,
+                        "seconds": elapsed,
+                        "vectors_per_second": batch_size / elapsed,
+                        "stats": copy.deepcopy(sim.stats.last),
+                    }
+                )
+    sim.close()
+
+    return {
+        "circuit": circuit,
+        "nodes": len(ckt),
+        "inputs": len(sim.inputs),
+        "outputs": len(sim.outputs),
+        "simulator": simulator,
+        "wire_format": wire_format,
+        "profile": profile,
+        "phases": phases,
+        "first_call": first_call,
+        "throughput": throughput,
+        "stats": copy.deepcopy(sim.stats.total),
+        "peak_rss": {"compile": compile_rss, "total": _peak_rss()},
+    }
+
+
+def configurations(circuits, simulators, profiles):
+    """
+    List the configurations to benchmark.
+
+    Parameters
+    ----------
+    circuits: list of str
+            The circuits to benchmark.
+    simulators: list of str
+            The simulators to benchmark. Simulators that are not installed
+            are skipped.
+    profiles: list of str
+            The compile profiles to benchmark. Profiles only change how
+            verilator compiles, so other simulators use the default.
+
+    Returns
+    -------
+    list of tuple of str, str, str, str
+            The circuit, simulator, wire format, and compile profile of each
+            configuration.
+
+    """
+    configs = []
+    for simulator in simulators:
+        if not available(simulator):
+            print(f"Skipping {simulator}: not installed", file=sys.stderr)
+            continue
+        if simulator == "native":
+            formats = ["packed"]
+        else:
+            formats = [f for f, s in wire_formats.items() if simulator in s]
+        for circuit in circuits:
+            for wire_format in formats:
+                for profile in profiles if simulator == "verilator" else ["default"]:
+                    configs.append((circuit, simulator, wire_format, profile))
+    return configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--circuits", nargs="+", default=default_circuits)
+    parser.add_argument("--simulators", nargs="+", default=default_simulators)
+    parser.add_argument(
+        "--batch-sizes", nargs="+", type=int, default=default_batch_sizes
+    )
+    parser.add_argument(
+        "--num-processes", nargs="+", type=int, default=default_num_processes
+    )
+    parser.add_argument(
+        "--profiles", nargs="+", choices=compile_profiles, default=default_profiles
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--timeout", type=float, default=3600)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        circuit, simulator, wire_format, profile = json.loads(args.worker)
+        result = measure(
+            circuit,
+            simulator,
+            wire_format,
+            profile,
+            args.batch_sizes,
+            args.num_processes,
+            args.repeat,
+        )
+        json.dump(result, sys.stdout)
+        return
+
+    results = []
+    for config in configurations(args.circuits, args.simulators, args.profiles):
+        print("Benchmarking {} with {} ({}, {})".format(*config), file=sys.stderr)
+        command = [
+            sys.executable,
+            __file__,
+            "--worker",
+            json.dumps(config),
+            "--batch-sizes",
+            *map(str, args.batch_sizes),
+            "--num-processes",
+            *map(str, args.num_processes),
+            "--repeat",
+            str(args.repeat),
+        ]
+        try:
+            res = subprocess.run(
+                command,
+                stdout=subprocess.PIPE,
+                universal_newlines=True,
+                timeout=args.timeout,
+            )
+        except subprocess.TimeoutExpired:
+            print("Timed out", file=sys.stderr)
+            continue
+        if res.returncode != 0:
+            print("Failed", file=sys.stderr)
+            continue
+        results.append(json.loads(res.stdout))
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
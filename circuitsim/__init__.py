@@ -35,6 +35,12 @@ True
 
 """
 
+from circuitsim.cache import CompileCache, ResultCache
+from circuitsim.costs import CostModel
+from circuitsim.equivalence import check_equivalence
 from circuitsim.simulation import CircuitSimulator
 from circuitsim.simulators import SimulationCompilationError
 from circuitsim.simulators import SimulationExecutionError
+from circuitsim.simulators import set_max_processes
+from circuitsim.snapshot import NetlistSnapshot
+from circuitsim.stats import SimulationStats
@@ -0,0 +1,322 @@
+"""Caches of compiled simulations and simulation results."""
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+version_args = {
+    "vcs": ["vcs", "-full64", "-ID"],
+    "iverilog": ["iverilog", "-V"],
+    "verilator": ["verilator", "--version"],
+}
+compiled_artifacts = {
+    "vcs": ["simv", "simv.daidir"],
+    "iverilog": ["a.out"],
+    "verilator": ["obj_dir/Vtb"],
+}
+
+
+@lru_cache(maxsize=None)
+def tool_version(simulator):
+    """
+    Get the version string of a simulator.
+
+    Parameters
+    ----------
+    simulator: str
+            The simulator to query.
+
+    Returns
+    -------
+    str
+            The output of the simulator's version command.
+
+    """
+    # Some tools (e.g., iverilog) exit with an error after printing their
+    # version because no sources were given, so the return code is ignored.
+    res = subprocess.run(
+        version_args[simulator],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+    )
+    return res.stdout
+
+
+def _default_cache_dir():
+    if "CIRCUITSIM_CACHE_DIR" in os.environ:
+        return Path(os.environ["CIRCUITSIM_CACHE_DIR"])
+    cache_home = os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")
+    return Path(cache_home) / "circuitsim"
+
+
+def _size(path):
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def _entry_size(key, value):
+    # The dictionary's own storage per entry is not included.
+    return sys.getsizeof(key) + sys.getsizeof(value)
+
+
+class CompileCache:
+    """
+    Content-addressed cache of compiled simulations.
+
+    Entries are keyed by a hash of the simulator, its version, the compile
+    commands, and the contents of every compiled source, so any process
+    compiling the same design with the same tool can reuse the result.
+    The least recently used entries are evicted once the cache grows past
+    its size limit.
+
+    """
+
+    def __init__(self, path=None, max_size=2**30):
+        """
+        Open a compile cache.
+
+        Parameters
+        ----------
+        path: str or pathlib.Path
+                The directory to store entries in. If `None`, the
+                `CIRCUITSIM_CACHE_DIR` environment variable is used if set,
+                otherwise `~/.cache/circuitsim`.
+        max_size: int
+                The maximum total size of the cache, in bytes.
+
+        """
+        self.path = Path(path) if path is not None else _default_cache_dir()
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+
+    def key(self, simulator, commands, sources):
+        """
+        Compute the key of a compilation.
+
+        Parameters
+        ----------
+        simulator: str
+                The simulator used to compile.
+        commands: list of list of str
+                The commands used to compile.
+        sources: list of str or pathlib.Path
+                The files that are compiled.
+
+        Returns
+        -------
+        str
+                The hex digest identifying the compilation.
+
+        """
+        h = hashlib.sha256()
+        h.update(simulator.encode())
+        h.update(tool_version(simulator).encode())
+        for command in commands:
+            h.update("\0".join(command).encode())
+        for source in sources:
+            with open(source, "rb") as f:
+                h.update(hashlib.sha256(f.read()).digest())
+        return h.hexdigest()
+
+    def fetch(self, key, simulator, working_dir):
+        """
+        Copy a cached compilation into a working directory.
+
+        Parameters
+        ----------
+        key: str
+                The key returned by `key`.
+        simulator: str
+                The simulator used to compile.
+        working_dir: str or pathlib.Path
+                The directory to copy the compiled artifacts to.
+
+        Returns
+        -------
+        bool
+                True if the entry was found and copied.
+
+        """
+        entry = self.path / key
+        working_dir = Path(working_dir)
+        try:
+            for artifact in compiled_artifacts[simulator]:
+                src = entry / artifact
+                dst = working_dir / artifact
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                if src.is_dir():
+                    if dst.exists():
+                        shutil.rmtree(dst)
+                    shutil.copytree(src, dst)
+                else:
+                    shutil.copy2(src, dst)
+            # The modification time of an entry records when it was last used.
+            os.utime(entry)
+        except OSError:
+            return False
+        return True
+
+    def store(self, key, simulator, working_dir):
+        """
+        Add a compilation to the cache.
+
+        Parameters
+        ----------
+        key: str
+                The key returned by `key`.
+        simulator: str
+                The simulator used to compile.
+        working_dir: str or pathlib.Path
+                The directory that the simulation was compiled in.
+
+        """
+        working_dir = Path(working_dir)
+        # Build the entry under a temporary name and rename it into place so
+        # that concurrent readers never see a partial entry.
+        tmp = self.path / f".tmp_{uuid.uuid4().hex}"
+        try:
+            for artifact in compiled_artifacts[simulator]:
+                src = working_dir / artifact
+                dst = tmp / artifact
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                if src.is_dir():
+                    shutil.copytree(src, dst)
+                else:
+                    shutil.copy2(src, dst)
+            os.rename(tmp, self.path / key)
+        except OSError:
+            # Another process stored the same entry first.
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until under `max_size`."""
+        entries = []
+        for entry in self.path.iterdir():
+            if entry.name.startswith(".tmp_"):
+                continue
+            try:
+                entries.append((entry.stat().st_mtime, _size(entry), entry))
+            except OSError:
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        """Remove every entry."""
+        for entry in self.path.iterdir():
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+class ResultCache:
+    """
+    In-memory cache of simulation results.
+
+    Entries map the packed input bits of a vector to the packed output bits
+    that it produced. The least recently used entries are evicted once the
+    cache grows past its size limit. A cache holds the results of a single
+    circuit, so it should not be shared between simulators. It can be used
+    from several threads at once.
+
+    Attributes
+    ----------
+    hits: int
+            The number of lookups that found a result.
+    misses: int
+            The number of lookups that did not find a result.
+    size: int
+            The approximate memory used by the entries, in bytes.
+
+    """
+
+    def __init__(self, max_size=2**26):
+        """
+        Create an empty result cache.
+
+        Parameters
+        ----------
+        max_size: int
+                The maximum approximate memory used by the entries, in
+                bytes.
+
+        """
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return (
+            f"ResultCache(entries={len(self)}, size={self.size}, "
+            f"hits={self.hits}, misses={self.misses})"
+        )
+
+    def get(self, key):
+        """
+        Look up a result.
+
+        Parameters
+        ----------
+        key: bytes
+                The packed input bits.
+
+        Returns
+        -------
+        bytes or None
+                The packed output bits, or `None` if the vector was not
+                cached.
+
+        """
+        with self._lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """
+        Add a result, evicting the least recently used entries if needed.
+
+        Parameters
+        ----------
+        key: bytes
+                The packed input bits.
+        value: bytes
+                The packed output bits.
+
+        """
+        with self._lock:
+            if key in self.entries:
+                self.size -= _entry_size(key, self.entries.pop(key))
+            self.entries[key] = value
+            self.size += _entry_size(key, value)
+            while self.size > self.max_size and self.entries:
+                self.size -= _entry_size(*self.entries.popitem(last=False))
+
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        with self._lock:
+            self.entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
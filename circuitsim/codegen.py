@@ -1,6 +1,11 @@
 """Verilog testbench code generation."""
 import uuid
 
+import circuitgraph as cg
+from natsort import natsorted
+
+from circuitsim.snapshot import NetlistSnapshot, gate_types
+
 
 def _uniquify(s, l):
     while s in l:
@@ -8,10 +13,266 @@ def _uniquify(s, l):
     return s
 
 
-def generate_testbench(output_dir, name, inputs, outputs, simulator):
+def _net(n):
+    # Escaped identifiers must be terminated by whitespace
+    return n + " " if n.startswith("\\") else n
+
+
+def _unique_name(n, used):
+    # Like `circuitgraph.Circuit.uid`, so that names are legal Verilog
+    # identifiers and do not change between runs
+    name = n
+    i = 0
+    while name in used:
+        name = f"{n}_{i}"
+        i += 1
+    used.add(name)
+    return name
+
+
+def _snapshot_statements(snapshot):
+    """Ports, wires, and instances of a snapshot's netlist."""
+    names = [_net(n) for n in snapshot.nodes]
+    used = set(snapshot.nodes)
+    offsets = snapshot.fanin_offsets.tolist()
+    fanin = snapshot.fanin.tolist()
+    wires = names[snapshot.num_inputs :]
+    insts = []
+    for i, t in enumerate(snapshot.types.tolist()):
+        t = gate_types[t]
+        if t == "input":
+            continue
+        if t in ["0", "1", "x"]:
+            insts.append(f"assign {names[i]} = 1'b{t}")
+        elif offsets[i] < offsets[i + 1]:
+            gate = _unique_name(f"g_{len(insts)}", used)
+            args = ", ".join(names[f] for f in fanin[offsets[i] : offsets[i + 1]])
+            insts.append(f"{t} {gate}({names[i]}, {args})")
+    inputs = names[: snapshot.num_inputs]
+    outputs = [names[o] for o in snapshot.output_index.tolist()]
+    return inputs, outputs, wires, insts
+
+
+def generate_netlist(output_dir, ckt):
+    """
+    Write a circuit as a gate-level Verilog netlist.
+
+    Unlike `circuitgraph.to_file`, the output only depends on the structure
+    of the circuit, so identical circuits always produce identical files.
+
+    Parameters
+    ----------
+    output_dir: pathlib.Path
+            Path to save the netlist to. The file is named after the circuit.
+    ckt: circuitgraph.Circuit or circuitsim.snapshot.NetlistSnapshot
+            The circuit to write. Snapshots are written directly from their
+            arrays, in level order.
+
+    """
+    if isinstance(ckt, NetlistSnapshot):
+        inputs, outputs, wires, insts = _snapshot_statements(ckt)
+    elif ckt.blackboxes:
+        cg.to_file(ckt, output_dir / f"{ckt.name}.v")
+        return
+    else:
+        inputs = [_net(i) for i in natsorted(ckt.inputs())]
+        outputs = [_net(o) for o in natsorted(ckt.outputs())]
+        wires = []
+        insts = []
+        for n in ckt.nodes():
+            t = ckt.type(n)
+            if t == "input":
+                continue
+            wires.append(_net(n))
+            if t in ["0", "1", "x"]:
+                insts.append(f"assign {_net(n)} = 1'b{t}")
+            elif ckt.fanin(n):
+                fanin = ", ".join(_net(f) for f in sorted(ckt.fanin(n)))
+                gate = ckt.uid(f"g_{len(insts)}")
+                insts.append(f"{t} {gate}({_net(n)}, {fanin})")
+
+    verilog = f"module {ckt.name} ("
+    verilog += ", ".join(inputs + outputs)
+    verilog += ");\n"
+    verilog += "".join(f"  input {i};\n" for i in inputs)
+    verilog += "\n"
+    verilog += "".join(f"  output {o};\n" for o in outputs)
+    verilog += "\n"
+    verilog += "".join(f"  wire {w};\n" for w in wires)
+    verilog += "\n"
+    verilog += "".join(f"  {inst};\n" for inst in insts)
+    verilog += "endmodule\n"
+
+    with open(output_dir / f"{ckt.name}.v", "w") as f:
+        f.write(verilog)
+
+
+def _generator(used, num_inputs, input_vector, ret, start, splitmix64):
+    """Verilog declarations and statements generating vectors."""
+    num_words = max(1, -(-num_inputs // 64))
+    mode = _unique_name("generate_mode", used)
+    count = _unique_name("generate_count", used)
+    index = _unique_name("generate_index", used)
+    seed = _unique_name("generate_seed", used)
+    counter = _unique_name("generate_counter", used)
+    random_bits = _unique_name("random_bits", used)
+    v = f"  integer {mode};\n"
+    v += f"  reg [63:0] {start};\n"
+    v += f"  reg [63:0] {count};\n"
+    v += f"  reg [63:0] {index};\n"
+    v += f"  reg [63:0] {seed};\n"
+    v += f"  reg [63:0] {counter};\n"
+    v += f"  reg [{64 * num_words - 1}:0] {random_bits};\n\n"
+    v += f"  function [63:0] {splitmix64};\n"
+    v += "    input [63:0] x;\n"
+    v += "    reg [63:0] z;\n"
+    v += "    begin\n"
+    v += "      z = (x ^ (x >> 30)) * 64'hbf58476d1ce4e5b9;\n"
+    v += "      z = (z ^ (z >> 27)) * 64'h94d049bb133111eb;\n"
+    v += f"      {splitmix64} = z ^ (z >> 31);\n"
+    v += "    end\n"
+    v += "  endfunction\n\n"
+    v += "  initial begin\n"
+    v += f'    if (!$value$plusargs("generate=%d", {mode})) {mode} = 0;\n'
+    v += f'    if (!$value$plusargs("start=%h", {start})) {start} = 0;\n'
+    v += f'    if (!$value$plusargs("count=%h", {count})) {count} = 0;\n'
+    v += f'    if (!$value$plusargs("seed=%h", {seed})) {seed} = 0;\n'
+    v += f"    {index} = 0;\n"
+    v += "  end\n\n"
+
+    decls = v
+    v = f"    if ({mode} != 0) begin\n"
+    v += f"      if ({index} == {count})\n"
+    v += f"        {ret} = 0;\n"
+    v += "      else begin\n"
+    v += f"        {counter} = {start} + {index};\n"
+    v += f"        if ({mode} == 1) begin\n"
+    # Each word only depends on its index, so that any range of patterns
+    # can be generated independently (see circuitsim.patterns).
+    v += f"          {counter} = {counter} * 64'd{num_words};\n"
+    for w in range(num_words):
+        v += (
+            f"          {random_bits}[{64 * w + 63}:{64 * w}] = {splitmix64}("
+            f"{seed} + ({counter} + 64'd{w + 1}) * 64'h9e3779b97f4a7c15);\n"
+        )
+    # The first input takes the least significant random bit
+    bits = ", ".join(f"{random_bits}[{i}]" for i in range(num_inputs))
+    v += f"          {input_vector} = {{ {bits} }};\n"
+    v += "        end\n"
+    v += "        else\n"
+    if num_inputs <= 64:
+        v += f"          {input_vector} = {counter}[{num_inputs - 1}:0];\n"
+    else:
+        v += (
+            f"          {input_vector} = "
+            f"{{ {{{num_inputs - 64}{{1'b0}}}}, {counter} }};\n"
+        )
+    v += f"        {index} = {index} + 64'd1;\n"
+    v += f"        {ret} = 1;\n"
+    v += "      end\n"
+    v += "    end\n"
+    return decls, v
+
+
+def _reducer(used, outputs, output_concat, start, splitmix64, outfile_pointer):
+    """Verilog declarations and statements reducing the outputs."""
+    mode = _unique_name("reduce_mode", used)
+    index = _unique_name("reduce_index", used)
+    values = _unique_name("reduce_values", used)
+    reduce_hash = _unique_name("reduce_hash", used)
+    reduce_outputs = _unique_name("reduce_outputs", used)
+    mask = _unique_name("reduce_mask", used)
+    expected = _unique_name("reduce_expected", used)
+    j = _unique_name("reduce_j", used)
+    n = len(outputs)
+    # Loops over the outputs keep the testbench small for wide circuits.
+    loop = f"for ({j} = 0; {j} < {n}; {j} = {j} + 1)"
+    v = f"  integer {mode};\n"
+    v += f"  integer {j};\n"
+    v += f"  reg [63:0] {index};\n"
+    v += f"  reg [63:0] {reduce_hash};\n"
+    v += f"  reg [63:0] {values} [0:{n - 1}];\n"
+    v += f"  reg [{n - 1}:0] {mask};\n"
+    v += f"  reg [{n - 1}:0] {expected};\n"
+    v += f"  wire [{n - 1}:0] {reduce_outputs};\n"
+    v += f"  assign {reduce_outputs} = {output_concat};\n\n"
+    v += "  initial begin\n"
+    v += f'    if (!$value$plusargs("reduce=%d", {mode})) {mode} = 0;\n'
+    v += f'    if (!$value$plusargs("mask=%h", {mask})) {mask} = 0;\n'
+    v += f'    if (!$value$plusargs("expected=%h", {expected})) {expected} = 0;\n'
+    v += f"    {index} = 0;\n"
+    v += f"    {loop}\n"
+    v += f"      {values}[{j}] = 0;\n"
+    v += "  end\n\n"
+    decls = v
+
+    # Reductions replace the record of each vector. The first output is the
+    # most significant bit of the output vector.
+    bit = f"{reduce_outputs}[{n - 1} - {j}]"
+    v = f"      if ({mode} == 1) begin\n"
+    # Signatures are position dependent, and each shard's part only depends
+    # on its own vectors, so shards can be combined with xor.
+    v += (
+        f"        {reduce_hash} = {splitmix64}"
+        f"(({start} + {index} + 64'd1) * 64'h9e3779b97f4a7c15);\n"
+    )
+    v += f"        {loop}\n"
+    v += f"          if ({bit} != 0) {values}[{j}] = {values}[{j}] ^ {reduce_hash};\n"
+    v += "      end\n"
+    v += f"      else if ({mode} == 2) begin\n"
+    v += f"        {loop}\n"
+    v += f"          if ({bit} != 0) {values}[{j}] = {values}[{j}] + 64'd1;\n"
+    v += "      end\n"
+    match = f"((({reduce_outputs} ^ {expected}) & {mask}) == {n}'d0)"
+    v += f"      else if ({mode} != 0 && ({mode} == 3) == {match})\n"
+    v += f'        $fdisplay({outfile_pointer}, "%h", {start} + {index});\n'
+    v += f"      {index} = {index} + 64'd1;\n"
+    v += f"      if ({mode} == 0) begin\n"
+    update = v
+
+    v = f"      if ({mode} == 1 || {mode} == 2) begin\n"
+    v += f"        {loop}\n"
+    v += f'          $fdisplay({outfile_pointer}, "%h", {values}[{j}]);\n'
+    v += "      end\n"
+    return decls, update, v
+
+
+def _display(outfile_pointer, hex_format, value, indent):
+    """Verilog statements writing a value in the requested format."""
+    v = f"{indent}if ({hex_format} != 0)\n"
+    v += f'{indent}  $fdisplay({outfile_pointer}, "%h", {value});\n'
+    v += f"{indent}else\n"
+    v += f'{indent}  $fdisplay({outfile_pointer}, "%b", {value});\n'
+    return v
+
+
+def generate_testbench(
+    output_dir, name, inputs, outputs, simulator, nets=None, state=None
+):
     """
     Generate testbench code that can be used to simulate a circuit.
 
+    If `nets` is given, running the simulation with the `+observe` plusarg
+    records the value of those nets, read through hierarchical references,
+    instead of the outputs.
+
+    If `state` is given, the module is simulated sequentially: after each
+    vector, the value of each D port is fed back to its Q port. The first
+    record of the input file then holds the initial values of the Q ports.
+
+    Otherwise, the testbench can generate its own vectors instead of
+    reading them: running with `+generate=1` applies the pseudorandom
+    patterns of `circuitsim.patterns.random_patterns` and `+generate=2` the
+    binary counter of `circuitsim.patterns.exhaustive_patterns`, starting
+    at pattern `+start=<hex>`, for `+count=<hex>` patterns, with the seed
+    `+seed=<hex>`. It can also reduce the outputs instead of recording
+    them: `+reduce=1` records the signature of each output, `+reduce=2` the
+    number of vectors for which each output is 1 (both in hex, one output
+    per line, once the input is exhausted), and `+reduce=3` and
+    `+reduce=4` the index (in hex) of each vector whose outputs do and do
+    not match `+expected=<hex>` in the bits set in `+mask=<hex>`. Vectors
+    are indexed from `+start=<hex>`. See `circuitsim.simulators.reduce_bits`.
+
     Parameters
     ----------
     output_dir: pathlib.Path
@@ -24,6 +285,10 @@ def generate_testbench(output_dir, name, inputs, outputs, simulator):
             The outputs to the module.
     simulator: str
             The simulator tool to generate a testbench for.
+    nets: list of str
+            The nets of the module that can be observed.
+    state: list of tuple of str, str
+            The D and Q ports of each state element of the module.
 
     Returns
     -------
@@ -31,19 +296,24 @@ def generate_testbench(output_dir, name, inputs, outputs, simulator):
             The generated testbench code.
 
     """
+    d_ports = [d for d, _ in state or []]
+    q_ports = [q for _, q in state or []]
+    tick = _uniquify("tick", inputs + outputs)
     if simulator == "verilator":
-        tick = _uniquify("tick", inputs + outputs)
         tb = f"module {name}_tb({tick});\n\n"
         tb += f"  input {tick};\n"
-        first_sim = _uniquify("first_sim", inputs + outputs)
-        tb += f"  reg {first_sim};\n\n"
     else:
         tb = "module tb;\n\n"
+        tb += f"  reg {tick};\n"
+    first_sim = _uniquify("first_sim", inputs + outputs)
+    tb += f"  reg {first_sim};\n\n"
     tb += "\n".join(f"  wire {i} ;" for i in inputs) + "\n\n"
     tb += "\n".join(f"  wire {o} ;" for o in outputs) + "\n\n"
+    if state:
+        tb += "\n".join(f"  wire {p} ;" for p in d_ports + q_ports) + "\n\n"
 
     tb += f"  {name} {name}_inst(\n"
-    tb += ",\n".join(f"    .{i} ( {i} )" for i in inputs + outputs)
+    tb += ",\n".join(f"    .{i} ( {i} )" for i in inputs + outputs + d_ports + q_ports)
     tb += "\n  );\n\n"
 
     ret = _uniquify("ret", inputs + outputs)
@@ -57,51 +327,137 @@ def generate_testbench(output_dir, name, inputs, outputs, simulator):
 
     tb += f"  assign {input_concat} = {input_vector};\n\n"
 
+    if state:
+        state_vector = _uniquify("state_vector", inputs + outputs)
+        tb += f"  reg [{len(state)-1}:0] {state_vector};\n\n"
+        tb += f"  assign {{ {' , '.join(q_ports)} }} = {state_vector};\n\n"
+
+    observe = _uniquify("observe", inputs + outputs)
+    if nets:
+        probe_vector = _uniquify("probe_vector", inputs + outputs)
+        tb += f"  wire [{len(nets)-1}:0] {probe_vector};\n"
+        probe_concat = "{ " + " , ".join(f"{name}_inst.{n}" for n in nets) + " }"
+        tb += f"  assign {probe_vector} = {probe_concat};\n\n"
+
     infile = _uniquify("infile", inputs + outputs)
     outfile = _uniquify("outfile", inputs + outputs)
     infile_pointer = _uniquify("infile_pointer", inputs + outputs)
     outfile_pointer = _uniquify("outfile_pointer", inputs + outputs)
+    flush = _uniquify("flush", inputs + outputs)
+    hex_format = _uniquify("hex_format", inputs + outputs)
 
     tb += f"  reg [999:0] {infile};\n"
     tb += f"  reg [999:0] {outfile};\n\n"
     tb += f"  integer {infile_pointer};\n"
-    tb += f"  integer {outfile_pointer};\n\n"
+    tb += f"  integer {outfile_pointer};\n"
+    tb += f"  integer {flush};\n"
+    tb += f"  integer {hex_format};\n"
+    tb += f"  integer {observe};\n\n"
 
     tb += "  initial begin\n"
     tb += f'    if (!$value$plusargs("input_file=%s", {infile})) begin\n'
     tb += '      $display("Error opening input file");\n'
     tb += "      $finish;\n"
-    tb += "  end\n"
+    tb += "    end\n"
     tb += f'    if (!$value$plusargs("output_file=%s", {outfile})) begin\n'
     tb += '      $display("Error opening output file");\n'
     tb += "      $finish;\n"
-    tb += "  end\n"
+    tb += "    end\n"
     tb += f'    {infile_pointer} = $fopen({infile}, "r");\n'
     tb += f'    {outfile_pointer} = $fopen({outfile}, "w");\n'
+    # Flushing after every vector lets a reader consume results while the
+    # simulation is still running (e.g., when streaming through a FIFO).
+    tb += f'    {flush} = $test$plusargs("flush");\n'
+    # Vectors are exchanged in hex instead of binary when requested, which
+    # is 4x smaller but cannot represent individual x bits.
+    tb += f'    {hex_format} = $test$plusargs("hex");\n'
+    tb += f'    {observe} = $test$plusargs("observe");\n'
+    tb += f"    {first_sim} = 1;\n"
+    if simulator != "verilator":
+        tb += f"    {tick} = 0;\n"
+    tb += "  end\n\n"
+    if simulator != "verilator":
+        tb += f"  always #1 {tick} = ~{tick};\n\n"
 
-    if simulator == "verilator":
-        tb += f"    {first_sim} = 1;\n"
-        tb += "  end\n\n"
-        tb += f"  always@(posedge {tick}) begin\n"
-        tb += f"    if ({first_sim}) begin\n"
-        tb += f"      {first_sim} <= 0;\n"
-        tb += "    end\n"
-        tb += "    else begin\n"
-        tb += f'      $fdisplay({outfile_pointer}, "%b", {output_concat});\n'
-        tb += "    end\n"
-        tb += f"    if ($feof({infile_pointer})) begin\n"
-        tb += f"      $fclose({infile_pointer});\n"
-        tb += f"      $fclose({outfile_pointer});\n"
-        tb += "      $finish;\n"
-        tb += "    end\n"
-        tb += f'    $fscanf({infile_pointer}, "%b\\n", {input_vector});\n'
-        tb += "  end\n"
+    # Each posedge records the outputs for the previously applied vector
+    # and then applies the next one, finishing once the input is exhausted.
+    generate = not state
+    if generate:
+        used = set(inputs + outputs)
+        used.update([tick, first_sim, ret, input_vector, observe, infile, outfile])
+        used.update([infile_pointer, outfile_pointer, flush, hex_format])
+        if nets:
+            used.add(probe_vector)
+        start = _unique_name("generate_start", used)
+        splitmix64 = _unique_name("splitmix64", used)
+        decls, generate_vector = _generator(
+            used, len(inputs), input_vector, ret, start, splitmix64
+        )
+        tb += decls
+        decls, reduce_update, reduce_finish = _reducer(
+            used,
+            outputs,
+            output_concat,
+            start,
+            splitmix64,
+            outfile_pointer,
+        )
+        tb += decls
+    tb += f"  always @(posedge {tick}) begin\n"
+    tb += f"    if ({first_sim}) begin\n"
+    tb += f"      {first_sim} = 0;\n"
+    if state:
+        tb += f"      if ({hex_format} != 0)\n"
+        tb += f'        {ret} = $fscanf({infile_pointer}, "%h", {state_vector});\n'
+        tb += "      else\n"
+        tb += f'        {ret} = $fscanf({infile_pointer}, "%b", {state_vector});\n'
+    tb += "    end\n"
+    tb += "    else begin\n"
+    indent = "      "
+    if generate:
+        tb += reduce_update
+        indent += "  "
+    if nets:
+        tb += f"{indent}if ({observe} != 0) begin\n"
+        tb += _display(outfile_pointer, hex_format, probe_vector, indent + "  ")
+        tb += f"{indent}end\n"
+        tb += f"{indent}else begin\n"
+        tb += _display(outfile_pointer, hex_format, output_concat, indent + "  ")
+        tb += f"{indent}end\n"
+    else:
+        tb += _display(outfile_pointer, hex_format, output_concat, indent)
+    if generate:
+        tb += "      end\n"
+    tb += f"      if ({flush} != 0) $fflush({outfile_pointer});\n"
+    if state:
+        tb += f"      {state_vector} = {{ {' , '.join(d_ports)} }};\n"
+    tb += "    end\n"
+    if generate:
+        tb += generate_vector
+        tb += "    else if"
+    else:
+        tb += "    if"
+    tb += f" ({hex_format} != 0)\n"
+    tb += f'      {ret} = $fscanf({infile_pointer}, "%h", {input_vector});\n'
+    tb += "    else\n"
+    tb += f'      {ret} = $fscanf({infile_pointer}, "%b", {input_vector});\n'
+    tb += f"    if ({ret} != 1) begin\n"
+    if generate:
+        tb += reduce_finish
+    tb += f"      $fclose({infile_pointer});\n"
+    tb += f"      $fclose({outfile_pointer});\n"
+    tb += "      $finish;\n"
+    tb += "    end\n"
+    tb += "  end\n"
+    tb += "endmodule\n"
 
+    if simulator == "verilator":
         c = '#include "Vtb.h"\n'
         c += '#include "verilated.h"\n'
         c += '#include "verilated_vcd_c.h"\n\n'
         c += "int main(int argc, char **argv, char **env) {\n"
         c += "  Verilated::commandArgs(argc, argv);\n"
+        c += _threads_statements()
         c += "  Vtb* top = new Vtb;\n"
         c += "  while(!Verilated::gotFinish()) {\n"
         c += f"    top->{tick} = 1;\n"
@@ -112,17 +468,416 @@ def generate_testbench(output_dir, name, inputs, outputs, simulator):
         c += "}\n"
         with open(output_dir / "tb.cpp", "w") as f:
             f.write(c)
+
+    with open(output_dir / "tb.v", "w") as f:
+        f.write(tb)
+
+
+def _threads_statements():
+    # Models verilated with --threads need a context with as many threads,
+    # which compile profiles define (see
+    # `circuitsim.simulators.compile_commands`).
+    c = "#ifdef CIRCUITSIM_THREADS\n"
+    c += "  Verilated::threadContextp()->threads(CIRCUITSIM_THREADS);\n"
+    c += "#endif\n"
+    return c
+
+
+def _pack_expr(vector, width, byte):
+    """C++ expression for byte `byte` of a little-endian packed port."""
+    if width > 64:
+        return f"(unsigned char)(top->{vector}[{byte // 4}] >> {8 * (byte % 4)})"
+    return f"(unsigned char)((uint64_t)top->{vector} >> {8 * byte})"
+
+
+def _unpack_stmts(vector, width, src):
+    """C++ statements assigning a little-endian packed buffer to a port."""
+    num_bytes = -(-width // 8)
+    if width > 64:
+        stmts = []
+        for w in range(-(-width // 32)):
+            terms = [
+                f"(uint32_t){src}[{b}] << {8 * (b - 4 * w)}"
+                for b in range(4 * w, min(4 * w + 4, num_bytes))
+            ]
+            stmts.append(f"top->{vector}[{w}] = {' | '.join(terms)};")
+        return stmts
+    terms = [f"(uint64_t){src}[{b}] << {8 * b}" for b in range(num_bytes)]
+    return [f"top->{vector} = {' | '.join(terms)};"]
+
+
+def _reduce_functions(num_outputs, out_bytes):
+    """C++ functions reducing the outputs, as in `generate_testbench`."""
+    c = "static int reduce_mode = 0;\n"
+    c += "static FILE* reduce_file = NULL;\n"
+    c += f"static uint64_t reduce_values[{num_outputs}];\n"
+    c += "static unsigned char reduce_mask[out_bytes];\n"
+    c += "static unsigned char reduce_expected[out_bytes];\n\n"
+    # Masks are given as hex numbers with the first output as the most
+    # significant bit, and are converted to packed records.
+    c += "static void parse_outputs(const char* hex, unsigned char* buf) {\n"
+    c += "  memset(buf, 0, out_bytes);\n"
+    c += "  if (!hex) return;\n"
+    c += "  size_t len = strlen(hex);\n"
+    c += "  for (size_t d = 0; d < len; d++) {\n"
+    c += "    char digit[2] = {hex[len - 1 - d], 0};\n"
+    c += "    unsigned long v = strtoul(digit, NULL, 16);\n"
+    c += "    for (size_t t = 0; t < 4; t++) {\n"
+    c += "      size_t b = 4 * d + t;\n"
+    c += f"      if (b >= {num_outputs} || !((v >> t) & 1)) continue;\n"
+    c += f"      size_t j = {num_outputs} - 1 - b;\n"
+    c += "      buf[j / 8] |= 1 << (j % 8);\n"
+    c += "    }\n"
+    c += "  }\n"
+    c += "}\n\n"
+    c += "static bool start_reduce(int argc, char** argv, const char* path,\n"
+    c += "                         int mode) {\n"
+    c += "  reduce_mode = mode;\n"
+    c += '  reduce_file = fopen(path, "w");\n'
+    c += "  if (!reduce_file) {\n"
+    c += '    perror("Error opening output file");\n'
+    c += "    return false;\n"
+    c += "  }\n"
+    c += '  parse_outputs(plusarg(argc, argv, "+mask="), reduce_mask);\n'
+    c += '  parse_outputs(plusarg(argc, argv, "+expected="), reduce_expected);\n'
+    c += "  return true;\n"
+    c += "}\n\n"
+    c += "static void reduce(Vtb* top, uint64_t index) {\n"
+    c += "  unsigned char out[out_bytes];\n"
+    c += "  capture(top, out);\n"
+    c += "  if (reduce_mode == 1 || reduce_mode == 2) {\n"
+    c += "    uint64_t h = splitmix64((index + 1) * 0x9e3779b97f4a7c15ULL);\n"
+    c += f"    for (size_t j = 0; j < {num_outputs}; j++) {{\n"
+    c += "      if (!((out[j / 8] >> (j % 8)) & 1)) continue;\n"
+    c += "      if (reduce_mode == 1)\n"
+    c += "        reduce_values[j] ^= h;\n"
+    c += "      else\n"
+    c += "        reduce_values[j]++;\n"
+    c += "    }\n"
+    c += "    return;\n"
+    c += "  }\n"
+    c += "  bool match = true;\n"
+    c += "  for (size_t b = 0; b < out_bytes; b++) {\n"
+    c += "    if ((out[b] ^ reduce_expected[b]) & reduce_mask[b]) match = false;\n"
+    c += "  }\n"
+    c += "  if (match == (reduce_mode == 3))\n"
+    c += '    fprintf(reduce_file, "%016llx\\n", (unsigned long long)index);\n'
+    c += "}\n\n"
+    c += "static void finish_reduce() {\n"
+    c += "  if (reduce_mode == 1 || reduce_mode == 2) {\n"
+    c += f"    for (size_t j = 0; j < {num_outputs}; j++)\n"
+    c += '      fprintf(reduce_file, "%016llx\\n",\n'
+    c += "              (unsigned long long)reduce_values[j]);\n"
+    c += "  }\n"
+    c += "  fclose(reduce_file);\n"
+    c += "}\n\n"
+    return c
+
+
+def generate_verilator_harness(
+    output_dir, name, inputs, outputs, nets=None, state=None
+):
+    """
+    Generate a C++ harness that drives a Verilator model directly.
+
+    Vectors are exchanged as packed binary records: each vector occupies
+    `ceil(len(inputs) / 8)` bytes with input `i` in bit `i % 8` of byte
+    `i // 8`, and outputs are packed the same way. Regular files are
+    memory-mapped and evaluated without any Verilog file I/O. If the input
+    is a FIFO, records are instead streamed one at a time so that the
+    harness can be kept running. If `nets` is given, running with the
+    `+observe` plusarg records those nets, packed the same way, instead of
+    the outputs. If `state` is given, the value of each D port is fed back
+    to its Q port after each vector, and the input starts with a packed
+    record of the initial values of the Q ports. Otherwise, the harness
+    can generate its own vectors with the same plusargs as the testbench
+    generated by `generate_testbench`.
+
+    Parameters
+    ----------
+    output_dir: pathlib.Path
+            Path to save the harness files to.
+    name: str
+            The name of the module to be simulated.
+    inputs: list of str
+            The inputs to the module.
+    outputs: list of str
+            The outputs to the module.
+    nets: list of str
+            The nets of the module that can be observed.
+    state: list of tuple of str, str
+            The D and Q ports of each state element of the module.
+
+    """
+    probe_nets = nets or outputs
+    state = state or []
+    ports = ["input_vector", "output_vector", "probe_vector"]
+    if state:
+        ports += ["state_vector", "next_state"]
+    tb = f"module {name}_tb({', '.join(ports)});\n\n"
+    tb += f"  input [{len(inputs)-1}:0] input_vector;\n"
+    tb += f"  output [{len(outputs)-1}:0] output_vector;\n"
+    tb += f"  output [{len(probe_nets)-1}:0] probe_vector;\n"
+    if state:
+        tb += f"  input [{len(state)-1}:0] state_vector;\n"
+        tb += f"  output [{len(state)-1}:0] next_state;\n"
+    tb += "\n"
+    if nets:
+        probe_concat = ", ".join(f"{name}_inst.{n}" for n in reversed(nets))
+        tb += f"  assign probe_vector = {{ {probe_concat} }};\n\n"
     else:
-        tb += f'    {infile_pointer} = $fopen({infile}, "r");\n'
-        tb += f'    {outfile_pointer} = $fopen({outfile}, "w");\n'
-        tb += f"    while (!$feof({infile_pointer})) begin\n"
-        tb += f'      ret = $fscanf({infile_pointer}, "%b\\n", {input_vector});\n'
-        tb += f'      #1 $fdisplay({outfile_pointer}, "%b", {output_concat});\n'
-        tb += "    end\n"
-        tb += f"    $fclose({infile_pointer});\n"
-        tb += f"    $fclose({outfile_pointer});\n"
-        tb += "  end\n"
+        tb += "  assign probe_vector = output_vector;\n\n"
+    tb += f"  {name} {name}_inst(\n"
+    tb += ",\n".join(
+        [f"    .{i} ( input_vector[{k}] )" for k, i in enumerate(inputs)]
+        + [f"    .{o} ( output_vector[{k}] )" for k, o in enumerate(outputs)]
+        + [f"    .{d} ( next_state[{k}] )" for k, (d, _) in enumerate(state)]
+        + [f"    .{q} ( state_vector[{k}] )" for k, (_, q) in enumerate(state)]
+    )
+    tb += "\n  );\n\n"
     tb += "endmodule\n"
-
     with open(output_dir / "tb.v", "w") as f:
         f.write(tb)
+
+    in_bytes = -(-len(inputs) // 8)
+    out_bytes = -(-len(outputs) // 8)
+    probe_bytes = -(-len(probe_nets) // 8)
+    state_bytes = -(-len(state) // 8)
+    c = '#include "Vtb.h"\n'
+    c += '#include "verilated.h"\n\n'
+    c += "#include <cstdint>\n"
+    c += "#include <cstdio>\n"
+    c += "#include <cstdlib>\n"
+    c += "#include <cstring>\n"
+    c += "#include <fcntl.h>\n"
+    c += "#include <sys/mman.h>\n"
+    c += "#include <sys/stat.h>\n"
+    c += "#include <unistd.h>\n\n"
+    c += f"static const size_t in_bytes = {in_bytes};\n"
+    c += f"static const size_t out_bytes = {out_bytes};\n"
+    c += f"static const size_t probe_bytes = {probe_bytes};\n"
+    c += f"static const size_t state_bytes = {state_bytes};\n"
+    c += f"static const size_t num_inputs = {len(inputs)};\n"
+    c += f"static const size_t num_words = {max(1, -(-len(inputs) // 64))};\n\n"
+
+    c += "static inline void apply(Vtb* top, const unsigned char* in) {\n"
+    c += "".join(f"  {s}\n" for s in _unpack_stmts("input_vector", len(inputs), "in"))
+    c += "}\n\n"
+    c += "static inline void capture(Vtb* top, unsigned char* out) {\n"
+    c += "".join(
+        f"  out[{b}] = {_pack_expr('output_vector', len(outputs), b)};\n"
+        for b in range(out_bytes)
+    )
+    c += "}\n\n"
+    c += "static inline void capture_probe(Vtb* top, unsigned char* out) {\n"
+    c += "".join(
+        f"  out[{b}] = {_pack_expr('probe_vector', len(probe_nets), b)};\n"
+        for b in range(probe_bytes)
+    )
+    c += "}\n\n"
+    if state:
+        c += "static inline void apply_state(Vtb* top, const unsigned char* in) {\n"
+        c += "".join(
+            f"  {s}\n" for s in _unpack_stmts("state_vector", len(state), "in")
+        )
+        c += "}\n\n"
+        c += "static inline void capture_state(Vtb* top, unsigned char* out) {\n"
+        c += "".join(
+            f"  out[{b}] = {_pack_expr('next_state', len(state), b)};\n"
+            for b in range(state_bytes)
+        )
+        c += "}\n\n"
+
+    c += "static const char* plusarg(int argc, char** argv, const char* name) {\n"
+    c += "  size_t n = strlen(name);\n"
+    c += "  for (int i = 1; i < argc; i++) {\n"
+    c += "    if (!strncmp(argv[i], name, n)) return argv[i] + n;\n"
+    c += "  }\n"
+    c += "  return NULL;\n"
+    c += "}\n\n"
+
+    # Generated patterns match circuitsim.patterns
+    c += "static inline uint64_t splitmix64(uint64_t z) {\n"
+    c += "  z = (z ^ (z >> 30)) * 0xbf58476d1ce4e5b9ULL;\n"
+    c += "  z = (z ^ (z >> 27)) * 0x94d049bb133111ebULL;\n"
+    c += "  return z ^ (z >> 31);\n"
+    c += "}\n\n"
+    c += "static void generate_vector(int mode, uint64_t k, uint64_t seed,\n"
+    c += "                            unsigned char* in) {\n"
+    c += "  memset(in, 0, in_bytes);\n"
+    c += "  if (mode == 1) {\n"
+    c += "    for (size_t w = 0; w < num_words; w++) {\n"
+    c += "      uint64_t z = splitmix64(\n"
+    c += "          seed + (k * num_words + w + 1) * 0x9e3779b97f4a7c15ULL);\n"
+    c += "      for (size_t b = 0; b < 8 && 8 * w + b < in_bytes; b++)\n"
+    c += "        in[8 * w + b] = (unsigned char)(z >> (8 * b));\n"
+    c += "    }\n"
+    c += "    if (num_inputs % 8)\n"
+    c += "      in[in_bytes - 1] &= (1 << (num_inputs % 8)) - 1;\n"
+    c += "  } else {\n"
+    # The first input is the most significant bit of the counter
+    c += "    for (size_t i = num_inputs > 64 ? num_inputs - 64 : 0; i < num_inputs;\n"
+    c += "         i++) {\n"
+    c += "      if ((k >> (num_inputs - 1 - i)) & 1) in[i / 8] |= 1 << (i % 8);\n"
+    c += "    }\n"
+    c += "  }\n"
+    c += "}\n\n"
+
+    c += "static uint64_t hex_plusarg(int argc, char** argv, const char* name) {\n"
+    c += "  const char* value = plusarg(argc, argv, name);\n"
+    c += "  return value ? strtoull(value, NULL, 16) : 0;\n"
+    c += "}\n\n"
+
+    if not state:
+        c += _reduce_functions(len(outputs), out_bytes)
+
+    c += "static bool transfer(int fd, unsigned char* buf, size_t n, bool in) {\n"
+    c += "  while (n) {\n"
+    c += "    ssize_t r = in ? read(fd, buf, n) : write(fd, buf, n);\n"
+    c += "    if (r <= 0) return false;\n"
+    c += "    buf += r;\n"
+    c += "    n -= r;\n"
+    c += "  }\n"
+    c += "  return true;\n"
+    c += "}\n\n"
+
+    c += "int main(int argc, char **argv, char **env) {\n"
+    c += "  Verilated::commandArgs(argc, argv);\n"
+    c += _threads_statements()
+    c += '  const char* in_path = plusarg(argc, argv, "+input_file=");\n'
+    c += '  const char* out_path = plusarg(argc, argv, "+output_file=");\n'
+    c += "  if (!in_path || !out_path) {\n"
+    c += '    fprintf(stderr, "Error: +input_file and +output_file required\\n");\n'
+    c += "    return 1;\n"
+    c += "  }\n"
+    c += "  int in_fd = open(in_path, O_RDONLY);\n"
+    c += "  struct stat st;\n"
+    c += "  if (in_fd < 0 || fstat(in_fd, &st)) {\n"
+    c += '    perror("Error opening input file");\n'
+    c += "    return 1;\n"
+    c += "  }\n"
+    c += '  bool observe = plusarg(argc, argv, "+observe") != NULL;\n'
+    c += "  size_t rec_bytes = observe ? probe_bytes : out_bytes;\n"
+    c += "  void (*record)(Vtb*, unsigned char*) = observe ? capture_probe : capture;\n"
+    c += "  Vtb* top = new Vtb;\n"
+    c += "  unsigned char in[in_bytes];\n"
+    c += "  unsigned char out[out_bytes > probe_bytes ? out_bytes : probe_bytes];\n"
+    if state:
+        c += "  unsigned char state[state_bytes];\n"
+    if not state:
+        c += '  uint64_t start = hex_plusarg(argc, argv, "+start=");\n'
+        c += '  const char* reduction = plusarg(argc, argv, "+reduce=");\n'
+        c += (
+            "  if (reduction && !start_reduce(argc, argv, out_path, atoi(reduction)))\n"
+        )
+        c += "    return 1;\n"
+        c += '  const char* generate = plusarg(argc, argv, "+generate=");\n'
+        c += "  if (generate) {\n"
+        c += "    int mode = atoi(generate);\n"
+        c += '    uint64_t count = hex_plusarg(argc, argv, "+count=");\n'
+        c += '    uint64_t seed = hex_plusarg(argc, argv, "+seed=");\n'
+        c += "    int out_fd = -1;\n"
+        c += "    unsigned char* outs = NULL;\n"
+        c += "    if (!reduce_mode) {\n"
+        c += "      out_fd = open(out_path, O_RDWR | O_CREAT | O_TRUNC, 0644);\n"
+        c += "      if (out_fd < 0 || ftruncate(out_fd, count * rec_bytes)) {\n"
+        c += '        perror("Error opening output file");\n'
+        c += "        return 1;\n"
+        c += "      }\n"
+        c += "      if (count) {\n"
+        c += "        outs = (unsigned char*)mmap(NULL, count * rec_bytes,\n"
+        c += "                                    PROT_READ | PROT_WRITE, MAP_SHARED,\n"
+        c += "                                    out_fd, 0);\n"
+        c += "        if (outs == MAP_FAILED) {\n"
+        c += '          perror("Error mapping files");\n'
+        c += "          return 1;\n"
+        c += "        }\n"
+        c += "      }\n"
+        c += "    }\n"
+        c += "    for (uint64_t i = 0; i < count; i++) {\n"
+        c += "      generate_vector(mode, start + i, seed, in);\n"
+        c += "      apply(top, in);\n"
+        c += "      top->eval();\n"
+        c += "      if (reduce_mode)\n"
+        c += "        reduce(top, start + i);\n"
+        c += "      else\n"
+        c += "        record(top, outs + i * rec_bytes);\n"
+        c += "    }\n"
+        c += "    if (outs) munmap(outs, count * rec_bytes);\n"
+        c += "    if (out_fd >= 0) close(out_fd);\n"
+        c += "  } else if (S_ISFIFO(st.st_mode)) {\n"
+    else:
+        c += "  if (S_ISFIFO(st.st_mode)) {\n"
+    c += "    int out_fd = open(out_path, O_WRONLY);\n"
+    if state:
+        c += "    bool ready = transfer(in_fd, state, state_bytes, true);\n"
+        c += "    while (ready && transfer(in_fd, in, in_bytes, true)) {\n"
+    else:
+        c += "    while (transfer(in_fd, in, in_bytes, true)) {\n"
+    c += "      apply(top, in);\n"
+    if state:
+        c += "      apply_state(top, state);\n"
+    c += "      top->eval();\n"
+    c += "      record(top, out);\n"
+    if state:
+        c += "      capture_state(top, state);\n"
+    c += "      if (!transfer(out_fd, out, rec_bytes, false)) break;\n"
+    c += "    }\n"
+    c += "    close(out_fd);\n"
+    c += "  } else {\n"
+    c += "    size_t size = st.st_size;\n"
+    c += "    size_t n = size < state_bytes ? 0 : (size - state_bytes) / in_bytes;\n"
+    c += "    int out_fd = -1;\n"
+    # Reduced outputs are written by the reduction instead
+    indent = "    "
+    if not state:
+        c += "    if (!reduce_mode) {\n"
+        indent += "  "
+    c += f"{indent}out_fd = open(out_path, O_RDWR | O_CREAT | O_TRUNC, 0644);\n"
+    c += f"{indent}if (out_fd < 0 || ftruncate(out_fd, n * rec_bytes)) {{\n"
+    c += f'{indent}  perror("Error opening output file");\n'
+    c += f"{indent}  return 1;\n"
+    c += f"{indent}}}\n"
+    if not state:
+        c += "    }\n"
+    c += "    if (n) {\n"
+    c += "      const unsigned char* base = (const unsigned char*)mmap(\n"
+    c += "          NULL, state_bytes + n * in_bytes, PROT_READ, MAP_SHARED, in_fd, 0);\n"
+    c += "      unsigned char* outs = out_fd < 0 ? NULL : (unsigned char*)mmap(\n"
+    c += "          NULL, n * rec_bytes, PROT_READ | PROT_WRITE, MAP_SHARED, out_fd, 0);\n"
+    c += "      if (base == MAP_FAILED || outs == MAP_FAILED) {\n"
+    c += '        perror("Error mapping files");\n'
+    c += "        return 1;\n"
+    c += "      }\n"
+    # The initial state, if any, precedes the vectors
+    c += "      const unsigned char* ins = base + state_bytes;\n"
+    if state:
+        c += "      memcpy(state, base, state_bytes);\n"
+    c += "      for (size_t i = 0; i < n; i++) {\n"
+    c += "        apply(top, ins + i * in_bytes);\n"
+    if state:
+        c += "        apply_state(top, state);\n"
+    c += "        top->eval();\n"
+    if state:
+        c += "        record(top, outs + i * rec_bytes);\n"
+        c += "        capture_state(top, state);\n"
+    else:
+        c += "        if (reduce_mode)\n"
+        c += "          reduce(top, start + i);\n"
+        c += "        else\n"
+        c += "          record(top, outs + i * rec_bytes);\n"
+    c += "      }\n"
+    c += "      munmap((void*)base, state_bytes + n * in_bytes);\n"
+    c += "      if (outs) munmap(outs, n * rec_bytes);\n"
+    c += "    }\n"
+    c += "    if (out_fd >= 0) close(out_fd);\n"
+    c += "  }\n"
+    if not state:
+        c += "  if (reduce_mode) finish_reduce();\n"
+    c += "  close(in_fd);\n"
+    c += "  top->final();\n"
+    c += "  delete top;\n"
+    c += "  return 0;\n"
+    c += "}\n"
+    with open(output_dir / "tb.cpp", "w") as f:
+        f.write(c)
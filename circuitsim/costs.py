@@ -0,0 +1,273 @@
+"""Cost model for choosing a simulator."""
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from circuitsim.cache import _default_cache_dir
+
+# Conservative estimates, used until a backend has been measured on this
+# machine. Times are in seconds.
+default_costs = {
+    "native": {
+        "compile_overhead": 0.0,
+        "compile_per_node": 2e-5,
+        "startup": 0.0,
+        "per_node": 2e-6,
+        "per_vector_node": 1e-9,
+    },
+    "iverilog": {
+        "compile_overhead": 0.2,
+        "compile_per_node": 1e-4,
+        "startup": 0.02,
+        "per_node": 0.0,
+        "per_vector_node": 2e-7,
+    },
+    "verilator": {
+        "compile_overhead": 8.0,
+        "compile_per_node": 2e-3,
+        "startup": 0.005,
+        "per_node": 0.0,
+        "per_vector_node": 5e-9,
+    },
+    "vcs": {
+        "compile_overhead": 10.0,
+        "compile_per_node": 1e-3,
+        "startup": 0.1,
+        "per_node": 0.0,
+        "per_vector_node": 1e-8,
+    },
+}
+# The weight of each new measurement in the moving averages
+_weight = 0.3
+# Runs shorter than this are dominated by overhead and are not recorded
+_min_run_time = 0.01
+
+
+def _default_path():
+    if "CIRCUITSIM_COSTS_FILE" in os.environ:
+        return Path(os.environ["CIRCUITSIM_COSTS_FILE"])
+    return _default_cache_dir().with_name("circuitsim_costs.json")
+
+
+class CostModel:
+    """
+    Estimates of compile and simulation time, learned from earlier runs.
+
+    The time to compile a circuit with a simulator is modeled as a fixed
+    overhead plus a time per node, and the time to simulate a batch of
+    vectors as a startup time per process, a time per node (the overhead of
+    each call to the 'native' simulator), and a time per vector per node,
+    divided among the processes. The per-node times start from conservative
+    defaults and are updated with a moving average of every measurement
+    recorded. Measurements are saved to a JSON file so that later sessions
+    on the same machine start from them.
+
+    Attributes
+    ----------
+    costs: dict of str:dict of str:float
+            The current estimates of each simulator. See `default_costs`.
+    path: pathlib.Path or None
+            The file that the estimates are saved to, or `None` if they are
+            not saved.
+
+    """
+
+    def __init__(self, path=None, persist=True, save_interval=1.0):
+        """
+        Load a cost model.
+
+        Parameters
+        ----------
+        path: str or pathlib.Path
+                The file to load and save the estimates. If `None`, the
+                `CIRCUITSIM_COSTS_FILE` environment variable is used if
+                set, otherwise `circuitsim_costs.json` next to the default
+                compile cache directory.
+        persist: bool
+                If False, the estimates are neither loaded nor saved.
+        save_interval: float
+                The minimum number of seconds between saves. Measurements
+                recorded in between are saved with the next one, or by
+                `save`.
+
+        """
+        self.costs = {s: dict(c) for s, c in default_costs.items()}
+        self.path = None
+        if persist:
+            self.path = Path(path) if path is not None else _default_path()
+            try:
+                with open(self.path) as f:
+                    saved = json.load(f)
+            except (OSError, ValueError):
+                saved = {}
+            for simulator, costs in saved.items():
+                if simulator in self.costs:
+                    self.costs[simulator].update(
+                        (k, v) for k, v in costs.items() if k in self.costs[simulator]
+                    )
+        self.save_interval = save_interval
+        self._saved = time.monotonic()
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"CostModel(path={str(self.path)!r})"
+
+    def compile_time(self, simulator, num_nodes):
+        """
+        Estimate the time to compile a circuit.
+
+        Parameters
+        ----------
+        simulator: str
+                The simulator.
+        num_nodes: int
+                The number of nodes in the circuit.
+
+        Returns
+        -------
+        float
+                The estimated time, in seconds.
+
+        """
+        c = self.costs[simulator]
+        return c["compile_overhead"] + c["compile_per_node"] * num_nodes
+
+    def run_time(self, simulator, num_nodes, num_vectors, num_processes=1):
+        """
+        Estimate the time to simulate a batch of vectors.
+
+        Parameters
+        ----------
+        simulator: str
+                The simulator.
+        num_nodes: int
+                The number of nodes in the circuit.
+        num_vectors: int
+                The number of vectors.
+        num_processes: int
+                The number of simulation processes.
+
+        Returns
+        -------
+        float
+                The estimated time, in seconds.
+
+        """
+        c = self.costs[simulator]
+        return (
+            c["startup"] * num_processes
+            + c["per_node"] * num_nodes
+            + c["per_vector_node"] * num_nodes * num_vectors / num_processes
+        )
+
+    def num_processes(self, simulator, num_nodes, num_vectors, max_processes):
+        """
+        Choose the number of processes that simulates a batch fastest.
+
+        Parameters
+        ----------
+        simulator: str
+                The simulator.
+        num_nodes: int
+                The number of nodes in the circuit.
+        num_vectors: int
+                The number of vectors.
+        max_processes: int
+                The maximum number of processes.
+
+        Returns
+        -------
+        int
+                The number of processes. Always 1 for the 'native'
+                simulator.
+
+        """
+        c = self.costs[simulator]
+        if simulator == "native" or c["startup"] <= 0:
+            return 1
+        # Minimizes startup * p + work / p
+        work = c["per_vector_node"] * num_nodes * num_vectors
+        p = int(math.sqrt(work / c["startup"]))
+        return max(1, min(p, max_processes, num_vectors))
+
+    def record_compile(self, simulator, num_nodes, seconds):
+        """
+        Record how long a compilation took.
+
+        Parameters
+        ----------
+        simulator: str
+                The simulator.
+        num_nodes: int
+                The number of nodes in the circuit.
+        seconds: float
+                The time that it took.
+
+        """
+        c = self.costs[simulator]
+        per_node = max(0.0, seconds - c["compile_overhead"]) / max(1, num_nodes)
+        self._update(simulator, "compile_per_node", per_node)
+
+    def record_run(self, simulator, num_nodes, num_vectors, num_processes, seconds):
+        """
+        Record how long a simulation took.
+
+        Parameters
+        ----------
+        simulator: str
+                The simulator.
+        num_nodes: int
+                The number of nodes in the circuit.
+        num_vectors: int
+                The number of vectors.
+        num_processes: int
+                The number of simulation processes.
+        seconds: float
+                The time that it took.
+
+        """
+        if seconds < _min_run_time or num_vectors == 0:
+            return
+        c = self.costs[simulator]
+        overhead = c["startup"] * num_processes + c["per_node"] * num_nodes
+        per_vector_node = max(0.0, seconds - overhead) / (
+            max(1, num_nodes) * num_vectors / num_processes
+        )
+        self._update(simulator, "per_vector_node", per_vector_node)
+
+    def _update(self, simulator, name, value):
+        with self._lock:
+            c = self.costs[simulator]
+            c[name] = (1 - _weight) * c[name] + _weight * value
+            self._dirty = True
+            due = time.monotonic() - self._saved >= self.save_interval
+        if due:
+            self.save()
+
+    def save(self):
+        """Save the estimates, if they changed since they were last saved."""
+        with self._lock:
+            if self.path is None or not self._dirty:
+                return
+            data = json.dumps(self.costs, indent=2)
+            self._dirty = False
+            self._saved = time.monotonic()
+        # Write to a temporary file and rename it into place so that other
+        # processes never read a partial file.
+        tmp = self.path.with_name(f".{self.path.name}.{uuid.uuid4().hex}")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "w") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        except OSError:
+            # The estimates are only an optimization
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
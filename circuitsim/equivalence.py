@@ -0,0 +1,151 @@
+"""Simulation-based equivalence checking."""
+import circuitgraph as cg
+import numpy as np
+
+from circuitsim.patterns import random_patterns
+from circuitsim.simulation import CircuitSimulator
+from circuitsim.simulators import _convert_value
+
+
+def miter(c0, c1):
+    """
+    Build a miter of two circuits with the same inputs and outputs.
+
+    Parameters
+    ----------
+    c0: circuitgraph.Circuit
+            The first circuit.
+    c1: circuitgraph.Circuit
+            The second circuit.
+
+    Returns
+    -------
+    circuitgraph.Circuit
+            A circuit with the inputs of `c0` and `c1`, driving both
+            circuits, and a single output, 'sat', which is 1 when any of
+            their outputs differ.
+
+    """
+    if c0.inputs() != c1.inputs():
+        raise ValueError("Circuits have different inputs")
+    if c0.outputs() != c1.outputs():
+        raise ValueError("Circuits have different outputs")
+    if "sat" in c0.inputs():
+        raise ValueError("Cannot miter circuits with an input named 'sat'")
+    return cg.tx.miter(c0, c1, startpoints=c0.inputs(), endpoints=c0.outputs())
+
+
+def check_equivalence(
+    c0,
+    c1,
+    vectors=None,
+    num_vectors=2**20,
+    seed=0,
+    num_processes=1,
+    chunk_size=65536,
+    **kwargs,
+):
+    """
+    Check if two circuits are equivalent by simulating their miter.
+
+    The miter is compiled once, and the vectors are simulated in chunks,
+    stopping after the first chunk that contains a mismatch. Chunks start
+    small and grow up to `chunk_size`, so that a mismatch is found quickly
+    when it is hit by one of the first vectors. Only the indices of the
+    mismatching vectors are read back from the simulator (see the 'match'
+    reduction of `CircuitSimulator.simulate`).
+
+    Simulation can only show that circuits differ: if no mismatch is found,
+    the circuits are equivalent for the simulated vectors only.
+
+    Parameters
+    ----------
+    c0: circuitgraph.Circuit
+            The first circuit.
+    c1: circuitgraph.Circuit
+            The second circuit, with the same inputs and outputs.
+    vectors: list of dict of str:bool or numpy.ndarray
+            The vectors to simulate, either as dictionaries mapping each
+            input to a logical value, or as a `(num_vectors, num_inputs)`
+            array of bool/0/1 values with columns in the order of
+            `CircuitSimulator.inputs` (the naturally sorted inputs). If
+            `None`, `num_vectors` pseudorandom vectors are generated by the
+            simulator, as in `CircuitSimulator.simulate_random`.
+    num_vectors: int
+            The number of pseudorandom vectors to simulate when `vectors`
+            is `None`.
+    seed: int
+            The seed of the pseudorandom vectors.
+    num_processes: int
+            The number of simulation processes to run for each chunk.
+    chunk_size: int
+            The maximum number of vectors simulated at once.
+    **kwargs
+            Passed to `CircuitSimulator` (e.g., `simulator` and `cache`).
+
+    Returns
+    -------
+    dict of str:bool or None
+            The first vector for which the outputs of the circuits differ,
+            mapping each input to a logical value, or `None` if there was
+            no such vector.
+
+    Examples
+    --------
+    >>> import circuitgraph as cg
+    >>> c0 = cg.from_lib("c17")
+    >>> c1 = c0.copy()
+    >>> c1.set_type("N22", "and")
+    >>> check_equivalence(c0, c0.copy(), simulator="native") is None
+    True
+    >>> check_equivalence(c0, c1, simulator="native")
+    {'N1': True, 'N2': True, 'N3': True, 'N6': True, 'N7': False}
+
+    """
+    simulator = CircuitSimulator(miter(c0, c1), **kwargs)
+    inputs = simulator.inputs
+    if vectors is not None:
+        if not isinstance(vectors, np.ndarray):
+            vectors = list(vectors)
+        num_vectors = len(vectors)
+
+    try:
+        start = 0
+        count = min(1024, chunk_size)
+        while start < num_vectors:
+            count = min(count, num_vectors - start)
+            if vectors is None:
+                hits = simulator.simulate_random(
+                    count,
+                    seed=seed,
+                    num_processes=num_processes,
+                    reduce="match",
+                    expected={"sat": True},
+                    start=start,
+                )
+                if hits:
+                    pattern = random_patterns(len(inputs), hits[0], 1, seed)[0]
+                    return dict(zip(inputs, pattern.astype(bool).tolist()))
+            else:
+                chunk = vectors[start : start + count]
+                simulate = (
+                    simulator.simulate_array
+                    if isinstance(chunk, np.ndarray)
+                    else simulator.simulate
+                )
+                hits = simulate(
+                    chunk,
+                    num_processes=num_processes,
+                    reduce="match",
+                    expected={"sat": True},
+                )
+                if hits:
+                    vector = chunk[hits[0]]
+                    if isinstance(chunk, np.ndarray):
+                        return dict(zip(inputs, (vector != 0).tolist()))
+                    return {i: _convert_value(vector[i]) == "1" for i in inputs}
+            start += count
+            count = min(2 * count, chunk_size)
+        return None
+    finally:
+        simulator.close()
@@ -0,0 +1,177 @@
+"""Stuck-at fault simulation."""
+import heapq
+import operator
+
+import numpy as np
+
+from circuitsim.native import NativeSimulator, pack_bits
+from circuitsim.simulators import _convert_value
+
+
+def stuck_at_faults(nodes):
+    """
+    List the stuck-at-0 and stuck-at-1 faults on a set of nodes.
+
+    Parameters
+    ----------
+    nodes: iterable of str
+            The nodes to place faults on.
+
+    Returns
+    -------
+    list of tuple of str, bool
+            A `(node, value)` fault for each value of each node.
+
+    """
+    return [(n, v) for n in nodes for v in [False, True]]
+
+
+_int_ops = {
+    np.bitwise_and: operator.and_,
+    np.bitwise_or: operator.or_,
+    np.bitwise_xor: operator.xor,
+}
+
+
+class FaultSimulator(NativeSimulator):
+    """
+    Simulate stuck-at faults.
+
+    Faults are simulated with parallel-pattern single-fault propagation:
+    the fault-free circuit is evaluated once for a block of vectors, with
+    the values of each node packed into a single integer, and each fault is
+    then propagated through its fanout one gate at a time, only as far as
+    it changes values. Faults are placed on nodes (stems), not on
+    individual fanout branches.
+
+    """
+
+    def __init__(self, ckt, inputs, outputs):
+        """
+        Levelize a circuit for fault simulation.
+
+        Parameters
+        ----------
+        ckt: circuitgraph.Circuit
+                The circuit to simulate. Constant "x" nodes are treated
+                as 0.
+        inputs: list of str
+                The inputs to the circuit, in the order of the columns of
+                the vectors.
+        outputs: list of str
+                The outputs at which faults are observed.
+
+        """
+        super().__init__(ckt, inputs, outputs)
+        self.gates = [
+            None if g is None else (g[0], _int_ops[g[1]], g[2]) for g in self.gates
+        ]
+        self.is_output = [False] * len(self.nodes)
+        for i in self.output_index.tolist():
+            self.is_output[i] = True
+
+    def detect(self, good, node, value, mask):
+        """
+        Find the vectors that detect a fault.
+
+        Parameters
+        ----------
+        good: list of int
+                The fault-free value of each node, with bit `j` holding
+                the value for vector `j`.
+        node: int
+                The index of the faulty node.
+        value: bool
+                The stuck-at value.
+        mask: int
+                An integer with a bit set for each vector.
+
+        Returns
+        -------
+        int
+                An integer with bit `j` set if vector `j` detects the fault.
+
+        """
+        faulty = {node: mask if value else 0}
+        if faulty[node] == good[node]:
+            return 0
+        detected = 0
+        events = [node]
+        scheduled = {node}
+        # Nodes are stored in level order, so popping the smallest index
+        # evaluates each gate after all of its faulty fanins.
+        while events:
+            i = heapq.heappop(events)
+            if i != node:
+                fanin, op, invert = self.gates[i]
+                result = faulty.get(fanin[0], good[fanin[0]])
+                for f in fanin[1:]:
+                    result = op(result, faulty.get(f, good[f]))
+                if invert:
+                    result ^= mask
+                if result == good[i]:
+                    continue
+                faulty[i] = result
+            if self.is_output[i]:
+                detected |= faulty[i] ^ good[i]
+            for j in self.fanout[i]:
+                if j not in scheduled:
+                    scheduled.add(j)
+                    heapq.heappush(events, j)
+        return detected
+
+    def simulate_faults(self, bits, faults, drop=True, block_size=4096):
+        """
+        Find the vectors that detect each fault.
+
+        Parameters
+        ----------
+        bits: numpy.ndarray
+                A `(num_vectors, len(inputs))` array of 0/1 values.
+        faults: list of tuple of str, bool
+                The `(node, value)` stuck-at faults to simulate.
+        drop: bool
+                If True, a fault is no longer simulated once a vector
+                detects it.
+        block_size: int
+                The number of vectors to simulate at a time.
+
+        Returns
+        -------
+        list of list of tuple of str, bool
+                The faults detected by each vector. If `drop` is True, each
+                fault is only reported for the first vector that detects it.
+
+        """
+        for n, _ in faults:
+            if n not in self.index:
+                raise ValueError(f"Cannot place fault on unknown node '{n}'")
+        remaining = [(n, _convert_value(v) == "1") for n, v in faults]
+        detections = [[] for _ in range(len(bits))]
+        for start in range(0, len(bits), block_size):
+            block = bits[start : start + block_size]
+            # Faults are propagated one gate at a time, for which Python
+            # integers are much faster than small NumPy arrays.
+            mask = (1 << len(block)) - 1
+            good = [
+                int.from_bytes(v.tobytes(), "little") & mask
+                for v in self.evaluate(pack_bits(block))
+            ]
+            undetected = []
+            for node, value in remaining:
+                detected = self.detect(good, self.index[node], value, mask)
+                if not detected:
+                    undetected.append((node, value))
+                    continue
+                if not drop:
+                    undetected.append((node, value))
+                while detected:
+                    lowest = detected & -detected
+                    detections[start + lowest.bit_length() - 1].append((node, value))
+                    if drop:
+                        break
+                    detected ^= lowest
+            remaining = undetected
+            if not remaining:
+                break
+        return detections
@@ -0,0 +1,443 @@
+"""Bit-parallel in-process simulation."""
+import heapq
+
+import numpy as np
+
+from circuitsim.simulators import _convert_value, _vectors_to_bits
+from circuitsim.snapshot import NetlistSnapshot, gate_codes, gate_types
+
+word_size = 64
+
+_reduce_ops = {
+    "buf": (np.bitwise_and, False),
+    "not": (np.bitwise_and, True),
+    "and": (np.bitwise_and, False),
+    "nand": (np.bitwise_and, True),
+    "or": (np.bitwise_or, False),
+    "nor": (np.bitwise_or, True),
+    "xor": (np.bitwise_xor, False),
+    "xnor": (np.bitwise_xor, True),
+}
+
+
+_popcounts = np.array([bin(b).count("1") for b in range(256)], dtype=np.uint8)
+
+
+def num_words(num_vectors):
+    """
+    Compute the number of machine words needed to hold a set of vectors.
+
+    Parameters
+    ----------
+    num_vectors: int
+            The number of vectors.
+
+    Returns
+    -------
+    int
+            The number of 64-bit words.
+
+    """
+    return max(1, -(-num_vectors // word_size))
+
+
+def pack_bits(bits):
+    """
+    Pack a matrix of bits into 64-bit words.
+
+    Parameters
+    ----------
+    bits: numpy.ndarray
+            A `(num_vectors, num_signals)` array of 0/1 values.
+
+    Returns
+    -------
+    numpy.ndarray
+            A `(num_signals, num_words)` array of `uint64` words. Bit `j` of
+            word `w` holds the value of vector `64 * w + j`.
+
+    """
+    bits = np.asarray(bits, dtype=np.uint8)
+    packed = np.packbits(bits.T, axis=1, bitorder="little")
+    padding = num_words(bits.shape[0]) * 8 - packed.shape[1]
+    if padding:
+        packed = np.pad(packed, ((0, 0), (0, padding)))
+    return np.ascontiguousarray(packed).view("<u8")
+
+
+def unpack_bits(words, num_vectors):
+    """
+    Unpack 64-bit words into a matrix of bits.
+
+    Parameters
+    ----------
+    words: numpy.ndarray
+            A `(num_signals, num_words)` array of `uint64` words, as
+            returned by `pack_bits`.
+    num_vectors: int
+            The number of valid vectors held in the words.
+
+    Returns
+    -------
+    numpy.ndarray
+            A `(num_vectors, num_signals)` array of 0/1 `uint8` values.
+
+    """
+    words = np.ascontiguousarray(words, dtype="<u8")
+    bits = np.unpackbits(words.view(np.uint8), axis=1, bitorder="little")
+    return bits[:, :num_vectors].T
+
+
+def popcount(words):
+    """
+    Count the set bits in each row of words.
+
+    Parameters
+    ----------
+    words: numpy.ndarray
+            A `(num_signals, num_words)` array of `uint64` words.
+
+    Returns
+    -------
+    numpy.ndarray
+            The number of set bits in each row.
+
+    """
+    words = np.ascontiguousarray(words, dtype="<u8")
+    return _popcounts[words.view(np.uint8)].sum(axis=1, dtype=np.int64)
+
+
+class NativeSimulator:
+    """
+    Simulate a circuit in-process.
+
+    The circuit is levelized once, and gates on the same level with the
+    same type and number of fanins are evaluated together. Vectors are
+    packed 64 per machine word, so each gate evaluation is a bitwise
+    operation on whole words.
+
+    """
+
+    def __init__(self, ckt, inputs, outputs):
+        """
+        Levelize a circuit for simulation.
+
+        Parameters
+        ----------
+        ckt: circuitgraph.Circuit or circuitsim.snapshot.NetlistSnapshot
+                The circuit to simulate. Constant "x" nodes are treated
+                as 0. A snapshot is already levelized, so it is used as is.
+        inputs: list of str
+                The inputs to the circuit, in the order that packed input
+                words will be provided.
+        outputs: list of str
+                The outputs to the circuit, in the order that packed output
+                words will be returned.
+
+        """
+        if not isinstance(ckt, NetlistSnapshot):
+            if ckt.blackboxes:
+                raise ValueError(f"Cannot natively simulate blackboxes in '{ckt.name}'")
+            ckt = NetlistSnapshot.from_circuit(ckt)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+
+        # Inputs occupy the first indices (in the requested order) so that
+        # packed inputs can be copied directly into the value array, followed
+        # by the constants and the gates of the snapshot, by level.
+        types = np.asarray(ckt.types)
+        levels = np.asarray(ckt.levels)
+        offsets = np.asarray(ckt.fanin_offsets)
+        zeros = np.flatnonzero((types == gate_codes["0"]) | (types == gate_codes["x"]))
+        ones = np.flatnonzero(types == gate_codes["1"])
+        gates = np.flatnonzero(levels > 0)
+        gates = gates[np.argsort(levels[gates], kind="stable")]
+        order = np.concatenate(
+            [
+                np.array([ckt.index[i] for i in self.inputs], dtype=np.int64),
+                zeros,
+                ones,
+                gates,
+            ]
+        )
+        position = np.empty(len(ckt), dtype=np.int64)
+        position[order] = np.arange(len(order))
+        self.nodes = [ckt.nodes[i] for i in order.tolist()]
+        self.index = {n: i for i, n in enumerate(self.nodes)}
+        self.ones = position[ones]
+        self.output_index = np.array(
+            [self.index[o] for o in self.outputs], dtype=np.int64
+        )
+
+        # Gates on the same level with the same type and number of fanins
+        # are evaluated together.
+        counts = offsets[gates + 1] - offsets[gates]
+        keys, group = np.unique(
+            np.stack([levels[gates], types[gates], counts], axis=1),
+            axis=0,
+            return_inverse=True,
+        )
+        group = group.reshape(-1)
+        members = gates[np.argsort(group, kind="stable")]
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(group))])
+        self.groups = []
+        for (_, t, count), start, stop in zip(
+            keys.tolist(), bounds[:-1].tolist(), bounds[1:].tolist()
+        ):
+            idx = members[start:stop]
+            fanin = ckt.fanin[offsets[idx][:, None] + np.arange(count)]
+            op, invert = _reduce_ops[gate_types[t]]
+            self.groups.append((position[idx], position[fanin], op, invert))
+
+        # The fanin, operation, and inversion of each gate and the fanout of
+        # each node, for simulators that evaluate gates one at a time.
+        self.gates = [None] * len(self.nodes)
+        self.fanout = [[] for _ in self.nodes]
+        for idx, fanin, op, invert in self.groups:
+            for i, f in zip(idx.tolist(), fanin.tolist()):
+                self.gates[i] = (f, op, invert)
+                for j in f:
+                    self.fanout[j].append(i)
+
+    def evaluate(self, packed_inputs):
+        """
+        Evaluate every node in the circuit.
+
+        Parameters
+        ----------
+        packed_inputs: numpy.ndarray
+                A `(len(inputs), num_words)` array of `uint64` words, as
+                returned by `pack_bits`.
+
+        Returns
+        -------
+        numpy.ndarray
+                A `(len(nodes), num_words)` array of `uint64` words holding
+                the value of each node in `nodes`.
+
+        """
+        packed_inputs = np.asarray(packed_inputs, dtype="<u8")
+        values = np.zeros((len(self.nodes), packed_inputs.shape[1]), dtype="<u8")
+        values[: len(self.inputs)] = packed_inputs
+        values[self.ones] = ~np.uint64(0)
+        for idx, fanin, op, invert in self.groups:
+            result = op.reduce(values[fanin], axis=1)
+            if invert:
+                np.invert(result, out=result)
+            values[idx] = result
+        return values
+
+    def simulate_packed(self, packed_inputs, observe=None):
+        """
+        Simulate packed input words.
+
+        Parameters
+        ----------
+        packed_inputs: numpy.ndarray
+                A `(len(inputs), num_words)` array of `uint64` words, as
+                returned by `pack_bits`.
+        observe: list of str
+                Internal nodes to return in addition to the outputs.
+
+        Returns
+        -------
+        numpy.ndarray
+                A `(len(outputs), num_words)` array of `uint64` words,
+                followed by a row for each observed node.
+
+        """
+        index = self.output_index
+        if observe is not None:
+            observe_index = [self.index[n] for n in observe]
+            index = np.concatenate([index, np.array(observe_index, dtype=np.int64)])
+        return self.evaluate(packed_inputs)[index]
+
+    def activity(self, bits, chunk_size=65536):
+        """
+        Count how often each node toggles and is 1 over a vector sequence.
+
+        Parameters
+        ----------
+        bits: numpy.ndarray
+                A `(num_vectors, len(inputs))` array of 0/1 values, in the
+                order they are applied.
+        chunk_size: int
+                The number of vectors to evaluate at a time.
+
+        Returns
+        -------
+        numpy.ndarray
+                The number of consecutive vectors for which the value of
+                each node in `nodes` changes.
+        numpy.ndarray
+                The number of vectors for which each node in `nodes` is 1.
+
+        """
+        toggles = np.zeros(len(self.nodes), dtype=np.int64)
+        ones = np.zeros(len(self.nodes), dtype=np.int64)
+        last = None
+        one = np.uint64(1)
+        for start in range(0, len(bits), chunk_size):
+            block = bits[start : start + chunk_size]
+            valid = pack_bits(np.ones((len(block), 1)))[0]
+            values = self.evaluate(pack_bits(block)) & valid
+            ones += popcount(values)
+            # Shift each node's bit sequence by one vector, so that each
+            # bit is compared to the value for the previous vector.
+            previous = values << one
+            previous[:, 1:] |= values[:, :-1] >> np.uint64(word_size - 1)
+            changes = (values ^ previous) & valid
+            if last is None:
+                changes[:, 0] &= ~one
+            else:
+                changes[:, 0] ^= last
+            toggles += popcount(changes)
+            w, b = divmod(len(block) - 1, word_size)
+            last = (values[:, w] >> np.uint64(b)) & one
+        return toggles, ones
+
+    def simulate(self, vectors, observe=None):
+        """
+        Simulate a list of vectors.
+
+        Parameters
+        ----------
+        vectors: list of dict of str:bool
+                The vectors to simulate. Each vector is represented as a
+                dictionary mapping an input to a logical value.
+        observe: list of str
+                Internal nodes to return in addition to the outputs.
+
+        Returns
+        -------
+        list of dict of str:bool
+                The simulation outputs. Each vector is represented as a
+                dictionary mapping an output or observed node to a logical
+                value.
+
+        """
+        bits = _vectors_to_bits(vectors, self.inputs)
+        words = self.simulate_packed(pack_bits(bits), observe)
+        outputs = unpack_bits(words, len(vectors))
+        names = self.outputs + list(observe or [])
+        return [dict(zip(names, row)) for row in outputs.astype(bool).tolist()]
+
+
+_scalar_ops = {
+    np.bitwise_and: all,
+    np.bitwise_or: any,
+    np.bitwise_xor: lambda values: sum(values) % 2 == 1,
+}
+
+
+class EventSimulator(NativeSimulator):
+    """
+    Simulate a sequence of vectors incrementally.
+
+    The value of every node is kept between vectors. When a new vector is
+    applied, only gates in the transitive fanout of the inputs that changed
+    are re-evaluated, and propagation stops at gates whose value does not
+    change. The cost of each vector therefore scales with the switching
+    activity rather than the size of the circuit.
+
+    """
+
+    def __init__(self, ckt, inputs, outputs):
+        """
+        Levelize a circuit for incremental simulation.
+
+        Parameters
+        ----------
+        ckt: circuitgraph.Circuit
+                The circuit to simulate. Constant "x" nodes are treated
+                as 0.
+        inputs: list of str
+                The inputs to the circuit.
+        outputs: list of str
+                The outputs to the circuit.
+
+        """
+        super().__init__(ckt, inputs, outputs)
+        self.scalar_gates = [
+            None if g is None else (g[0], _scalar_ops[g[1]], g[2]) for g in self.gates
+        ]
+        self.output_names = {}
+        for o, i in zip(self.outputs, self.output_index.tolist()):
+            self.output_names.setdefault(i, []).append(o)
+        self.reset()
+
+    def reset(self):
+        """Forget the node values, so the next vector is fully evaluated."""
+        self.values = None
+        self.output_values = None
+
+    def apply(self, vector):
+        """
+        Apply a vector.
+
+        Parameters
+        ----------
+        vector: dict of str:bool
+                The input values. Once a vector has been applied, inputs
+                that are not provided keep their previous value.
+
+        Returns
+        -------
+        dict of str:bool
+                The value of each output.
+
+        """
+        if self.values is None:
+            bits = _vectors_to_bits([vector], self.inputs)
+            self.values = unpack_bits(self.evaluate(pack_bits(bits)), 1)[0]
+            self.values = self.values.astype(bool).tolist()
+            self.output_values = {
+                o: self.values[i]
+                for o, i in zip(self.outputs, self.output_index.tolist())
+            }
+            return dict(self.output_values)
+
+        events = []
+        scheduled = set()
+        for n, v in vector.items():
+            i = self.index.get(n)
+            if i is None or i >= len(self.inputs):
+                raise ValueError(f"'{n}' is not an input")
+            v = _convert_value(v) == "1"
+            if self.values[i] != v:
+                self._update(i, v, events, scheduled)
+        # Nodes are stored in level order, so popping the smallest index
+        # evaluates each gate after all of its changed fanins.
+        while events:
+            i = heapq.heappop(events)
+            fanin, op, invert = self.scalar_gates[i]
+            v = op([self.values[j] for j in fanin]) != invert
+            if self.values[i] != v:
+                self._update(i, v, events, scheduled)
+        return dict(self.output_values)
+
+    def _update(self, i, v, events, scheduled):
+        self.values[i] = v
+        for o in self.output_names.get(i, []):
+            self.output_values[o] = v
+        for j in self.fanout[i]:
+            if j not in scheduled:
+                scheduled.add(j)
+                heapq.heappush(events, j)
+
+    def simulate(self, vectors):
+        """
+        Apply a sequence of vectors.
+
+        Parameters
+        ----------
+        vectors: list of dict of str:bool
+                The vectors to apply, in order. See `apply`.
+
+        Returns
+        -------
+        list of dict of str:bool
+                The value of each output after each vector.
+
+        """
+        return [self.apply(vector) for vector in vectors]
@@ -0,0 +1,126 @@
+"""Reproducible generation of input patterns."""
+import numpy as np
+
+generate_modes = {"random": 1, "exhaustive": 2}
+max_exhaustive_inputs = 32
+
+_gamma = np.uint64(0x9E3779B97F4A7C15)
+_mix1 = np.uint64(0xBF58476D1CE4E5B9)
+_mix2 = np.uint64(0x94D049BB133111EB)
+
+
+def splitmix64(x):
+    """
+    Apply the SplitMix64 output function.
+
+    Parameters
+    ----------
+    x: numpy.ndarray
+            An array of `uint64` generator states.
+
+    Returns
+    -------
+    numpy.ndarray
+            The pseudorandom `uint64` output for each state.
+
+    """
+    z = (x ^ (x >> np.uint64(30))) * _mix1
+    z = (z ^ (z >> np.uint64(27))) * _mix2
+    return z ^ (z >> np.uint64(31))
+
+
+def random_patterns(num_inputs, start, count, seed):
+    """
+    Generate pseudorandom input patterns.
+
+    Pattern `k` is made of `ceil(num_inputs / 64)` words, and word `j` is
+    the SplitMix64 output for the state
+    `seed + (k * ceil(num_inputs / 64) + j + 1) * 0x9E3779B97F4A7C15`,
+    modulo 2^64. Input `i` takes bit `i % 64` of word `i // 64`. Since each
+    pattern only depends on its index, any range of patterns can be
+    generated independently, and the testbenches and harnesses generated
+    by `circuitsim.codegen` produce the same patterns.
+
+    Parameters
+    ----------
+    num_inputs: int
+            The number of inputs.
+    start: int
+            The index of the first pattern.
+    count: int
+            The number of patterns.
+    seed: int
+            The seed. Taken modulo 2^64.
+
+    Returns
+    -------
+    numpy.ndarray
+            A `(count, num_inputs)` array of 0/1 `uint8` values.
+
+    """
+    num_words = max(1, -(-num_inputs // 64))
+    counters = np.arange(
+        start * num_words + 1, (start + count) * num_words + 1, dtype=np.uint64
+    )
+    words = splitmix64(np.uint64(seed % 2**64) + counters * _gamma)
+    bits = np.unpackbits(
+        words.astype("<u8").view(np.uint8).reshape(count, 8 * num_words),
+        axis=1,
+        bitorder="little",
+    )
+    return bits[:, :num_inputs]
+
+
+def exhaustive_patterns(num_inputs, start, count):
+    """
+    Generate consecutive patterns of a binary counter.
+
+    Pattern `k` is the binary representation of `k`, with the first input
+    as the most significant bit.
+
+    Parameters
+    ----------
+    num_inputs: int
+            The number of inputs.
+    start: int
+            The index of the first pattern.
+    count: int
+            The number of patterns.
+
+    Returns
+    -------
+    numpy.ndarray
+            A `(count, num_inputs)` array of 0/1 `uint8` values.
+
+    """
+    counters = np.arange(start, start + count, dtype=np.uint64)
+    shifts = np.arange(num_inputs - 1, -1, -1, dtype=np.uint64)
+    return ((counters[:, None] >> shifts) & np.uint64(1)).astype(np.uint8)
+
+
+def generate_patterns(mode, num_inputs, start, count, seed=0):
+    """
+    Generate input patterns.
+
+    Parameters
+    ----------
+    mode: str
+            Either 'random' or 'exhaustive'.
+    num_inputs: int
+            The number of inputs.
+    start: int
+            The index of the first pattern.
+    count: int
+            The number of patterns.
+    seed: int
+            The seed of 'random' patterns.
+
+    Returns
+    -------
+    numpy.ndarray
+            A `(count, num_inputs)` array of 0/1 `uint8` values.
+
+    """
+    if mode == "random":
+        return random_patterns(num_inputs, start, count, seed)
+    return exhaustive_patterns(num_inputs, start, count)
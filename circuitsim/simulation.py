@@ -1,46 +1,213 @@
 """High-level simulation API."""
+import asyncio
+import functools
+import itertools
+import shutil
 import tempfile
+import threading
+import time
 from pathlib import Path
 
 import circuitgraph as cg
+import numpy as np
 from natsort import natsorted
 
-from circuitsim.codegen import generate_testbench
+from circuitsim.cache import CompileCache, ResultCache
+from circuitsim.codegen import (
+    generate_netlist,
+    generate_testbench,
+    generate_verilator_harness,
+)
+from circuitsim.costs import CostModel
+from circuitsim.faults import FaultSimulator, stuck_at_faults
+from circuitsim.native import (
+    EventSimulator,
+    NativeSimulator,
+    pack_bits,
+    unpack_bits,
+)
+from circuitsim.patterns import (
+    generate_modes,
+    generate_patterns,
+    max_exhaustive_inputs,
+)
 from circuitsim.simulators import (
+    SimulationExecutionError,
+    SimulationExecutor,
+    SimulatorProcess,
+    _available_cpus,
+    _decode_bits,
+    _decode_vectors,
+    _encode_bits,
+    _encode_vectors,
+    _combine_reduced,
+    _convert_value,
+    _decode_reduced,
+    _format_vector,
+    _output_size,
+    _resolve_profile,
+    _vectors_to_bits,
     available_simulators,
+    compile_args,
     compile_simulator,
-    execute_simulator,
-    parse_simulation_output,
+    reduce_bits,
+    reduce_modes,
+    shard,
+    wire_format_args,
+    wire_formats,
 )
+from circuitsim.snapshot import NetlistSnapshot
+from circuitsim.stats import SimulationStats
+from circuitsim.transform import dual_rail, propagate_constants
 
 
 class CircuitSimulator:
     """Class for circuit simulation."""
 
-    def __init__(self, ckt, working_dir=None, simulator="iverilog"):
+    def __init__(
+        self,
+        ckt,
+        working_dir=None,
+        simulator="iverilog",
+        persistent=False,
+        cache=None,
+        wire_format="ascii",
+        on_phase=None,
+        memo=None,
+        compile_profile="default",
+        costs=None,
+    ):
         """
         Create new simulator.
 
         Parameters
         ----------
-        ckt: circuitgraph.Circuit
-                The circuit to simulate.
+        ckt: circuitgraph.Circuit or circuitsim.NetlistSnapshot
+                The circuit to simulate. A snapshot (see `from_snapshot`)
+                is simulated without building a `circuitgraph.Circuit`,
+                which is only rebuilt if `ckt` is accessed (e.g., by
+                `specialize`).
         working_dir: str or pathlib.Path
                 The directory to write simulation files to. If `None`, a
                 temporary directory will be used.
         simulator: str
-                The simulator to use. One of ['iverilog', 'verilator', 'vcs'].
+                The simulator to use. One of ['iverilog', 'verilator', 'vcs',
+                'native', 'auto']. The 'native' simulator evaluates the
+                circuit in-process with bit-parallel NumPy operations and
+                does not require any external tools. 'auto' chooses a
+                simulator (among `candidates`: 'native' and the installed
+                tools) and a number of processes for each call with a
+                `CostModel`, so that a simulator with a long compile is only
+                used once the vectors simulated so far would have paid for
+                it. Each chosen simulator is compiled once and kept.
+        persistent: bool
+                If True, a single simulation process is started the first
+                time `simulate` is called and kept running. Vectors are
+                streamed to it through FIFOs, which avoids the cost of
+                starting a new process on every call. Call `close` to stop
+                the process.
+        cache: bool or circuitsim.CompileCache
+                If True, compiled simulations are shared through the default
+                `CompileCache`. A `CompileCache` object can also be passed
+                to control its location and size. Simulators of identical
+                circuits then only need to be compiled once.
+        wire_format: str
+                How vectors are exchanged with the simulator. 'ascii' writes
+                one '0'/'1' character per bit. 'hex' writes one hexadecimal
+                digit per 4 bits, and falls back to 'ascii' when `allow_x`
+                is used. 'packed' writes 8 bits per
+                byte and is only supported by verilator, for which it
+                generates a C++ harness that memory-maps the vector files
+                and drives the model's ports directly, bypassing Verilog
+                file I/O. Ignored by the 'native' simulator.
+        on_phase: callable
+                If provided, called as `on_phase(phase, seconds)` at the end
+                of each phase of compilation and simulation (e.g., to feed
+                a metrics system). The same timings are accumulated in
+                `stats` and logged at the DEBUG level.
+        memo: bool or circuitsim.ResultCache
+                If True, the results of `simulate` are memoized in a new
+                `ResultCache`, and only vectors that are not cached are
+                simulated. A `ResultCache` object can also be passed to
+                control its size. Its `hits` and `misses` count the vectors
+                found and not found. Results of x-based simulations, of
+                observed nets, and of reductions are not memoized.
+        compile_profile: str or dict
+                How verilator builds the simulation. 'default' compiles a
+                single translation unit serially. 'fast-compile' splits the
+                generated C++ into many small files and compiles them in
+                parallel with little optimization, for very large netlists.
+                'fast-run' compiles in parallel with full optimization and
+                evaluates wide designs with multiple threads. A dict of
+                options can also be passed; see
+                `circuitsim.simulators.compile_commands`. The compile time
+                of each profile is recorded in `stats`.
+        costs: circuitsim.CostModel
+                The cost model of the 'auto' simulator, which it updates
+                with the compile and simulation times that it measures. If
+                `None`, a `CostModel` saved in the default location is
+                used. Ignored by other simulators.
 
         """
-        if simulator not in available_simulators:
+        if simulator not in available_simulators + ["auto"]:
             raise ValueError(
                 f"Invalid simulator '{simulator}'. Must be one of "
-                f"{available_simulators}."
+                f"{available_simulators + ['auto']}."
+            )
+        _resolve_profile(compile_profile)
+        if isinstance(ckt, NetlistSnapshot):
+            # Snapshots are levelized, so they cannot be cyclic
+            self.snapshot = ckt
+            self._ckt = None
+        else:
+            if ckt.is_cyclic():
+                raise ValueError("Cannot simulate cyclic circuit")
+            self.snapshot = None
+            self._ckt = ckt
+        if wire_format not in wire_formats:
+            raise ValueError(
+                f"Invalid wire format '{wire_format}'. Must be one of "
+                f"{list(wire_formats)}."
+            )
+        if (
+            simulator not in ["native", "auto"]
+            and simulator not in wire_formats[wire_format]
+        ):
+            raise ValueError(
+                f"Wire format '{wire_format}' is not supported by {simulator}"
             )
-        if ckt.is_cyclic():
-            raise ValueError("Cannot simulate cyclic circuit")
         self.simulator = simulator
-        self.ckt = ckt
+        self.persistent = persistent
+        self.compile_profile = compile_profile
+        self.wire_format = "packed" if simulator == "native" else wire_format
+        if cache is True:
+            cache = CompileCache()
+        self.cache = cache or None
+        if memo is True:
+            memo = ResultCache()
+        # An empty ResultCache is falsy
+        self.memo = None if memo is None or memo is False else memo
+        self.process = None
+        self.native = None
+        self.event_simulator = None
+        self.fault_simulator = None
+        self.sequential_simulators = {}
+        self.dual_rail_simulator = None
+        self.backends = {}
+        self.costs = None
+        self.candidates = []
+        if simulator == "auto":
+            self.costs = costs if costs is not None else CostModel()
+            self.candidates = ["native"] + [
+                s
+                for s in ["iverilog", "verilator", "vcs"]
+                if shutil.which(compile_args[s][0]) is not None
+            ]
+        self._auto_vectors = 0
+        self._num_specialized = 0
+        self._state = None
+        self.stats = SimulationStats(callback=on_phase)
+        self.name = ckt.name
         if working_dir is None:
             self.temp_dir = tempfile.TemporaryDirectory(
                 prefix=f"circuitsim_{ckt.name}_"
@@ -50,28 +217,291 @@ class CircuitSimulator:
             self.temp_dir = None
             self.working_dir = Path(working_dir)
             self.working_dir.mkdir(exist_ok=True)
-        self.inputs = natsorted(list(ckt.inputs()))
-        self.outputs = natsorted(list(ckt.outputs()))
+        self.executor = SimulationExecutor(
+            self.simulator, self.working_dir, stats=self.stats
+        )
+        if self.snapshot is not None:
+            self.inputs = self.snapshot.inputs
+            self.outputs = self.snapshot.outputs
+            self.nets = self.snapshot.nets
+        else:
+            self.inputs = natsorted(list(ckt.inputs()))
+            self.outputs = natsorted(list(ckt.outputs()))
+            self.nets = natsorted(
+                n for n in ckt.nodes() if ckt.type(n) not in ["bb_input", "bb_output"]
+            )
+        self._net_index = {n: i for i, n in enumerate(self.nets)}
         self._initialized = False
+        self._observable = False
+        # Guards compilation and the persistent process, and counts the
+        # calls whose simulation processes are running.
+        self._lock = threading.Condition(threading.RLock())
+        self._executions = 0
+
+    @classmethod
+    def from_snapshot(cls, path, mmap=True, **kwargs):
+        """
+        Create a simulator from a saved netlist snapshot.
+
+        Parameters
+        ----------
+        path: str or pathlib.Path
+                The file written by `circuitsim.NetlistSnapshot.save`.
+        mmap: bool
+                If True, the snapshot's arrays are memory-mapped.
+        **kwargs
+                Passed to `CircuitSimulator`.
+
+        Returns
+        -------
+        CircuitSimulator
+                The simulator.
+
+        Examples
+        --------
+        >>> import circuitgraph as cg
+        >>> import tempfile
+        >>> from circuitsim import NetlistSnapshot
+        >>> snapshot = NetlistSnapshot.from_circuit(cg.from_lib("c17"))
+        >>> with tempfile.TemporaryDirectory() as d:
+        ...     snapshot.save(f"{d}/c17.snap")
+        ...     simulator = CircuitSimulator.from_snapshot(
+        ...         f"{d}/c17.snap", mmap=False, simulator="native"
+        ...     )
+        >>> simulator.simulate([{"N1": 0, "N2": 1, "N3": 0, "N6": 1, "N7": 0}])
+        [{'N22': True, 'N23': True}]
+
+        """
+        return cls(NetlistSnapshot.load(path, mmap=mmap), **kwargs)
+
+    @property
+    def ckt(self):
+        """circuitgraph.Circuit: The circuit, rebuilt from the snapshot if needed."""
+        if self._ckt is None:
+            self._ckt = self.snapshot.to_circuit()
+        return self._ckt
+
+    @property
+    def _levelized(self):
+        # The snapshot if there is one, which in-process simulators and
+        # netlist generation use without rebuilding the circuit.
+        return self.snapshot if self.snapshot is not None else self.ckt
 
     def __del__(self):
-        """Remove temporary directory if necessary."""
-        if self.temp_dir:
+        """Stop the persistent process and remove temporary directory if necessary."""
+        self.close()
+        if getattr(self, "temp_dir", None):
             self.temp_dir.cleanup()
 
-    def _initialize_simulator(self):
-        generate_testbench(
-            self.working_dir, self.ckt.name, self.inputs, self.outputs, self.simulator
+    def close(self):
+        """Stop the persistent simulation process, if one is running."""
+        if getattr(self, "process", None) is not None:
+            self.process.close()
+            self.process = None
+        for simulator in getattr(self, "backends", {}).values():
+            simulator.close()
+
+    def specialize(self, constants):
+        """
+        Create a simulator with some inputs fixed to constants.
+
+        The constants are propagated through the circuit and the logic that
+        no longer affects an output is removed before the simulation is
+        compiled, so the specialized simulator compiles and runs faster,
+        and its vectors only need to provide the remaining inputs.
+
+        Parameters
+        ----------
+        constants: dict of str:bool
+                The value of each input to fix.
+
+        Returns
+        -------
+        CircuitSimulator
+                A simulator of the specialized circuit, with the same
+                settings as this one. Its `inputs` are the inputs that were
+                not fixed, and its `outputs` are unchanged.
+
+        Examples
+        --------
+        >>> import circuitgraph as cg
+        >>> simulator = CircuitSimulator(cg.from_lib("c17"), simulator="native")
+        >>> specialized = simulator.specialize({"N1": 0, "N3": 1})
+        >>> specialized.inputs
+        ['N2', 'N6', 'N7']
+        >>> specialized.simulate([{"N2": 1, "N6": 0, "N7": 0}])
+        [{'N22': True, 'N23': True}]
+
+        """
+        if set(self.inputs) <= set(constants):
+            raise ValueError("Cannot fix every input")
+        ckt = propagate_constants(self.ckt, constants)
+        working_dir = None
+        if self.temp_dir is None:
+            # A temporary directory is removed with this simulator, so it
+            # can only hold the files of simulators that it owns.
+            working_dir = self.working_dir / f"specialized_{self._num_specialized}"
+            self._num_specialized += 1
+        return CircuitSimulator(
+            ckt,
+            working_dir,
+            simulator=self.simulator,
+            persistent=self.persistent,
+            cache=self.cache,
+            wire_format=self.wire_format,
+            compile_profile=self.compile_profile,
+            on_phase=self.stats.callback,
+            costs=self.costs,
+            # The specialized circuit has different results, so it gets its
+            # own cache.
+            memo=ResultCache(self.memo.max_size) if self.memo is not None else None,
         )
-        cg.to_file(self.ckt, self.working_dir / f"{self.ckt.name}.v")
-        netlists = [self.working_dir / "tb.v", self.working_dir / f"{self.ckt.name}.v"]
-        compile_simulator(self.simulator, netlists, self.working_dir)
+
+    def _initialize_simulator(self):
+        # Returns whether the simulation was built rather than copied from
+        # the compile cache
+        if self.simulator == "native":
+            with self.stats.phase("compile"):
+                self.native = NativeSimulator(
+                    self._levelized, self.inputs, self.outputs
+                )
+            self._initialized = True
+            return True
+        nets = self.nets if self._observable else None
+        with self.stats.phase("testbench"):
+            if self.wire_format == "packed":
+                generate_verilator_harness(
+                    self.working_dir,
+                    self.name,
+                    self.inputs,
+                    self.outputs,
+                    nets=nets,
+                    state=self._state,
+                )
+            else:
+                generate_testbench(
+                    self.working_dir,
+                    self.name,
+                    self.inputs,
+                    self.outputs,
+                    self.simulator,
+                    nets=nets,
+                    state=self._state,
+                )
+        with self.stats.phase("netlist"):
+            generate_netlist(self.working_dir, self._levelized)
+        netlists = [self.working_dir / "tb.v", self.working_dir / f"{self.name}.v"]
+        with self.stats.phase("compile"):
+            built = compile_simulator(
+                self.simulator,
+                netlists,
+                self.working_dir,
+                cache=self.cache,
+                profile=self.compile_profile,
+                num_nodes=len(self.nets),
+            )
         self._initialized = True
+        return built
+
+    def _prepare(self, observe):
+        # Returns whether a simulation was built
+        if observe is not None:
+            unknown = set(observe) - set(self.nets)
+            if unknown:
+                raise ValueError(f"Cannot observe unknown nets {sorted(unknown)}")
+        with self._lock:
+            if (
+                observe is not None
+                and not self._observable
+                and self.simulator != "native"
+            ):
+                # Recompile once with a testbench that can record every net,
+                # which is then reused for any set of observed nets. Running
+                # calls finish with the current compiled simulation first.
+                self._lock.wait_for(lambda: self._executions == 0)
+                self.close()
+                self._observable = True
+                self._initialized = False
+            if not self._initialized:
+                return self._initialize_simulator()
+        return False
+
+    def _begin_execution(self):
+        # Waits for compilation to finish
+        with self._lock:
+            self._executions += 1
 
-    def simulate(self, vectors, num_processes=1, allow_x=False):
+    def _end_execution(self):
+        with self._lock:
+            self._executions -= 1
+            self._lock.notify_all()
+
+    def _run(self, shards, parse, args=(), shard_args=None):
+        self._begin_execution()
+        try:
+            return self.executor.run(shards, parse, args=args, shard_args=shard_args)
+        finally:
+            self._end_execution()
+
+    async def _run_async(self, shards, parse, args=(), shard_args=None):
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._begin_execution)
+        try:
+            return await self.executor.run_async(
+                shards, parse, args=args, shard_args=shard_args
+            )
+        finally:
+            self._end_execution()
+
+    def _record(self, allow_x, observe):
+        # The wire format, plusargs, and fields of each output record
+        wire_format = "ascii" if allow_x else self.wire_format
+        args = list(wire_format_args.get(wire_format, []))
+        if observe is None:
+            return wire_format, args, self.outputs
+        return wire_format, args + ["+observe"], self.nets
+
+    def _communicate(self, data, num_vectors, allow_x, observe):
+        # The persistent process simulates one call at a time
+        with self._lock:
+            return self._communicate_locked(data, num_vectors, allow_x, observe)
+
+    def _communicate_locked(self, data, num_vectors, allow_x, observe):
+        wire_format, args, fields = self._record(allow_x, observe)
+        if self.process is not None and self.process.args != args:
+            # The running process was started with different plusargs.
+            self.close()
+        if self.process is None:
+            self.process = SimulatorProcess(self.simulator, self.working_dir, args=args)
+            self.stats.add(processes=1)
+        size = _output_size(num_vectors, len(fields), wire_format)
+        try:
+            with self.stats.phase("execute"):
+                output = self.process.communicate(data, size)
+        except SimulationExecutionError:
+            self.process = None
+            raise
+        self.stats.add(bytes_written=len(data), bytes_read=len(output))
+        return output
+
+    def simulate(
+        self,
+        vectors,
+        num_processes=1,
+        allow_x=False,
+        observe=None,
+        reduce=None,
+        expected=None,
+    ):
         """
         Execute the simulator on a list of vectors.
 
+        A simulator can be called from several threads at once. Each call
+        writes its files to its own job directory and shares the compiled
+        simulation, and the simulation processes of all calls count
+        towards the limit set by `circuitsim.set_max_processes`. Calls to
+        a persistent simulator take turns.
+
         Parameters
         ----------
         vectors: list of dict of str:bool
@@ -80,12 +510,35 @@ class CircuitSimulator:
         num_process: int
                 The number of simulation processes to run. Specifying a
                 number more than 1 will cause multiple simulations to be
-                executed in parallel.
+                executed in parallel. Ignored for persistent simulators,
+                and chosen by the cost model of 'auto' simulators.
         allow_x: bool
                 If True, the inputs/outputs can contain "x" or "z" values
                 in addition to 0 and 1. The outputs will then be returned
                 as a dict of str:str, where each output is either
-                "0", "1", "x", or "z".
+                "0", "1", "x", or "z". The two-state 'verilator' and
+                'native' simulators simulate a dual-rail encoding of the
+                circuit (see `circuitsim.transform.dual_rail`), compiled
+                on first use, which treats "z" inputs as "x" and never
+                outputs "z".
+        observe: list of str
+                Internal nets to record in addition to the outputs. The
+                first call with `observe` recompiles the simulation once so
+                that every net can be recorded; later calls reuse it for
+                any set of nets.
+        reduce: str
+                If provided, the outputs are reduced by the simulation
+                processes (or the 'native' simulator) and only a summary is
+                returned. 'signature' returns a 64-bit signature of each
+                output, 'ones' the number of vectors for which each output
+                is 1, and 'match' and 'mismatch' the indices of the vectors
+                whose outputs do and do not equal `expected`. See
+                `circuitsim.simulators.reduce_bits`. Cannot be combined with
+                `allow_x` or `observe`.
+        expected: dict of str:bool
+                The expected value of the outputs to compare for 'match' and
+                'mismatch' reductions. Outputs that are not included are
+                ignored.
 
         Returns
         -------
@@ -93,21 +546,1055 @@ class CircuitSimulator:
                 The simulation outputs. Each vector is represented as a
                 dictionary mapping an output to a logical value. If `allow_x`
                 is True, then instead of logic values, each output will be
-                mapped to either "0", "1", "x", or "z".
+                mapped to either "0", "1", "x", or "z". Observed nets are
+                included in the same way. If `reduce` is 'signature' or
+                'ones', a dict mapping each output to an int is returned
+                instead, and if `reduce` is 'match' or 'mismatch', a list
+                of vector indices.
+
+        Examples
+        --------
+        >>> import circuitgraph as cg
+        >>> simulator = CircuitSimulator(cg.from_lib("c17"), simulator="native")
+        >>> vectors = [
+        ...     {"N1": 0, "N2": 1, "N3": 0, "N6": 1, "N7": 0},
+        ...     {"N1": 1, "N2": 0, "N3": 0, "N6": 1, "N7": 1},
+        ... ]
+        >>> simulator.simulate(vectors, reduce="ones")
+        {'N22': 1, 'N23': 2}
+        >>> simulator.simulate(vectors, reduce="mismatch", expected={"N22": 1})
+        [1]
 
         """
-        if not self._initialized:
-            self._initialize_simulator()
-        if self.simulator == "verilator" and allow_x:
-            raise ValueError("Cannot use x-based simulation with verilator")
-        execute_simulator(
-            self.simulator,
-            self.inputs,
+        with self.stats.call():
+            if self.simulator == "auto" and (
+                self.memo is None
+                or allow_x
+                or observe is not None
+                or reduce is not None
+            ):
+                return self._simulate_auto(
+                    len(vectors),
+                    observe,
+                    lambda simulator, num_processes: simulator.simulate(
+                        vectors, num_processes, allow_x, observe, reduce, expected
+                    ),
+                    # x-based simulation simulates a different circuit
+                    record=not allow_x,
+                )
+            if reduce is not None:
+                reduction = self._reduction(reduce, expected, allow_x, observe)
+                self._prepare(None)
+                with self.stats.phase("encode"):
+                    bits = _vectors_to_bits(vectors, self.inputs)
+                return self._simulate_reduced(bits, num_processes, reduction)
+            if self.memo is not None and not allow_x and observe is None:
+                return self._simulate_memoized(vectors, num_processes)
+            if allow_x and self.simulator in ["verilator", "native"]:
+                return self._simulate_dual_rail(vectors, num_processes, observe)
+            self._prepare(observe)
+            if self.simulator == "native":
+                with self.stats.phase("execute"):
+                    return self.native.simulate(vectors, observe)
+            if self.persistent:
+                with self.stats.phase("encode"):
+                    data = self._encode_vectors(vectors, allow_x)
+                data = self._communicate(data, len(vectors), allow_x, observe)
+                with self.stats.phase("decode"):
+                    return self._decode_vectors(data, allow_x, observe)
+            results = self._run(
+                self._shards(vectors, num_processes, allow_x),
+                lambda data: self._decode_vectors(data, allow_x, observe),
+                args=self._record(allow_x, observe)[1],
+            )
+            return [r for shard_results in results for r in shard_results]
+
+    async def simulate_async(
+        self, vectors, num_processes=1, allow_x=False, observe=None
+    ):
+        """
+        Execute the simulator on a list of vectors without blocking.
+
+        Simulation processes are awaited on the running event loop, so
+        other tasks (including other simulations) can proceed while they
+        run. Compilation, native simulation, and persistent simulation
+        run in the loop's default executor.
+
+        Parameters
+        ----------
+        vectors: list of dict of str:bool
+                The vectors to simulate. See `simulate`.
+        num_process: int
+                The number of simulation processes to run. See `simulate`.
+        allow_x: bool
+                If True, the inputs/outputs can contain "x" or "z" values.
+                See `simulate`.
+        observe: list of str
+                Internal nets to record in addition to the outputs. See
+                `simulate`.
+
+        Returns
+        -------
+        list of dict of str:bool or str:str
+                The simulation outputs. See `simulate`.
+
+        """
+        loop = asyncio.get_event_loop()
+        in_executor = (
+            allow_x and self.simulator in ["verilator", "native"]
+        ) or self.simulator in ["native", "auto"]
+        if not in_executor:
+            await loop.run_in_executor(None, self._prepare, observe)
+        if in_executor or self.persistent:
+            return await loop.run_in_executor(
+                None, self.simulate, vectors, num_processes, allow_x, observe
+            )
+        with self.stats.call():
+            results = await self._run_async(
+                self._shards(vectors, num_processes, allow_x),
+                lambda data: self._decode_vectors(data, allow_x, observe),
+                args=self._record(allow_x, observe)[1],
+            )
+        return [r for shard_results in results for r in shard_results]
+
+    def _choose(self, num_vectors):
+        # The simulator that would simulate this call, and as many vectors
+        # as were simulated so far, fastest (including its compilation if
+        # it is not compiled yet), and its number of processes.
+        num_nodes = len(self.nets)
+        workload = max(num_vectors, self._auto_vectors)
+        best = None
+        for name in self.candidates:
+            num_processes = self.costs.num_processes(
+                name, num_nodes, num_vectors, _available_cpus()
+            )
+            cost = self.costs.run_time(name, num_nodes, num_vectors, num_processes)
+            if num_vectors:
+                cost *= workload / num_vectors
+            simulator = self.backends.get(name)
+            if simulator is None or not simulator._initialized:
+                cost += self.costs.compile_time(name, num_nodes)
+            if best is None or cost < best[0]:
+                best = (cost, name, num_processes)
+        return best[1], best[2]
+
+    def _wire_format(self, simulator):
+        # The wire format of a simulator chosen by 'auto', which may not
+        # support the requested one
+        if simulator in ["native", self.simulator]:
+            return self.wire_format
+        if simulator in wire_formats[self.wire_format]:
+            return self.wire_format
+        return "ascii"
+
+    def _backend(self, name):
+        with self._lock:
+            if name not in self.backends:
+                simulator = CircuitSimulator(
+                    self.snapshot if self.snapshot is not None else self.ckt,
+                    self.working_dir / name,
+                    simulator=name,
+                    persistent=self.persistent,
+                    cache=self.cache,
+                    wire_format=self._wire_format(name),
+                    compile_profile=self.compile_profile,
+                )
+                simulator.inputs = self.inputs
+                simulator.outputs = self.outputs
+                # Record the simulations in this simulator's statistics
+                simulator.stats = simulator.executor.stats = self.stats
+                self.backends[name] = simulator
+            return self.backends[name]
+
+    def _simulate_auto(self, num_vectors, observe, simulate, record=True):
+        with self._lock:
+            name, num_processes = self._choose(num_vectors)
+            self._auto_vectors += num_vectors
+        simulator = self._backend(name)
+        num_nodes = len(self.nets)
+        start = time.perf_counter()
+        # Copies from the compile cache say nothing about compile times
+        if simulator._prepare(observe):
+            self.costs.record_compile(name, num_nodes, time.perf_counter() - start)
+        start = time.perf_counter()
+        results = simulate(simulator, num_processes)
+        if record:
+            self.costs.record_run(
+                name, num_nodes, num_vectors, num_processes, time.perf_counter() - start
+            )
+        return results
+
+    def _simulate_dual_rail(self, vectors, num_processes, observe):
+        if observe is not None:
+            unknown = set(observe) - set(self.nets)
+            if unknown:
+                raise ValueError(f"Cannot observe unknown nets {sorted(unknown)}")
+        observe = list(observe or [])
+        with self._lock:
+            if self.dual_rail_simulator is None:
+                with self.stats.phase("compile"):
+                    ckt, rails = dual_rail(self.ckt)
+                simulator = CircuitSimulator(
+                    ckt,
+                    self.working_dir / "dual_rail",
+                    simulator=self.simulator,
+                    cache=self.cache,
+                    wire_format=self.wire_format,
+                    compile_profile=self.compile_profile,
+                )
+                simulator._rails = rails
+                # Record the dual-rail simulation in this simulator's statistics
+                simulator.stats = simulator.executor.stats = self.stats
+                self.dual_rail_simulator = simulator
+        simulator = self.dual_rail_simulator
+        rails = simulator._rails
+
+        with self.stats.phase("encode"):
+            # An undriven input is unknown to the gates that it drives
+            vectors = [
+                {
+                    n: "x" if isinstance(v, str) and v.lower() == "z" else v
+                    for n, v in vector.items()
+                }
+                for vector in vectors
+            ]
+            text = "".join(
+                _format_vector(v, self.inputs, allow_x=True) for v in vectors
+            )
+            values = np.frombuffer(text.encode(), dtype=np.uint8)
+            values = values.reshape(len(vectors), len(self.inputs))
+            index = {n: i for i, n in enumerate(simulator.inputs)}
+            bits = np.zeros((len(vectors), len(simulator.inputs)), dtype=np.uint8)
+            for i, n in enumerate(self.inputs):
+                high, low = rails[n]
+                bits[:, index[high]] = values[:, i] == ord("1")
+                bits[:, index[low]] = values[:, i] == ord("0")
+        observed = [r for n in observe for r in rails[n]]
+        results = simulator._simulate_array(
+            bits, num_processes, False, observed or None
+        )
+        with self.stats.phase("decode"):
+            index = {n: i for i, n in enumerate(simulator.outputs + observed)}
+            names = self.outputs + observe
+            high = results[:, [index[rails[n][0]] for n in names]]
+            low = results[:, [index[rails[n][1]] for n in names]]
+            values = np.where(high, "1", np.where(low, "0", "x"))
+            return [dict(zip(names, row)) for row in values.tolist()]
+
+    def _simulate_memoized(self, vectors, num_processes):
+        with self.stats.phase("encode"):
+            bits = _vectors_to_bits(vectors, self.inputs)
+            keys = [k.tobytes() for k in np.packbits(bits, axis=1)]
+            values = [self.memo.get(k) for k in keys]
+            # Each distinct missing vector is only simulated once
+            misses = {}
+            for i, (k, v) in enumerate(zip(keys, values)):
+                if v is None:
+                    misses.setdefault(k, i)
+        if misses:
+            results = np.packbits(
+                self._simulate_array(
+                    bits[list(misses.values())], num_processes, False, None
+                ),
+                axis=1,
+            )
+            for k, r in zip(misses, results):
+                self.memo.put(k, r.tobytes())
+            found = dict(zip(misses, results))
+        with self.stats.phase("decode"):
+            packed = np.array(
+                [
+                    np.frombuffer(v, dtype=np.uint8) if v is not None else found[k]
+                    for k, v in zip(keys, values)
+                ],
+                dtype=np.uint8,
+            ).reshape(len(keys), -(-len(self.outputs) // 8))
+            results = np.unpackbits(packed, axis=1)[:, : len(self.outputs)]
+            return [
+                dict(zip(self.outputs, row)) for row in results.astype(bool).tolist()
+            ]
+
+    def _reduction(self, reduce, expected, allow_x=False, observe=None):
+        # The mode, plusargs, mask, and expected values of a reduction
+        if reduce not in reduce_modes:
+            raise ValueError(
+                f"Unknown reduction '{reduce}', expected one of "
+                f"{', '.join(reduce_modes)}"
+            )
+        if allow_x or observe is not None:
+            raise ValueError("Cannot reduce x-based or observed simulations")
+        mask = np.zeros(len(self.outputs), dtype=bool)
+        values = np.zeros(len(self.outputs), dtype=bool)
+        if reduce in ["match", "mismatch"]:
+            if not expected:
+                raise ValueError(f"Expected outputs are required for '{reduce}'")
+            unknown = set(expected) - set(self.outputs)
+            if unknown:
+                raise ValueError(f"Cannot compare unknown outputs {sorted(unknown)}")
+            index = {o: i for i, o in enumerate(self.outputs)}
+            for o, v in expected.items():
+                mask[index[o]] = True
+                values[index[o]] = _convert_value(v) == "1"
+        # The first output is the most significant bit of the testbench's
+        # output vector.
+        args = [
+            f"+reduce={reduce_modes[reduce]}",
+            f"+mask={int(''.join(str(int(b)) for b in mask), 2):x}",
+            f"+expected={int(''.join(str(int(b)) for b in values), 2):x}",
+        ]
+        return reduce, args, mask, values
+
+    def _simulate_reduced(self, bits, num_processes, reduction, chunk_size=65536):
+        reduce, args, mask, values = reduction
+        if self.simulator == "native":
+            parts = []
+            for start in range(0, len(bits), chunk_size):
+                chunk = bits[start : start + chunk_size]
+                with self.stats.phase("execute"):
+                    words = self.native.simulate_packed(pack_bits(chunk))
+                    results = unpack_bits(words, len(chunk))
+                with self.stats.phase("decode"):
+                    parts.append(reduce_bits(results, reduce, start, mask, values))
+        else:
+            # Reductions are not supported by persistent processes, so new
+            # processes are always started.
+            wire_format, record_args, _ = self._record(False, None)
+            shards = shard(len(bits), num_processes)
+            parts = self._run(
+                (_encode_bits(bits[r.start : r.stop], wire_format) for r in shards),
+                _decode_reduced,
+                args=record_args + args,
+                shard_args=[[f"+start={r.start:x}"] for r in shards],
+            )
+        return self._reduced(reduce, parts)
+
+    def _reduced(self, reduce, parts):
+        combined = _combine_reduced(reduce, parts, len(self.outputs))
+        if reduce in ["match", "mismatch"]:
+            return combined.tolist()
+        return dict(zip(self.outputs, combined.tolist()))
+
+    def _encode_vectors(self, vectors, allow_x):
+        return _encode_vectors(
             vectors,
-            self.working_dir,
-            num_processes,
+            self.inputs,
             allow_x=allow_x,
+            wire_format=self._record(allow_x, None)[0],
+        )
+
+    def _decode_vectors(self, data, allow_x, observe=None):
+        wire_format, _, fields = self._record(allow_x, observe)
+        if observe is None:
+            return _decode_vectors(
+                data, fields, allow_x=allow_x, wire_format=wire_format
+            )
+        names = self.outputs + list(observe)
+        if allow_x:
+            results = _decode_vectors(data, fields, allow_x=True)
+            return [{n: r[n] for n in names} for r in results]
+        bits = _decode_bits(data, len(fields), wire_format)
+        bits = bits[:, [self._net_index[n] for n in names]]
+        return [dict(zip(names, row)) for row in bits.tolist()]
+
+    def _shards(self, vectors, num_processes, allow_x):
+        for r in shard(len(vectors), num_processes):
+            yield self._encode_vectors(vectors[r.start : r.stop], allow_x)
+
+    def simulate_iter(
+        self, vectors, chunk_size=10000, num_processes=1, allow_x=False, observe=None
+    ):
+        """
+        Lazily execute the simulator on an iterable of vectors.
+
+        Vectors are consumed `chunk_size` at a time, so memory use does not
+        grow with the total number of vectors and results are available
+        before the iterable is exhausted.
+
+        Parameters
+        ----------
+        vectors: iterable of dict of str:bool
+                The vectors to simulate. Each vector is represented as a
+                dictionary mapping an input to a logical value. May be an
+                unbounded generator.
+        chunk_size: int
+                The number of vectors to simulate at a time.
+        num_process: int
+                The number of simulation processes to run for each chunk.
+        allow_x: bool
+                If True, the inputs/outputs can contain "x" or "z" values
+                in addition to 0 and 1.
+        observe: list of str
+                Internal nets to record in addition to the outputs.
+
+        Yields
+        ------
+        dict of str:bool or str:str
+                The simulation output of each vector, in order. See
+                `simulate`.
+
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        vectors = iter(vectors)
+        # Recorded as a single call, with each chunk continuing it
+        record = self.stats.begin()
+        while True:
+            with self.stats.call(record):
+                chunk = list(itertools.islice(vectors, chunk_size))
+                if not chunk:
+                    return
+                outputs = self.simulate(
+                    chunk, num_processes, allow_x=allow_x, observe=observe
+                )
+            yield from outputs
+
+    def simulate_incremental(self, vectors, reset=False):
+        """
+        Simulate a sequence of vectors that differ in only a few inputs.
+
+        Node values are kept from the previous vector, including across
+        calls, and only the transitive fanout of the inputs that changed is
+        re-evaluated. This is much faster than `simulate` for low-activity
+        sequences such as Gray-code sweeps or single key-bit flips. The
+        simulation always runs in-process, regardless of `simulator`.
+
+        Parameters
+        ----------
+        vectors: list of dict of str:bool
+                The vectors to simulate, in order. The first vector after a
+                reset must provide every input; later vectors only need to
+                provide the inputs that change.
+        reset: bool
+                If True, the values from previous calls are discarded.
+
+        Returns
+        -------
+        list of dict of str:bool
+                The simulation outputs. Each vector is represented as a
+                dictionary mapping an output to a logical value.
+
+        """
+        with self.stats.call():
+            if self.event_simulator is None:
+                with self.stats.phase("compile"):
+                    self.event_simulator = EventSimulator(
+                        self._levelized, self.inputs, self.outputs
+                    )
+            if reset:
+                self.event_simulator.reset()
+            with self.stats.phase("execute"):
+                return self.event_simulator.simulate(vectors)
+
+    def simulate_sequence(
+        self, vectors, initial_state=None, reg_d_port=None, reg_q_port=None
+    ):
+        """
+        Simulate a sequential circuit over a sequence of clock cycles.
+
+        Every blackbox in the circuit is treated as a flip-flop that loads
+        its D port on each cycle and drives its Q port; other pins (e.g.,
+        the clock) are ignored. The flip-flops are replaced by state that
+        is kept inside the simulator, so the whole sequence is simulated by
+        a single process. The simulation is compiled once per simulator,
+        separately from the combinational simulation used by `simulate`.
+
+        Parameters
+        ----------
+        vectors: list of dict of str:bool
+                The inputs for each cycle, in order.
+        initial_state: dict of str:bool
+                The initial value of each flip-flop, keyed by blackbox
+                instance name. Flip-flops that are not given start at 0.
+        reg_d_port: str
+                The name of the D port of the flip-flops. If `None`, the
+                input pin named 'd' or 'D' is used.
+        reg_q_port: str
+                The name of the Q port of the flip-flops. If `None`, the
+                only output pin is used.
+
+        Returns
+        -------
+        list of dict of str:bool
+                The value of each output during each cycle, before the
+                flip-flops are loaded.
+
+        """
+        if not self.ckt.blackboxes:
+            return self.simulate(vectors)
+        key = (reg_d_port, reg_q_port)
+        if key not in self.sequential_simulators:
+            simulator = self.simulator
+            if simulator == "auto":
+                # Sequences are not split between processes
+                simulator = self._choose(len(vectors))[0]
+            self.sequential_simulators[key] = self._sequential_simulator(
+                reg_d_port, reg_q_port, simulator
+            )
+        simulator = self.sequential_simulators[key]
+        flops = [f for f, _, _ in simulator._state_names]
+        initial_state = initial_state or {}
+        unknown = set(initial_state) - set(flops)
+        if unknown:
+            raise ValueError(f"Unknown flip-flops {sorted(unknown)}")
+        state = [_convert_value(initial_state.get(f, 0)) == "1" for f in flops]
+        with self.stats.call():
+            return simulator._simulate_sequence(vectors, state)
+
+    def _sequential_simulator(self, reg_d_port, reg_q_port, simulator):
+        ports = {}
+        for name, bb in self.ckt.blackboxes.items():
+            d = reg_d_port or next((p for p in bb.inputs() if p in ["d", "D"]), None)
+            q = reg_q_port
+            if q is None and len(bb.outputs()) == 1:
+                q = next(iter(bb.outputs()))
+            if d not in bb.inputs() or q not in bb.outputs():
+                raise ValueError(
+                    f"Cannot determine the D and Q ports of blackbox '{name}'"
+                )
+            ports[name] = (d, q)
+        ignore_pins = {
+            p
+            for name, bb in self.ckt.blackboxes.items()
+            for p in bb.inputs() | bb.outputs()
+        } - {p for d, q in ports.values() for p in [d, q]}
+        core = cg.tx.strip_blackboxes(self.ckt, ignore_pins=list(ignore_pins))
+        state_names = [
+            (name, f"{name}_{d}", f"{name}_{q}")
+            for name, (d, q) in natsorted(ports.items())
+        ]
+        q_nodes = {q for _, _, q in state_names}
+        # Inputs that only drove ignored pins (e.g., the clock) are unused
+        for i in core.inputs() - q_nodes:
+            if not core.fanout(i) and not core.is_output(i):
+                core.remove(i)
+
+        simulator = CircuitSimulator(
+            core,
+            self.working_dir / f"sequential_{len(self.sequential_simulators)}",
+            simulator=simulator,
+            cache=self.cache,
+            wire_format=self._wire_format(simulator),
+            compile_profile=self.compile_profile,
         )
-        return parse_simulation_output(
-            self.working_dir, self.outputs, num_processes, allow_x=allow_x
+        simulator.inputs = natsorted(core.inputs() - q_nodes)
+        simulator.outputs = list(self.outputs)
+        simulator._state_names = state_names
+        simulator._state = [(d, q) for _, d, q in state_names]
+        # Record the sequential simulation in this simulator's statistics
+        simulator.stats = simulator.executor.stats = self.stats
+        return simulator
+
+    def _simulate_sequence(self, vectors, state):
+        d_nodes = [d for d, _ in self._state]
+        q_nodes = [q for _, q in self._state]
+        bits = _vectors_to_bits(vectors, self.inputs)
+        if self.simulator == "native":
+            if self.event_simulator is None:
+                with self.stats.phase("compile"):
+                    self.event_simulator = EventSimulator(
+                        self.ckt, self.inputs + q_nodes, self.outputs + d_nodes
+                    )
+            self.event_simulator.reset()
+            results = []
+            with self.stats.phase("execute"):
+                for row in bits.tolist():
+                    values = self.event_simulator.apply(
+                        {**dict(zip(self.inputs, row)), **dict(zip(q_nodes, state))}
+                    )
+                    results.append({o: values[o] for o in self.outputs})
+                    state = [values[d] for d in d_nodes]
+            return results
+        self._prepare(None)
+        wire_format, args, _ = self._record(False, None)
+        data = _encode_bits(np.array([state], dtype=np.uint8), wire_format)
+        data += _encode_bits(bits, wire_format)
+        return self._run(
+            [data], lambda data: self._decode_vectors(data, False), args=args
+        )[0]
+
+    def simulate_faults(self, vectors, faults=None, drop=True):
+        """
+        Find the stuck-at faults detected by each vector.
+
+        Each fault is simulated without modifying or recompiling the
+        circuit, using parallel-pattern single-fault propagation on blocks
+        of vectors. The simulation always runs in-process, regardless of
+        `simulator`.
+
+        Parameters
+        ----------
+        vectors: list of dict of str:bool or numpy.ndarray
+                The vectors to simulate, either as dictionaries mapping an
+                input to a logical value or as a `(num_vectors,
+                len(inputs))` array with columns in the order of `inputs`.
+        faults: list of tuple of str, bool
+                The faults to simulate, each a `(node, value)` pair for the
+                node stuck at the value. If `None`, both stuck-at faults on
+                every net are simulated.
+        drop: bool
+                If True, a fault is dropped once it has been detected, so
+                it is only reported for the first vector that detects it.
+
+        Returns
+        -------
+        list of list of tuple of str, bool
+                The faults detected by each vector.
+
+        Examples
+        --------
+        >>> import circuitgraph as cg
+        >>> simulator = CircuitSimulator(cg.from_lib("c17"), simulator="native")
+        >>> vectors = [{"N1": 0, "N2": 0, "N3": 0, "N6": 0, "N7": 0}]
+        >>> simulator.simulate_faults(vectors, faults=[("N10", 0), ("N10", 1)])
+        [[('N10', False)]]
+
+        """
+        with self.stats.call():
+            if self.fault_simulator is None:
+                with self.stats.phase("compile"):
+                    self.fault_simulator = FaultSimulator(
+                        self._levelized, self.inputs, self.outputs
+                    )
+            if faults is None:
+                faults = stuck_at_faults(self.nets)
+            with self.stats.phase("encode"):
+                bits = self._vectors_to_bits(vectors)
+            with self.stats.phase("execute"):
+                return self.fault_simulator.simulate_faults(bits, faults, drop=drop)
+
+    def simulate_activity(self, vectors, chunk_size=65536):
+        """
+        Measure the switching activity of every net over a vector sequence.
+
+        Toggle counts and signal probabilities are accumulated during the
+        simulation, so only the aggregate table is kept rather than the
+        value of every net for every vector. The simulation always runs
+        in-process, regardless of `simulator`.
+
+        Parameters
+        ----------
+        vectors: list of dict of str:bool or numpy.ndarray
+                The vectors to simulate, in the order they are applied,
+                either as dictionaries mapping an input to a logical value
+                or as a `(num_vectors, len(inputs))` array with columns in
+                the order of `inputs`.
+        chunk_size: int
+                The number of vectors to evaluate at a time.
+
+        Returns
+        -------
+        dict of str:int
+                The number of times each net changes value between
+                consecutive vectors.
+        dict of str:float
+                The fraction of vectors for which each net is 1.
+
+        Examples
+        --------
+        >>> import circuitgraph as cg
+        >>> import numpy as np
+        >>> simulator = CircuitSimulator(cg.from_lib("c17"), simulator="native")
+        >>> vectors = np.zeros((4, len(simulator.inputs)), dtype=int)
+        >>> vectors[1:3, simulator.inputs.index("N3")] = 1
+        >>> toggles, probabilities = simulator.simulate_activity(vectors)
+        >>> toggles["N3"], probabilities["N3"]
+        (2, 0.5)
+
+        """
+        with self.stats.call():
+            if self.native is None:
+                with self.stats.phase("compile"):
+                    self.native = NativeSimulator(
+                        self._levelized, self.inputs, self.outputs
+                    )
+            with self.stats.phase("encode"):
+                bits = self._vectors_to_bits(vectors)
+            with self.stats.phase("execute"):
+                toggles, ones = self.native.activity(bits, chunk_size=chunk_size)
+        index = [self.native.index[n] for n in self.nets]
+        probabilities = ones[index] / max(len(bits), 1)
+        return (
+            dict(zip(self.nets, toggles[index].tolist())),
+            dict(zip(self.nets, probabilities.tolist())),
         )
+
+    def _vectors_to_bits(self, vectors):
+        if isinstance(vectors, np.ndarray):
+            if vectors.ndim != 2 or vectors.shape[1] != len(self.inputs):
+                raise ValueError(f"Expected {len(self.inputs)} values per vector")
+            return (vectors != 0).view(np.uint8)
+        return _vectors_to_bits(vectors, self.inputs)
+
+    def simulate_array(
+        self,
+        vectors,
+        num_processes=1,
+        packed=False,
+        observe=None,
+        reduce=None,
+        expected=None,
+    ):
+        """
+        Execute the simulator on an array of vectors.
+
+        Encoding and decoding are vectorized, so this avoids the
+        per-value Python overhead of `simulate` for large vector sets.
+
+        Parameters
+        ----------
+        vectors: numpy.ndarray
+                A `(num_vectors, len(inputs))` array of bool/0/1 values,
+                with columns in the order of `inputs`. If `packed` is True,
+                a `(num_vectors, ceil(len(inputs) / 8))` array of `uint8`
+                as returned by `numpy.packbits(vectors, axis=1)`.
+        num_process: int
+                The number of simulation processes to run. Specifying a
+                number more than 1 will cause multiple simulations to be
+                executed in parallel. Ignored for persistent simulators,
+                and chosen by the cost model of 'auto' simulators.
+        packed: bool
+                If True, the inputs are and the outputs will be packed
+                8 per byte along the second axis.
+        observe: list of str
+                Internal nets to record in addition to the outputs. See
+                `simulate`.
+        reduce: str
+                If provided, the outputs are reduced to a summary. See
+                `simulate`.
+        expected: dict of str:bool
+                The expected outputs of 'match' and 'mismatch' reductions.
+                See `simulate`.
+
+        Returns
+        -------
+        numpy.ndarray
+                A `(num_vectors, len(outputs))` boolean array, with columns
+                in the order of `outputs`. If `packed` is True, a
+                `(num_vectors, ceil(len(outputs) / 8))` array of `uint8`.
+                Observed nets are appended as additional columns, in the
+                order given. If `reduce` is provided, the summary returned
+                by `simulate` instead.
+
+        Examples
+        --------
+        >>> import circuitgraph as cg
+        >>> import numpy as np
+        >>> simulator = CircuitSimulator(cg.from_lib("c17"), simulator="native")
+        >>> simulator.inputs
+        ['N1', 'N2', 'N3', 'N6', 'N7']
+        >>> simulator.simulate_array(np.array([[0, 1, 0, 1, 0], [1, 0, 0, 1, 1]]))
+        array([[ True,  True],
+               [False,  True]])
+
+        """
+        with self.stats.call():
+            return self._simulate_array(
+                vectors, num_processes, packed, observe, reduce, expected
+            )
+
+    def _simulate_array(
+        self, vectors, num_processes, packed, observe, reduce=None, expected=None
+    ):
+        if self.simulator == "auto":
+            return self._simulate_auto(
+                len(vectors),
+                observe,
+                lambda simulator, num_processes: simulator._simulate_array(
+                    vectors, num_processes, packed, observe, reduce, expected
+                ),
+            )
+        if reduce is not None:
+            reduction = self._reduction(reduce, expected, observe=observe)
+        vectors = np.asarray(vectors)
+        if vectors.ndim != 2:
+            raise ValueError("Vectors must be a 2-dimensional array")
+        if packed:
+            if vectors.shape[1] != -(-len(self.inputs) // 8):
+                raise ValueError(
+                    f"Expected {-(-len(self.inputs) // 8)} bytes per packed vector"
+                )
+            bits = np.unpackbits(vectors.astype(np.uint8), axis=1)
+            bits = bits[:, : len(self.inputs)]
+        else:
+            if vectors.shape[1] != len(self.inputs):
+                raise ValueError(f"Expected {len(self.inputs)} values per vector")
+            bits = (vectors != 0).view(np.uint8)
+        if reduce is not None:
+            self._prepare(None)
+            return self._simulate_reduced(bits, num_processes, reduction)
+        self._prepare(observe)
+
+        wire_format, args, fields = self._record(False, observe)
+        if self.simulator == "native":
+            with self.stats.phase("execute"):
+                words = self.native.simulate_packed(pack_bits(bits), observe)
+                results = unpack_bits(words, len(bits)).astype(bool)
+        else:
+            if self.persistent:
+                with self.stats.phase("encode"):
+                    data = _encode_bits(bits, wire_format)
+                data = self._communicate(data, len(bits), False, observe)
+                with self.stats.phase("decode"):
+                    results = _decode_bits(data, len(fields), wire_format)
+            else:
+                results = self._run(
+                    (
+                        _encode_bits(bits[r.start : r.stop], wire_format)
+                        for r in shard(len(bits), num_processes)
+                    ),
+                    lambda data: _decode_bits(data, len(fields), wire_format),
+                    args=args,
+                )
+                results = np.concatenate(
+                    results or [np.empty((0, len(fields)), dtype=bool)]
+                )
+            if observe is not None:
+                names = self.outputs + list(observe)
+                results = results[:, [self._net_index[n] for n in names]]
+
+        if packed:
+            return np.packbits(results, axis=1)
+        return results
+
+    def simulate_random(
+        self,
+        num_vectors,
+        seed=0,
+        num_processes=1,
+        return_patterns=False,
+        reduce=None,
+        expected=None,
+        start=0,
+    ):
+        """
+        Simulate pseudorandom vectors generated by the simulator.
+
+        The vectors are generated inside the testbench (or harness, or
+        in-process engine) rather than in Python, so no input files are
+        written. Vector `k` only depends on `seed` and `k`, so the same
+        seed always gives the same vectors, with any simulator and any
+        number of processes. See `circuitsim.patterns.random_patterns`.
+
+        Parameters
+        ----------
+        num_vectors: int
+                The number of vectors to simulate.
+        seed: int
+                The seed of the generator.
+        num_process: int
+                The number of simulation processes to run, each generating
+                a contiguous range of the vectors. Persistent simulators
+                also start new processes.
+        return_patterns: bool
+                If True, the generated vectors are returned too.
+        reduce: str
+                If provided, the outputs are reduced to a summary. See
+                `simulate`.
+        expected: dict of str:bool
+                The expected outputs of 'match' and 'mismatch' reductions.
+                See `simulate`.
+        start: int
+                The index of the first vector, so that a long sequence of
+                vectors can be simulated over several calls. Vector indices
+                (and signatures) are those of the whole sequence, so
+                'match' and 'mismatch' reductions return indices from
+                `start` on, and the signatures of consecutive calls can be
+                combined with xor.
+
+        Returns
+        -------
+        numpy.ndarray
+                A `(num_vectors, len(outputs))` boolean array, with columns
+                in the order of `outputs`, or the summary returned by
+                `simulate` if `reduce` is provided. If `return_patterns` is
+                True, a tuple of a `(num_vectors, len(inputs))` boolean
+                array of the vectors, with columns in the order of
+                `inputs`, and the outputs.
+
+        Examples
+        --------
+        >>> import circuitgraph as cg
+        >>> simulator = CircuitSimulator(cg.from_lib("c17"), simulator="native")
+        >>> patterns, results = simulator.simulate_random(
+        ...     1000, seed=1, return_patterns=True
+        ... )
+        >>> patterns.shape, results.shape
+        ((1000, 5), (1000, 2))
+        >>> bool((simulator.simulate_array(patterns) == results).all())
+        True
+
+        """
+        if num_vectors < 0:
+            raise ValueError("num_vectors must be at least 0")
+        if start < 0:
+            raise ValueError("start must be at least 0")
+        return self._simulate_generated(
+            "random",
+            num_vectors,
+            seed,
+            num_processes,
+            return_patterns,
+            reduce,
+            expected,
+            start,
+        )
+
+    def simulate_exhaustive(
+        self, num_processes=1, return_patterns=False, reduce=None, expected=None
+    ):
+        """
+        Simulate every input combination, generated by the simulator.
+
+        The vectors are generated inside the testbench (or harness, or
+        in-process engine) by a binary counter, with the first input as the
+        most significant bit, so no input files are written.
+
+        Parameters
+        ----------
+        num_process: int
+                The number of simulation processes to run, each counting
+                through a contiguous range of the vectors. Persistent
+                simulators also start new processes.
+        return_patterns: bool
+                If True, the generated vectors are returned too.
+        reduce: str
+                If provided, the outputs are reduced to a summary. See
+                `simulate`.
+        expected: dict of str:bool
+                The expected outputs of 'match' and 'mismatch' reductions.
+                See `simulate`.
+
+        Returns
+        -------
+        numpy.ndarray
+                A `(2 ** len(inputs), len(outputs))` boolean array, with
+                columns in the order of `outputs`, or the summary returned
+                by `simulate` if `reduce` is provided. If `return_patterns`
+                is True, a tuple of a `(2 ** len(inputs), len(inputs))`
+                boolean array of the vectors and the outputs.
+
+        Examples
+        --------
+        >>> import circuitgraph as cg
+        >>> simulator = CircuitSimulator(cg.from_lib("c17"), simulator="native")
+        >>> simulator.simulate_exhaustive().shape
+        (32, 2)
+        >>> simulator.simulate_exhaustive(reduce="ones")
+        {'N22': 18, 'N23': 18}
+
+        """
+        if len(self.inputs) > max_exhaustive_inputs:
+            raise ValueError(
+                f"Cannot exhaustively simulate more than {max_exhaustive_inputs} "
+                "inputs"
+            )
+        return self._simulate_generated(
+            "exhaustive",
+            2 ** len(self.inputs),
+            0,
+            num_processes,
+            return_patterns,
+            reduce,
+            expected,
+        )
+
+    def _simulate_generated(
+        self,
+        mode,
+        num_vectors,
+        seed,
+        num_processes,
+        return_patterns,
+        reduce=None,
+        expected=None,
+        first=0,
+        chunk_size=65536,
+    ):
+        with self.stats.call():
+            if self.simulator == "auto":
+                return self._simulate_auto(
+                    num_vectors,
+                    None,
+                    lambda simulator, num_processes: simulator._simulate_generated(
+                        mode,
+                        num_vectors,
+                        seed,
+                        num_processes,
+                        return_patterns,
+                        reduce,
+                        expected,
+                        first,
+                        chunk_size,
+                    ),
+                )
+            reduction = None
+            if reduce is not None:
+                reduction = self._reduction(reduce, expected)
+            self._prepare(None)
+            if self.simulator == "native" and reduction is not None:
+                parts = []
+                for start in range(first, first + num_vectors, chunk_size):
+                    count = min(chunk_size, first + num_vectors - start)
+                    with self.stats.phase("encode"):
+                        bits = generate_patterns(
+                            mode, len(self.inputs), start, count, seed
+                        )
+                    with self.stats.phase("execute"):
+                        words = self.native.simulate_packed(pack_bits(bits))
+                        results = unpack_bits(words, count)
+                    with self.stats.phase("decode"):
+                        parts.append(
+                            reduce_bits(results, reduce, start, *reduction[2:])
+                        )
+                results = self._reduced(reduce, parts)
+            elif self.simulator == "native":
+                results = np.empty((num_vectors, len(self.outputs)), dtype=bool)
+                for start in range(first, first + num_vectors, chunk_size):
+                    count = min(chunk_size, first + num_vectors - start)
+                    with self.stats.phase("encode"):
+                        bits = generate_patterns(
+                            mode, len(self.inputs), start, count, seed
+                        )
+                    with self.stats.phase("execute"):
+                        words = self.native.simulate_packed(pack_bits(bits))
+                        results[start - first : start - first + count] = unpack_bits(
+                            words, count
+                        )
+            else:
+                wire_format, args, _ = self._record(False, None)
+                shards = shard(num_vectors, num_processes)
+                parse = functools.partial(
+                    _decode_bits, num_outputs=len(self.outputs), wire_format=wire_format
+                )
+                if reduction is not None:
+                    args += reduction[1]
+                    parse = _decode_reduced
+                # Each process generates its own vectors, so its input file
+                # is empty.
+                results = self._run(
+                    (b"" for _ in shards),
+                    parse,
+                    args=args,
+                    shard_args=[
+                        [
+                            f"+generate={generate_modes[mode]}",
+                            f"+start={first + r.start:x}",
+                            f"+count={len(r):x}",
+                            f"+seed={seed % 2**64:x}",
+                        ]
+                        for r in shards
+                    ],
+                )
+                if reduction is not None:
+                    results = self._reduced(reduce, results)
+                else:
+                    results = np.concatenate(
+                        results or [np.empty((0, len(self.outputs)), dtype=bool)]
+                    )
+            if not return_patterns:
+                return results
+            with self.stats.phase("encode"):
+                patterns = generate_patterns(
+                    mode, len(self.inputs), first, num_vectors, seed
+                ).astype(bool)
+            return patterns, results
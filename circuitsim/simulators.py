@@ -1,10 +1,27 @@
 """Interface with simulators."""
-import math
+import asyncio
+import mmap
+import os
+import select
+import shutil
 import subprocess
-from multiprocessing import Pool
+import tempfile
+import threading
 from pathlib import Path
 
-available_simulators = ["iverilog", "verilator", "vcs"]
+import numpy as np
+
+from circuitsim.patterns import splitmix64
+from circuitsim.stats import SimulationStats
+
+available_simulators = ["iverilog", "verilator", "vcs", "native"]
+wire_formats = {
+    "ascii": ["iverilog", "verilator", "vcs"],
+    "hex": ["iverilog", "verilator", "vcs"],
+    "packed": ["verilator"],
+}
+wire_format_args = {"hex": ["+hex"]}
+reduce_modes = {"signature": 1, "ones": 2, "match": 3, "mismatch": 4}
 
 compile_args = {
     "vcs": ["vcs", "-full64"],
@@ -12,6 +29,27 @@ compile_args = {
     "verilator": ["verilator", "--exe", "tb.cpp", "--cc"],
 }
 post_compile_args = {"verilator": ["make", "-C", "obj_dir", "-f", "Vtb.mk"]}
+compile_profiles = {
+    "default": {},
+    # Many small translation units compiled in parallel with little
+    # optimization, for netlists that would otherwise take too long to build.
+    "fast-compile": {
+        "output_split": 5000,
+        "jobs": "auto",
+        "opt_fast": "-O1",
+        "opt_slow": "-O0",
+    },
+    # Fully optimized, with multithreaded evaluation for wide designs.
+    "fast-run": {
+        "output_split": 20000,
+        "jobs": "auto",
+        "threads": "auto",
+        "opt_fast": "-O3",
+        "opt_slow": "-O1",
+    },
+}
+# The number of nodes per evaluation thread of a profile with "auto" threads
+nodes_per_thread = 100000
 simulate_args = {
     "vcs": ["./simv", "-q"],
     "iverilog": ["vvp", "a.out"],
@@ -19,6 +57,41 @@ simulate_args = {
 }
 
 
+def _default_max_processes():
+    value = os.environ.get("CIRCUITSIM_MAX_PROCESSES")
+    return int(value) if value else os.cpu_count() or 1
+
+
+# Limits the simulation processes running at once across every simulator
+# (and thread) of this Python process.
+_process_slots = threading.BoundedSemaphore(_default_max_processes())
+
+
+def set_max_processes(max_processes):
+    """
+    Set how many simulation processes can run at once.
+
+    The limit is shared by every simulator in this Python process, so that
+    concurrent calls (e.g., from several threads of a service) do not start
+    more processes than there are cores. Shards beyond the limit are
+    launched as earlier ones finish. The default is the number of CPUs, or
+    the `CIRCUITSIM_MAX_PROCESSES` environment variable if it is set.
+    Persistent simulation processes are not counted.
+
+    Parameters
+    ----------
+    max_processes: int
+            The maximum number of simulation processes.
+
+    """
+    global _process_slots
+    if max_processes < 1:
+        raise ValueError("At least one simulation process must be allowed")
+    # Processes that are already running release the semaphore that they
+    # acquired.
+    _process_slots = threading.BoundedSemaphore(max_processes)
+
+
 class SimulationCompilationError(Exception):
     """Thrown when a simulation fails during compilation."""
 
@@ -41,7 +114,127 @@ def _convert_values(values, allow_x=False):
     return {k: _convert_value(v, allow_x=allow_x) for k, v in values.items()}
 
 
-def compile_simulator(simulator, netlists, working_dir):
+def _format_vector(vector, inputs, allow_x=False):
+    vector = _convert_values(vector, allow_x=allow_x)
+    try:
+        return "".join(vector[i] for i in inputs)
+    except KeyError as e:
+        missing_inputs = ", ".join(set(inputs) - set(vector))
+        if len(missing_inputs) > 20:
+            missing_inputs = missing_inputs[:17] + "..."
+        raise ValueError(f"Value not provided for inputs '{missing_inputs}'") from e
+
+
+compile_sources = {"verilator": ["tb.cpp"]}
+
+
+def _available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        # Not available on macOS
+        return os.cpu_count() or 1
+
+
+def _resolve_profile(profile):
+    if isinstance(profile, str):
+        if profile not in compile_profiles:
+            raise ValueError(
+                f"Unknown compile profile '{profile}'. "
+                f"Valid profiles: {', '.join(compile_profiles)}"
+            )
+        profile = compile_profiles[profile]
+    unknown = set(profile) - {
+        "output_split",
+        "jobs",
+        "threads",
+        "opt_fast",
+        "opt_slow",
+    }
+    if unknown:
+        raise ValueError(f"Unknown compile profile options {sorted(unknown)}")
+    return profile
+
+
+def compile_commands(simulator, profile="default", num_nodes=0):
+    """
+    Get the commands that compile a simulation with a profile.
+
+    Profiles only change how verilator builds the simulation; the other
+    simulators are compiled the same way with every profile.
+
+    Parameters
+    ----------
+    simulator: str
+            The simulator to use.
+    profile: str or dict
+            The name of a profile in `compile_profiles`, or a dict with
+            any of the following options:
+
+            - 'output_split': split the generated C++ into files of about
+              this many statements (and functions into about a tenth as
+              many), so that they can be compiled in parallel and each
+              compiler process needs less memory.
+            - 'jobs': the number of files to compile in parallel, or
+              'auto' for the number of CPUs available to this process.
+            - 'threads': the number of threads that evaluate the model, or
+              'auto' for one per `nodes_per_thread` nodes, up to the number
+              of CPUs available to this process.
+            - 'opt_fast' and 'opt_slow': the C++ compiler optimization
+              flags of the code that is run for every vector and of the
+              code that only runs at startup.
+    num_nodes: int
+            The number of nodes in the circuit, which sets the number of
+            'auto' threads.
+
+    Returns
+    -------
+    list of list of str
+            The commands to run in order.
+    list of list of str
+            The same commands without the options that depend on the
+            machine (the number of parallel jobs), which identify the
+            compiled simulation.
+
+    """
+    profile = _resolve_profile(profile)
+    commands = [
+        list(compile_args[simulator]),
+        list(post_compile_args.get(simulator, [])),
+    ]
+    key = [list(c) for c in commands]
+    if simulator != "verilator":
+        return commands, key
+    cpus = _available_cpus()
+    options = []
+    if profile.get("output_split"):
+        split = profile["output_split"]
+        options += ["--output-split", str(split)]
+        options += ["--output-split-cfuncs", str(max(1, split // 10))]
+    threads = profile.get("threads")
+    if threads == "auto":
+        threads = min(cpus, num_nodes // nodes_per_thread)
+    if threads and threads > 1:
+        # The harness sizes the thread pool to match the model
+        options += ["--threads", str(threads)]
+        options += ["-CFLAGS", f"-DCIRCUITSIM_THREADS={threads}"]
+    make_options = [
+        f"{v.upper()}={profile[v]}" for v in ["opt_fast", "opt_slow"] if v in profile
+    ]
+    for c in [commands, key]:
+        c[0] += options
+        c[1] += make_options
+    jobs = profile.get("jobs")
+    if jobs == "auto":
+        jobs = cpus
+    if jobs and jobs > 1:
+        commands[1] += ["-j", str(jobs)]
+    return commands, key
+
+
+def compile_simulator(
+    simulator, netlists, working_dir, cache=None, profile="default", num_nodes=0
+):
     """
     Compile a circuit simulation.
 
@@ -53,14 +246,37 @@ def compile_simulator(simulator, netlists, working_dir):
             The netlists to compile.
     working_dir: str or pathlib.Path
             The path to comiple the simulation in.
+    cache: circuitsim.cache.CompileCache
+            If provided, the compiled simulation is copied from the cache
+            when an identical compilation has been stored, and stored in the
+            cache otherwise.
+    profile: str or dict
+            The compile profile. See `compile_commands`.
+    num_nodes: int
+            The number of nodes in the circuit. See `compile_commands`.
+
+    Returns
+    -------
+    bool
+            True if the simulation was built, or False if it was copied
+            from the cache.
 
     """
     netlists = [str(Path(n).absolute()) for n in netlists]
     working_dir = Path(working_dir)
+    commands, key_commands = compile_commands(simulator, profile, num_nodes)
+    if cache is not None:
+        key = cache.key(
+            simulator,
+            key_commands,
+            netlists + [working_dir / s for s in compile_sources.get(simulator, [])],
+        )
+        if cache.fetch(key, simulator, working_dir):
+            return False
     with open(working_dir / "compile.log", "w+") as f:
         try:
             subprocess.run(
-                compile_args[simulator] + netlists,
+                commands[0] + netlists,
                 cwd=working_dir,
                 stdout=f,
                 stderr=f,
@@ -71,11 +287,11 @@ def compile_simulator(simulator, netlists, working_dir):
             message = f.read()
             raise SimulationCompilationError(message) from e
 
-    if simulator in post_compile_args:
+    if commands[1]:
         with open(working_dir / "post_compile.log", "w+") as f:
             try:
                 subprocess.run(
-                    post_compile_args[simulator],
+                    commands[1],
                     cwd=working_dir,
                     stdout=f,
                     stderr=f,
@@ -86,17 +302,426 @@ def compile_simulator(simulator, netlists, working_dir):
                 message = f.read()
                 raise SimulationCompilationError(message) from e
 
+    if cache is not None:
+        cache.store(key, simulator, working_dir)
+    return True
+
+
+def shard(num_vectors, num_processes):
+    """
+    Split vectors into evenly sized contiguous shards.
+
+    Parameters
+    ----------
+    num_vectors: int
+            The number of vectors to split.
+    num_processes: int
+            The maximum number of shards.
+
+    Returns
+    -------
+    list of range
+            The indices of the vectors in each shard. No shard is empty, so
+            there are fewer than `num_processes` shards when there are
+            fewer vectors than processes.
+
+    """
+    num_shards = min(num_processes, num_vectors)
+    if num_shards == 0:
+        return []
+    bounds = [num_vectors * p // num_shards for p in range(num_shards + 1)]
+    return [range(bounds[p], bounds[p + 1]) for p in range(num_shards)]
+
+
+class SimulationExecutor:
+    """
+    Run shards of a compiled simulation as concurrent processes.
+
+    Each shard's input file is written and its process launched before the
+    next shard is encoded, and each shard's output is parsed as soon as its
+    process finishes, so encoding, execution, and parsing overlap.
+
+    Every call writes its files to its own job directory inside the working
+    directory, so calls from several threads (or asyncio tasks) can share
+    one compiled simulation. Each process takes a slot of the process-wide
+    limit set by `set_max_processes`.
+
+    """
+
+    def __init__(self, simulator, working_dir, stats=None, jobs=True):
+        """
+        Create an executor.
+
+        Parameters
+        ----------
+        simulator: str
+                The simulator to use. The simulation must already be
+                compiled in `working_dir`.
+        working_dir: str or pathlib.Path
+                The directory that the simulation was compiled in.
+        stats: circuitsim.stats.SimulationStats
+                If provided, the time spent producing, writing, running,
+                and parsing each shard is recorded here.
+        jobs: bool
+                If True, the files of each call are written to a temporary
+                job directory that is removed when the call returns.
+                Otherwise, they are written to `working_dir` itself and
+                kept, and concurrent calls are not supported.
+
+        """
+        self.simulator = simulator
+        self.working_dir = Path(working_dir)
+        self.stats = stats if stats is not None else SimulationStats()
+        self.jobs = jobs
+
+    def _job(self):
+        if not self.jobs:
+            return Path(".")
+        return Path(tempfile.mkdtemp(prefix="job_", dir=self.working_dir)).relative_to(
+            self.working_dir
+        )
+
+    def _remove_job(self, job):
+        if self.jobs:
+            shutil.rmtree(self.working_dir / job, ignore_errors=True)
+
+    def _launch(self, job, p, data, args):
+        with self.stats.phase("write"):
+            with open(self.working_dir / job / f"input_file_{p}.txt", "wb") as f:
+                f.write(data)
+        self.stats.add(bytes_written=len(data), processes=1)
+        return (
+            simulate_args[self.simulator]
+            + [
+                f"+input_file={job / f'input_file_{p}.txt'}",
+                f"+output_file={job / f'output_file_{p}.txt'}",
+            ]
+            + list(args),
+            open(self.working_dir / job / f"simulate_{p}.log", "w"),
+        )
+
+    def _finish(self, job, p, returncode, log, parse):
+        log.close()
+        if returncode != 0:
+            with open(self.working_dir / job / f"simulate_{p}.log") as f:
+                message = f.read()
+            raise SimulationExecutionError(message)
+        path = self.working_dir / job / f"output_file_{p}.txt"
+        with self.stats.phase("decode"):
+            self.stats.add(bytes_read=path.stat().st_size)
+            return _read_output(path, parse)
+
+    def run(self, shards, parse, args=(), shard_args=None):
+        """
+        Simulate shards of vectors.
+
+        Parameters
+        ----------
+        shards: iterable of bytes
+                The contents of the input file of each shard. Each shard is
+                launched as soon as it is produced and a process slot is
+                free.
+        parse: callable
+                Called with the contents of each output file.
+        args: list of str
+                Additional arguments (e.g., plusargs) to pass to each
+                process.
+        shard_args: list of list of str
+                If provided, additional arguments to pass to the process of
+                each shard.
+
+        Returns
+        -------
+        list
+                The result of `parse` for each shard, in order.
+
+        """
+        job = self._job()
+        # The shards that are running, each with the slot that it holds
+        running = []
+        results = []
+
+        def finish():
+            p, process, log, slots = running[0]
+            try:
+                with self.stats.phase("execute"):
+                    returncode = process.wait()
+                results.append(self._finish(job, p, returncode, log, parse))
+            finally:
+                running.pop(0)
+                slots.release()
+
+        try:
+            for p, data in enumerate(self.stats.iterate("encode", shards)):
+                slots = _process_slots
+                # Finish this call's own shards while waiting for a slot, so
+                # that calls holding slots cannot wait on each other.
+                while not slots.acquire(blocking=False):
+                    if running:
+                        finish()
+                    else:
+                        with self.stats.phase("execute"):
+                            slots.acquire()
+                        break
+                try:
+                    command, log = self._launch(
+                        job, p, data, list(args) + (shard_args[p] if shard_args else [])
+                    )
+                    process = subprocess.Popen(
+                        command, cwd=self.working_dir, stdout=log, stderr=log
+                    )
+                except BaseException:
+                    slots.release()
+                    raise
+                running.append((p, process, log, slots))
+            while running:
+                finish()
+            return results
+        finally:
+            for _, process, log, slots in running:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                log.close()
+                slots.release()
+            self._remove_job(job)
+
+    async def run_async(self, shards, parse, args=(), shard_args=None):
+        """
+        Simulate shards of vectors without blocking the event loop.
+
+        Parameters
+        ----------
+        shards: iterable of bytes
+                The contents of the input file of each shard. Each shard is
+                launched as soon as it is produced and a process slot is
+                free.
+        parse: callable
+                Called with the contents of each output file.
+        args: list of str
+                Additional arguments (e.g., plusargs) to pass to each
+                process.
+        shard_args: list of list of str
+                If provided, additional arguments to pass to the process of
+                each shard.
+
+        Returns
+        -------
+        list
+                The result of `parse` for each shard, in order.
+
+        """
+        job = self._job()
+        processes = []
+
+        async def wait(p, process, log, slots):
+            try:
+                with self.stats.phase("execute"):
+                    returncode = await process.wait()
+            finally:
+                slots.release()
+            return self._finish(job, p, returncode, log, parse)
+
+        tasks = []
+        loop = asyncio.get_event_loop()
+        try:
+            for p, data in enumerate(self.stats.iterate("encode", shards)):
+                slots = _process_slots
+                if not slots.acquire(blocking=False):
+                    # Block in another thread, so that the event loop (and this
+                    # call's own shards, which free slots) keeps running.
+                    acquired = loop.run_in_executor(None, slots.acquire)
+                    try:
+                        await asyncio.shield(acquired)
+                    except asyncio.CancelledError:
+                        # Give back the slot once it is acquired
+                        acquired.add_done_callback(lambda _, s=slots: s.release())
+                        raise
+                try:
+                    command, log = self._launch(
+                        job, p, data, list(args) + (shard_args[p] if shard_args else [])
+                    )
+                    process = await asyncio.create_subprocess_exec(
+                        *command, cwd=self.working_dir, stdout=log, stderr=log
+                    )
+                except BaseException:
+                    slots.release()
+                    raise
+                processes.append((process, log))
+                tasks.append(asyncio.ensure_future(wait(p, process, log, slots)))
+            return await asyncio.gather(*tasks)
+        finally:
+            for process, log in processes:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                log.close()
+            # Let the waiting tasks see their killed processes and release
+            # their slots.
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._remove_job(job)
+
+
+def _read_output(path, parse):
+    # Map the file instead of reading it so that large outputs are decoded
+    # by NumPy without an intermediate copy.
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return parse(b"")
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return parse(data)
+        finally:
+            try:
+                data.close()
+            except BufferError:
+                # A traceback still references the mapping; it will be
+                # closed when collected.
+                pass
+
+
+def _vectors_to_bits(vectors, inputs):
+    text = "".join(_format_vector(vector, inputs) for vector in vectors)
+    bits = np.frombuffer(text.encode(), dtype=np.uint8) - ord("0")
+    return bits.reshape(len(vectors), len(inputs))
+
+
+def _encode_vectors(vectors, inputs, allow_x=False, wire_format="ascii"):
+    if wire_format != "ascii":
+        return _encode_bits(_vectors_to_bits(vectors, inputs), wire_format)
+    return "".join(
+        _format_vector(vector, inputs, allow_x=allow_x) + "\n" for vector in vectors
+    ).encode()
 
-def _run_process(p, simulator, working_dir):
-    with open(working_dir / f"simulate_{p}.log", "w") as f:
-        return subprocess.run(
-            simulate_args[simulator]
-            + [f"+input_file=input_file_{p}.txt", f"+output_file=output_file_{p}.txt"],
-            cwd=working_dir,
-            stdout=f,
-            stderr=f,
-            check=True,
+
+def _decode_vectors(data, outputs, allow_x=False, wire_format="ascii"):
+    if allow_x:
+        return [
+            _parse_output_line(line, outputs, allow_x=True)
+            for line in bytes(data).decode().splitlines()
+        ]
+    bits = _decode_bits(data, len(outputs), wire_format)
+    return [dict(zip(outputs, row)) for row in bits.tolist()]
+
+
+_hex_digits = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+_hex_values = np.full(256, 255, dtype=np.uint8)
+_hex_values[_hex_digits] = np.arange(16)
+_hex_values[np.frombuffer(b"ABCDEF", dtype=np.uint8)] = np.arange(10, 16)
+
+
+def _encode_bits(bits, wire_format="ascii"):
+    if wire_format == "packed":
+        return np.packbits(bits, axis=1, bitorder="little").tobytes()
+    if wire_format == "hex":
+        # Pad on the left, since the first input is the most significant bit
+        num_digits = -(-bits.shape[1] // 4)
+        padded = np.zeros((bits.shape[0], num_digits * 4), dtype=np.uint8)
+        padded[:, num_digits * 4 - bits.shape[1] :] = bits
+        nibbles = padded.reshape(bits.shape[0], num_digits, 4) @ np.array(
+            [8, 4, 2, 1], dtype=np.uint8
         )
+        lines = np.empty((bits.shape[0], num_digits + 1), dtype=np.uint8)
+        lines[:, :-1] = _hex_digits[nibbles]
+        lines[:, -1] = ord("\n")
+        return lines.tobytes()
+    lines = np.empty((bits.shape[0], bits.shape[1] + 1), dtype=np.uint8)
+    np.add(bits, ord("0"), out=lines[:, :-1], casting="unsafe")
+    lines[:, -1] = ord("\n")
+    return lines.tobytes()
+
+
+def _decode_bits(data, num_outputs, wire_format="ascii"):
+    data = np.frombuffer(data, dtype=np.uint8)
+    if wire_format == "packed":
+        records = data.reshape(-1, -(-num_outputs // 8))
+        bits = np.unpackbits(records, axis=1, bitorder="little")
+        return bits[:, :num_outputs].astype(bool)
+    if wire_format == "hex":
+        num_digits = -(-num_outputs // 4)
+        nibbles = _hex_values[data.reshape(-1, num_digits + 1)[:, :-1]]
+        if np.any(nibbles == 255):
+            raise ValueError("Unknown value in simulation output")
+        bits = np.unpackbits(nibbles[:, :, None], axis=2)[:, :, 4:]
+        bits = bits.reshape(-1, num_digits * 4)
+        return bits[:, num_digits * 4 - num_outputs :].astype(bool)
+    lines = data.reshape(-1, num_outputs + 1)
+    values = lines[:, :-1]
+    if np.any((values != ord("0")) & (values != ord("1"))):
+        raise ValueError("Unknown value in simulation output")
+    return values == ord("1")
+
+
+def reduce_bits(bits, mode, start=0, mask=None, expected=None):
+    """
+    Reduce simulation outputs to a summary.
+
+    Computes the same reductions as the testbenches and harnesses generated
+    by `circuitsim.codegen`.
+
+    Parameters
+    ----------
+    bits: numpy.ndarray
+            A `(num_vectors, num_outputs)` array of 0/1 output values.
+    mode: str
+            'signature' computes a 64-bit signature of each output: the
+            xor, over the vectors `k` for which the output is 1, of the
+            SplitMix64 output for the state `(k + 1) * 0x9E3779B97F4A7C15`.
+            'ones' counts the vectors for which each output is 1. 'match'
+            and 'mismatch' find the vectors whose outputs do and do not
+            equal `expected` in the outputs selected by `mask`.
+    start: int
+            The index of the first vector.
+    mask: numpy.ndarray
+            A `(num_outputs,)` boolean array of the outputs to compare.
+    expected: numpy.ndarray
+            A `(num_outputs,)` boolean array of the expected outputs.
+
+    Returns
+    -------
+    numpy.ndarray
+            For 'signature' and 'ones', a `(num_outputs,)` array of
+            `uint64` values. For 'match' and 'mismatch', the indices of the
+            selected vectors.
+
+    """
+    bits = np.asarray(bits, dtype=bool)
+    if mode in ["match", "mismatch"]:
+        matches = ~np.any((bits != expected) & mask, axis=1)
+        if mode == "mismatch":
+            matches = ~matches
+        return (np.flatnonzero(matches) + start).astype(np.uint64)
+    if mode == "ones":
+        return bits.sum(axis=0, dtype=np.uint64)
+    counters = np.arange(start + 1, start + len(bits) + 1, dtype=np.uint64)
+    hashes = splitmix64(counters * np.uint64(0x9E3779B97F4A7C15))
+    return np.bitwise_xor.reduce(
+        np.where(bits, hashes[:, None], np.uint64(0)), axis=0
+    ).astype(np.uint64)
+
+
+def _combine_reduced(mode, parts, num_outputs):
+    if mode in ["match", "mismatch"]:
+        return np.concatenate([np.empty(0, dtype=np.uint64)] + parts)
+    combined = np.zeros(num_outputs, dtype=np.uint64)
+    for part in parts:
+        if mode == "ones":
+            combined += part
+        else:
+            combined ^= part
+    return combined
+
+
+def _decode_reduced(data):
+    return np.array([int(line, 16) for line in bytes(data).split()], dtype=np.uint64)
+
+
+def _output_size(num_vectors, num_outputs, wire_format="ascii"):
+    if wire_format == "packed":
+        return num_vectors * -(-num_outputs // 8)
+    if wire_format == "hex":
+        return num_vectors * (-(-num_outputs // 4) + 1)
+    return num_vectors * (num_outputs + 1)
 
 
 def execute_simulator(
@@ -125,44 +750,22 @@ def execute_simulator(
             values in addition to 0 and 1. Specify an don't care value
             for an input by setting it to "x".
 
-    """
-    working_dir = Path(working_dir)
-
-    vectors_per_process = math.ceil(len(vectors) / num_processes)
-    for p, v in enumerate(
-        [
-            vectors[i : i + vectors_per_process]
-            for i in range(0, len(vectors), vectors_per_process)
-        ]
-    ):
-        with open(working_dir / f"input_file_{p}.txt", "w") as f:
-            for vector in v:
-                vector = _convert_values(vector, allow_x=allow_x)
-                try:
-                    f.write("".join(vector[i] for i in inputs) + "\n")
-                except KeyError as e:
-                    missing_inputs = ", ".join(set(inputs) - set(vector))
-                    if len(missing_inputs) > 20:
-                        missing_inputs = missing_inputs[:17] + "..."
-                    raise ValueError(
-                        f"Value not provided for inputs '{missing_inputs}'"
-                    ) from e
-
-    if num_processes > 1:
-        with Pool(num_processes) as pool:
-            results = pool.starmap_async(
-                _run_process,
-                [(p, simulator, working_dir) for p in range(num_processes)],
-            )
+    Returns
+    -------
+    int
+            The number of simulation processes that were run. At most
+            `num_processes`, but fewer if there are fewer vectors.
 
-            sim_results = results.get()
-            for sim_res in sim_results:
-                if sim_res.returncode != 0:
-                    with open(working_dir / "simulate.log") as f:
-                        message = f.read()
-                    raise SimulationExecutionError(message)
-    else:
-        sim_res = _run_process(0, simulator, working_dir)
+    """
+    shards = shard(len(vectors), num_processes)
+    SimulationExecutor(simulator, working_dir, jobs=False).run(
+        (
+            _encode_vectors(vectors[r.start : r.stop], inputs, allow_x=allow_x)
+            for r in shards
+        ),
+        lambda data: None,
+    )
+    return len(shards)
 
 
 def parse_simulation_output(working_dir, outputs, num_processes, allow_x=False):
@@ -173,14 +776,11 @@ def parse_simulation_output(working_dir, outputs, num_processes, allow_x=False):
     ----------
     working_dir: str or pathlib.Path
             The directory that the simulation was run from.
-
-    Returns
-    -------
-    list of dict of str to bool
-            The simulation results, as a list of dictionaries mapping
-            outputs to values.
+    outputs: list of str
+            The outputs to the module.
     num_process: int
-            The number of simulation processes that were run.
+            The number of simulation processes that were run, as returned
+            by `execute_simulator`.
     allow_x: bool
             If True, the inputs/outputs can contain "x" or "z" values
             in addition to 0 and 1. The outputs will then be returned
@@ -199,17 +799,132 @@ def parse_simulation_output(working_dir, outputs, num_processes, allow_x=False):
     working_dir = Path(working_dir)
     vectors = []
     for p in range(num_processes):
-        with open(working_dir / f"output_file_{p}.txt") as f:
-            for line in f:
-                if allow_x:
-                    if not set(line.strip().lower()) <= {"0", "1", "x", "z"}:
-                        raise ValueError(f"Unknown value in simulation output: {line}")
-                    vectors.append(dict(zip(outputs, line.strip().lower())))
-                else:
-                    if not set(line.strip()) <= {"0", "1"}:
-                        raise ValueError(f"Unknown value in simulation output: {line}")
-                    vectors.append(
-                        {o: bool(int(v)) for o, v in zip(outputs, line.strip())}
-                    )
+        vectors += _read_output(
+            working_dir / f"output_file_{p}.txt",
+            lambda data: _decode_vectors(data, outputs, allow_x=allow_x),
+        )
 
     return vectors
+
+
+def _parse_output_line(line, outputs, allow_x=False):
+    if allow_x:
+        if not set(line.strip().lower()) <= {"0", "1", "x", "z"}:
+            raise ValueError(f"Unknown value in simulation output: {line}")
+        return dict(zip(outputs, line.strip().lower()))
+    if not set(line.strip()) <= {"0", "1"}:
+        raise ValueError(f"Unknown value in simulation output: {line}")
+    return {o: bool(int(v)) for o, v in zip(outputs, line.strip())}
+
+
+class SimulatorProcess:
+    """
+    A long-lived simulation process.
+
+    Vectors are streamed to the compiled testbench through a FIFO and
+    results are read back through a second FIFO, so the simulator only
+    has to be started once for any number of `simulate` calls.
+
+    """
+
+    def __init__(self, simulator, working_dir, name="persistent", args=()):
+        """
+        Start a simulation process.
+
+        Parameters
+        ----------
+        simulator: str
+                The simulator to use. The simulation must already be
+                compiled in `working_dir`.
+        working_dir: str or pathlib.Path
+                The directory that the simulation was compiled in.
+        name: str
+                Used to name the FIFOs and log file of the process.
+        args: list of str
+                Additional arguments (e.g., plusargs) to pass to the
+                process.
+
+        """
+        self.working_dir = Path(working_dir)
+        self.args = list(args)
+        self.input_fifo = self.working_dir / f"{name}_input.fifo"
+        self.output_fifo = self.working_dir / f"{name}_output.fifo"
+        self.log_file = self.working_dir / f"{name}.log"
+        for fifo in [self.input_fifo, self.output_fifo]:
+            if fifo.exists():
+                fifo.unlink()
+            os.mkfifo(fifo)
+        # Opening both ends read/write means neither open blocks waiting for
+        # the simulator, and the simulator sees EOF once the input is closed.
+        self._input = os.open(self.input_fifo, os.O_RDWR | os.O_NONBLOCK)
+        self._output = os.open(self.output_fifo, os.O_RDWR | os.O_NONBLOCK)
+        with open(self.log_file, "w") as f:
+            self.process = subprocess.Popen(
+                simulate_args[simulator]
+                + [
+                    f"+input_file={self.input_fifo.name}",
+                    f"+output_file={self.output_fifo.name}",
+                    "+flush",
+                ]
+                + list(args),
+                cwd=self.working_dir,
+                stdout=f,
+                stderr=f,
+            )
+
+    def _fail(self):
+        self.close()
+        with open(self.log_file) as f:
+            message = f.read()
+        raise SimulationExecutionError(message)
+
+    def communicate(self, data, size):
+        """
+        Simulate encoded vectors in the running process.
+
+        Parameters
+        ----------
+        data: bytes
+                The contents of an input file.
+        size: int
+                The number of bytes of output that `data` produces.
+
+        Returns
+        -------
+        bytes
+                The contents of the corresponding output file.
+
+        """
+        if self.process.poll() is not None:
+            self._fail()
+        data = memoryview(data)
+        output = []
+        received = 0
+        while received < size:
+            writers = [self._input] if data else []
+            readable, writable, _ = select.select([self._output], writers, [], 1)
+            if not readable and not writable and self.process.poll() is not None:
+                self._fail()
+            if writable:
+                data = data[os.write(self._input, data) :]
+            if readable:
+                chunk = os.read(self._output, 1 << 16)
+                output.append(chunk)
+                received += len(chunk)
+        return b"".join(output)
+
+    def close(self):
+        """Close the input stream and wait for the process to finish."""
+        if self._input is None:
+            return
+        os.close(self._input)
+        self._input = None
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        os.close(self._output)
+        for fifo in [self.input_fifo, self.output_fifo]:
+            if fifo.exists():
+                fifo.unlink()
@@ -0,0 +1,306 @@
+"""Compact array-backed netlists."""
+import itertools
+import json
+from pathlib import Path
+
+import circuitgraph as cg
+import numpy as np
+from natsort import natsorted
+
+gate_types = [
+    "input",
+    "0",
+    "1",
+    "x",
+    "buf",
+    "not",
+    "and",
+    "nand",
+    "or",
+    "nor",
+    "xor",
+    "xnor",
+]
+gate_codes = {t: c for c, t in enumerate(gate_types)}
+
+_magic = b"CSIMSNAP"
+_version = 1
+_alignment = 64
+_arrays = ["types", "levels", "fanin_offsets", "fanin", "output_index", "net_order"]
+
+
+class NetlistSnapshot:
+    """
+    A levelized netlist stored in flat arrays.
+
+    Nodes are ordered by level: the inputs (naturally sorted) come first,
+    then the constants, and then the gates, each after its fanin. The
+    fanin of node `i` is `fanin[fanin_offsets[i] : fanin_offsets[i + 1]]`
+    (compressed sparse rows). A snapshot can be saved to a single file and
+    memory-mapped back without rebuilding a `circuitgraph.Circuit`, and it
+    can be passed wherever the simulators of this package take a circuit.
+
+    Attributes
+    ----------
+    name: str
+            The name of the circuit.
+    nodes: list of str
+            The name of each node.
+    num_inputs: int
+            The number of inputs, which are the first nodes.
+    types: numpy.ndarray
+            The `uint8` code of the type of each node, an index into
+            `gate_types`.
+    levels: numpy.ndarray
+            The `int32` level of each node. Inputs and constants are on
+            level 0, and each gate is one level above its deepest fanin.
+    fanin_offsets: numpy.ndarray
+            The `int64` offset of the fanin of each node in `fanin`,
+            followed by the total number of fanins.
+    fanin: numpy.ndarray
+            The `int64` indices of the fanin of every node.
+    output_index: numpy.ndarray
+            The `int64` indices of the outputs, naturally sorted by name.
+    net_order: numpy.ndarray
+            The `int64` indices of every node, naturally sorted by name.
+
+    """
+
+    __slots__ = ["name", "nodes", "num_inputs", "_index"] + _arrays
+
+    def __init__(
+        self,
+        name,
+        nodes,
+        num_inputs,
+        types,
+        levels,
+        fanin_offsets,
+        fanin,
+        output_index,
+        net_order,
+    ):
+        """Create a snapshot from its arrays (see `from_circuit` and `load`)."""
+        self.name = name
+        self.nodes = nodes
+        self.num_inputs = num_inputs
+        self.types = types
+        self.levels = levels
+        self.fanin_offsets = fanin_offsets
+        self.fanin = fanin
+        self.output_index = output_index
+        self.net_order = net_order
+        self._index = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __repr__(self):
+        return (
+            f"NetlistSnapshot(name={self.name!r}, nodes={len(self)}, "
+            f"inputs={self.num_inputs}, outputs={len(self.output_index)})"
+        )
+
+    @classmethod
+    def from_circuit(cls, ckt):
+        """
+        Levelize a circuit into a snapshot.
+
+        Parameters
+        ----------
+        ckt: circuitgraph.Circuit
+                The circuit to snapshot. It must not contain blackboxes.
+
+        Returns
+        -------
+        NetlistSnapshot
+                The snapshot.
+
+        """
+        if ckt.blackboxes:
+            raise ValueError(f"Cannot snapshot blackboxes in '{ckt.name}'")
+        inputs = natsorted(ckt.inputs())
+        levels = {i: 0 for i in inputs}
+        constants = []
+        for n in ckt.topo_sort():
+            t = ckt.type(n)
+            if t == "input":
+                continue
+            if t not in gate_codes:
+                raise ValueError(f"Cannot snapshot '{n}' of type '{t}'")
+            if t in ["0", "1", "x"]:
+                constants.append(n)
+                levels[n] = 0
+            else:
+                levels[n] = max((levels[f] for f in ckt.fanin(n)), default=0) + 1
+        gates = [n for n in levels if levels[n] > 0]
+        gates.sort(key=lambda n: levels[n])
+        nodes = inputs + constants + gates
+        index = {n: i for i, n in enumerate(nodes)}
+
+        fanins = [sorted(index[f] for f in ckt.fanin(n)) for n in nodes]
+        fanin_offsets = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum([len(f) for f in fanins], out=fanin_offsets[1:])
+        snapshot = cls(
+            ckt.name,
+            nodes,
+            len(inputs),
+            np.array([gate_codes[ckt.type(n)] for n in nodes], dtype=np.uint8),
+            np.array([levels[n] for n in nodes], dtype=np.int32),
+            fanin_offsets,
+            np.fromiter(
+                itertools.chain.from_iterable(fanins),
+                dtype=np.int64,
+                count=int(fanin_offsets[-1]),
+            ),
+            np.array([index[o] for o in natsorted(ckt.outputs())], dtype=np.int64),
+            np.array([index[n] for n in natsorted(nodes)], dtype=np.int64),
+        )
+        snapshot._index = index
+        return snapshot
+
+    @property
+    def index(self):
+        """dict of str:int: The index of each node, built on first use."""
+        if self._index is None:
+            self._index = {n: i for i, n in enumerate(self.nodes)}
+        return self._index
+
+    @property
+    def inputs(self):
+        """list of str: The inputs, naturally sorted."""
+        return self.nodes[: self.num_inputs]
+
+    @property
+    def outputs(self):
+        """list of str: The outputs, naturally sorted."""
+        return [self.nodes[i] for i in self.output_index.tolist()]
+
+    @property
+    def nets(self):
+        """list of str: Every node, naturally sorted."""
+        return [self.nodes[i] for i in self.net_order.tolist()]
+
+    def fanin_of(self, i):
+        """
+        Get the fanin of a node.
+
+        Parameters
+        ----------
+        i: int
+                The index of the node.
+
+        Returns
+        -------
+        numpy.ndarray
+                The indices of its fanin.
+
+        """
+        return self.fanin[self.fanin_offsets[i] : self.fanin_offsets[i + 1]]
+
+    def to_circuit(self):
+        """
+        Rebuild the circuit.
+
+        Returns
+        -------
+        circuitgraph.Circuit
+                A circuit with the same nodes, types, and connections.
+
+        """
+        c = cg.Circuit(name=self.name)
+        offsets = self.fanin_offsets.tolist()
+        fanin = self.fanin.tolist()
+        for n, t in zip(self.nodes, self.types.tolist()):
+            c.add(n, gate_types[t])
+        for i, n in enumerate(self.nodes):
+            for f in fanin[offsets[i] : offsets[i + 1]]:
+                c.connect(self.nodes[f], n)
+        c.set_output(self.outputs)
+        return c
+
+    def save(self, path):
+        """
+        Save the snapshot to a file.
+
+        The file holds a JSON header followed by the raw arrays, each
+        aligned so that `load` can memory-map it.
+
+        Parameters
+        ----------
+        path: str or pathlib.Path
+                The file to write.
+
+        """
+        names = np.frombuffer("\n".join(self.nodes).encode(), dtype=np.uint8)
+        arrays = {a: np.ascontiguousarray(getattr(self, a)) for a in _arrays}
+        arrays["names"] = names
+        layout = {}
+        offset = 0
+        for a, array in arrays.items():
+            offset = -(-offset // _alignment) * _alignment
+            layout[a] = [offset, array.dtype.str, len(array)]
+            offset += array.nbytes
+        header = json.dumps(
+            {
+                "version": _version,
+                "name": self.name,
+                "num_inputs": self.num_inputs,
+                "arrays": layout,
+            }
+        ).encode()
+        start = -(-(len(_magic) + 8 + len(header)) // _alignment) * _alignment
+        with open(path, "wb") as f:
+            f.write(_magic)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for a, array in arrays.items():
+                f.seek(start + layout[a][0])
+                f.write(array.tobytes())
+            f.truncate(start + offset)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load a snapshot saved with `save`.
+
+        Parameters
+        ----------
+        path: str or pathlib.Path
+                The file to read.
+        mmap: bool
+                If True, the arrays are memory-mapped read-only instead of
+                being read into memory.
+
+        Returns
+        -------
+        NetlistSnapshot
+                The snapshot.
+
+        """
+        path = Path(path)
+        with open(path, "rb") as f:
+            if f.read(len(_magic)) != _magic:
+                raise ValueError(f"'{path}' is not a netlist snapshot")
+            size = int.from_bytes(f.read(8), "little")
+            header = json.loads(f.read(size).decode())
+        if header["version"] != _version:
+            raise ValueError(
+                f"Unsupported netlist snapshot version {header['version']}"
+            )
+        start = -(-(len(_magic) + 8 + size) // _alignment) * _alignment
+        arrays = {}
+        for a, (offset, dtype, length) in header["arrays"].items():
+            if length == 0:
+                arrays[a] = np.empty(0, dtype=dtype)
+            elif mmap:
+                arrays[a] = np.memmap(
+                    path, dtype=dtype, mode="r", offset=start + offset, shape=length
+                )
+            else:
+                arrays[a] = np.fromfile(
+                    path, dtype=dtype, count=length, offset=start + offset
+                )
+        names = arrays.pop("names")
+        nodes = bytes(names).decode().split("\n") if len(names) else []
+        return cls(header["name"], nodes, header["num_inputs"], **arrays)
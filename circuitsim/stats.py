@@ -0,0 +1,238 @@
+"""Timing and I/O statistics of simulations."""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from contextvars import ContextVar
+except ImportError:  # Python 3.6
+
+    class ContextVar:
+        # Per thread only, so asyncio tasks on one thread are not isolated
+        def __init__(self, name, default=None):
+            self._local = threading.local()
+            self._default = default
+
+        def get(self):
+            return getattr(self._local, "value", self._default)
+
+        def set(self, value):
+            token = self.get()
+            self._local.value = value
+            return token
+
+        def reset(self, token):
+            self._local.value = token
+
+
+logger = logging.getLogger(__name__)
+
+# Maps each `SimulationStats` to the record of the call in progress in the
+# current thread or asyncio task
+_calls = ContextVar("circuitsim_calls", default={})
+
+_done = object()
+
+phases = ["testbench", "netlist", "compile", "encode", "write", "execute", "decode"]
+
+
+def _empty_record():
+    return {
+        "time": {p: 0.0 for p in phases},
+        "bytes_written": 0,
+        "bytes_read": 0,
+        "processes": 0,
+    }
+
+
+class SimulationStats:
+    """
+    Cumulative and last-call statistics of a simulator.
+
+    Time is recorded separately for each phase of a simulation:
+
+    - 'testbench': generating the testbench or verilator harness.
+    - 'netlist': writing the circuit netlist.
+    - 'compile': compiling the simulation (or levelizing the circuit for
+      the 'native' simulator), including compile cache lookups.
+    - 'encode': converting vectors to the wire format.
+    - 'write': writing input files.
+    - 'execute': waiting for simulation processes (or streaming vectors
+      through a persistent process, or evaluating the 'native' simulator).
+    - 'decode': reading and parsing output files.
+
+    Phases that overlap, such as the processes awaited concurrently by
+    `simulate_async`, are each counted in full. Calls made concurrently
+    from several threads or asyncio tasks are each counted and recorded
+    separately, and `last` is the call that started most recently.
+
+    Attributes
+    ----------
+    total: dict
+            The statistics accumulated over every call. Maps 'time' to a
+            dict of seconds spent in each phase, and 'bytes_written',
+            'bytes_read', and 'processes' to the number of bytes sent to
+            and received from simulation processes and the number of
+            processes started.
+    last: dict
+            The same statistics for the most recent call only.
+    calls: int
+            The number of calls recorded.
+
+    """
+
+    def __init__(self, callback=None):
+        """
+        Create empty statistics.
+
+        Parameters
+        ----------
+        callback: callable
+                If provided, called as `callback(phase, seconds)` at the end
+                of each phase. Each phase is also logged at the DEBUG level
+                to the `circuitsim.stats` logger.
+
+        """
+        self.callback = callback
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Discard all recorded statistics."""
+        self.total = _empty_record()
+        self.last = _empty_record()
+        self.calls = 0
+
+    def __repr__(self):
+        times = ", ".join(f"{p}={t:.3g}s" for p, t in self.total["time"].items() if t)
+        return (
+            f"SimulationStats(calls={self.calls}, {times or 'no time recorded'}, "
+            f"bytes_written={self.total['bytes_written']}, "
+            f"bytes_read={self.total['bytes_read']}, "
+            f"processes={self.total['processes']})"
+        )
+
+    def begin(self):
+        """
+        Start recording a call to the simulator.
+
+        The statistics of the previous call are discarded from `last`.
+        Inside a call, the call in progress is continued instead.
+
+        Returns
+        -------
+        dict
+                The record of the call, to be continued with `call`.
+
+        """
+        record = _calls.get().get(self)
+        if record is None:
+            record = _empty_record()
+            with self._lock:
+                self.calls += 1
+                self.last = record
+        return record
+
+    @contextmanager
+    def call(self, record=None):
+        """
+        Record a call to the simulator.
+
+        Nested calls (e.g., a method that is implemented with another) are
+        recorded as a single call.
+
+        Parameters
+        ----------
+        record: dict
+                The record of a call started by `begin` to continue, e.g.,
+                for each chunk of `simulate_iter`, which cannot hold a
+                context open while it is suspended. If `None`, a new call
+                is started.
+
+        """
+        calls = _calls.get()
+        if self in calls:
+            yield
+            return
+        if record is None:
+            record = self.begin()
+        token = _calls.set({**calls, self: record})
+        try:
+            yield
+        finally:
+            _calls.reset(token)
+
+    def _record(self):
+        # Statistics recorded outside of a call go to the last call
+        return _calls.get().get(self, self.last)
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time a phase.
+
+        Parameters
+        ----------
+        name: str
+                The name of the phase. One of `phases`.
+
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            record = self._record()
+            with self._lock:
+                self.total["time"][name] += seconds
+                record["time"][name] += seconds
+            logger.debug("%s took %.6f s", name, seconds)
+            if self.callback is not None:
+                self.callback(name, seconds)
+
+    def iterate(self, name, iterable):
+        """
+        Time the production of each item of an iterable as a phase.
+
+        Parameters
+        ----------
+        name: str
+                The name of the phase. One of `phases`.
+        iterable: iterable
+                The items to produce.
+
+        Yields
+        ------
+        object
+                Each item of `iterable`.
+
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                item = next(iterator, _done)
+            if item is _done:
+                return
+            yield item
+
+    def add(self, bytes_written=0, bytes_read=0, processes=0):
+        """
+        Count I/O and processes.
+
+        Parameters
+        ----------
+        bytes_written: int
+                The number of bytes sent to simulation processes.
+        bytes_read: int
+                The number of bytes received from simulation processes.
+        processes: int
+                The number of simulation processes started.
+
+        """
+        current = self._record()
+        with self._lock:
+            for record in [self.total, current]:
+                record["bytes_written"] += bytes_written
+                record["bytes_read"] += bytes_read
+                record["processes"] += processes
@@ -0,0 +1,170 @@
+"""Netlist transformations applied before simulation."""
+import circuitgraph as cg
+
+from circuitsim.simulators import _convert_value
+
+# The fanin value that decides a gate's output regardless of its other fanins
+_controlling = {"and": "0", "nand": "0", "or": "1", "nor": "1"}
+_inverting = {"nand", "nor", "not", "xnor"}
+_flip = {"0": "1", "1": "0"}
+
+
+def propagate_constants(ckt, constants):
+    """
+    Fix inputs to constants, fold the constants through the logic, and
+    remove the logic that no longer affects an output.
+
+    Gates with a controlling constant fanin become constants, other constant
+    fanins are disconnected, and gates left with a single fanin become
+    buffers or inverters. Constant "x" nodes are not folded. Blackbox pins
+    and the remaining inputs are always kept, even if they are unloaded.
+
+    Parameters
+    ----------
+    ckt: circuitgraph.Circuit
+            The circuit to transform. It is not modified.
+    constants: dict of str:bool
+            The value of each input to fix.
+
+    Returns
+    -------
+    circuitgraph.Circuit
+            The specialized circuit, with the fixed inputs converted to
+            constant nodes.
+
+    """
+    unknown = set(constants) - ckt.inputs()
+    if unknown:
+        raise ValueError(f"Cannot fix unknown inputs {sorted(unknown)}")
+    c = ckt.copy()
+    for i, v in constants.items():
+        c.set_type(i, _convert_value(v))
+
+    for n in c.topo_sort():
+        t = c.type(n)
+        if t not in ["buf", "not", "and", "nand", "or", "nor", "xor", "xnor"]:
+            continue
+        fanin = set(c.fanin(n))
+        values = {f: c.type(f) for f in fanin if c.type(f) in ["0", "1"]}
+        if not values:
+            continue
+        if t in _controlling and _controlling[t] in values.values():
+            value = _controlling[t]
+            if t in _inverting:
+                value = _flip[value]
+            for f in fanin:
+                c.disconnect(f, n)
+            c.set_type(n, value)
+            continue
+        # The remaining constants do not affect the output, except for xor
+        # gates, where each 1 inverts it.
+        invert = t in _inverting
+        if t in ["xor", "xnor"]:
+            invert ^= list(values.values()).count("1") % 2 == 1
+        for f in values:
+            c.disconnect(f, n)
+        if len(fanin) == len(values):
+            # Every fanin was constant and non-controlling, so they all
+            # have the same value (which xor gates have already absorbed).
+            value = "0" if t in ["xor", "xnor"] else next(iter(values.values()))
+            c.set_type(n, _flip[value] if invert else value)
+        elif len(fanin) - len(values) == 1:
+            c.set_type(n, "not" if invert else "buf")
+        elif t in ["xor", "xnor"]:
+            c.set_type(n, "xnor" if invert else "xor")
+
+    keep = c.outputs() | c.inputs()
+    keep |= set(c.filter_type(["bb_input", "bb_output"]))
+    keep |= c.transitive_fanin(c.outputs() | set(c.filter_type("bb_input")))
+    for n in set(c.nodes()) - keep:
+        c.remove(n)
+    return c
+
+
+def dual_rail(ckt):
+    """
+    Encode a circuit with two rails per node, for x-propagation on
+    two-state simulators.
+
+    Each node `n` is replaced by a pair of nodes `(high, low)`: `high` is 1
+    if `n` is known to be 1, `low` is 1 if `n` is known to be 0, and both
+    are 0 if `n` is "x". Gates are rewritten so that each pair follows the
+    three-valued semantics of the original gate: an and gate is 1 if all
+    of its fanins are 1 and 0 if any of them is 0, an xor gate is unknown
+    if any of its fanins is unknown, and inverting gates swap the rails.
+
+    Parameters
+    ----------
+    ckt: circuitgraph.Circuit
+            The circuit to encode. It must not contain blackboxes.
+
+    Returns
+    -------
+    circuitgraph.Circuit
+            The dual-rail circuit. Each input and output is replaced by its
+            two rails.
+    dict of str:tuple of str, str
+            The `(high, low)` rail of each node of `ckt`.
+
+    """
+    if ckt.blackboxes:
+        raise ValueError(f"Cannot dual-rail encode blackboxes in '{ckt.name}'")
+    c = cg.Circuit(name=f"{ckt.name}_dual_rail")
+    names = set(ckt.nodes())
+
+    def uid(n):
+        while n in names:
+            n += "_"
+        names.add(n)
+        return n
+
+    rails = {n: (uid(f"{n}_h"), uid(f"{n}_l")) for n in ckt.nodes()}
+
+    def add(t, fanin):
+        n = uid(f"dual_rail_{len(names)}")
+        c.add(n, t, fanin=fanin)
+        return n
+
+    for n in ckt.topo_sort():
+        t = ckt.type(n)
+        high, low = rails[n]
+        fanin = [rails[f] for f in sorted(ckt.fanin(n))]
+        if t == "input":
+            c.add(high, "input")
+            c.add(low, "input")
+            continue
+        if t in ["0", "1", "x"]:
+            c.add(high, "1" if t == "1" else "0")
+            c.add(low, "1" if t == "0" else "0")
+            continue
+        if t not in ["buf", "not", "and", "nand", "or", "nor", "xor", "xnor"]:
+            raise ValueError(f"Cannot dual-rail encode '{n}' of type '{t}'")
+        if t in ["buf", "not"]:
+            hi, lo = ("buf", [fanin[0][0]]), ("buf", [fanin[0][1]])
+        elif t in ["and", "nand"]:
+            hi, lo = ("and", [f[0] for f in fanin]), ("or", [f[1] for f in fanin])
+        elif t in ["or", "nor"]:
+            hi, lo = ("or", [f[0] for f in fanin]), ("and", [f[1] for f in fanin])
+        else:
+            # Combine the fanins pairwise: a ^ b is 1 if one is known to
+            # be 1 and the other 0, and 0 if both are known to be equal.
+            a_h, a_l = fanin[0]
+            for b_h, b_l in fanin[1:-1]:
+                a_h, a_l = (
+                    add("or", [add("and", [a_h, b_l]), add("and", [a_l, b_h])]),
+                    add("or", [add("and", [a_h, b_h]), add("and", [a_l, b_l])]),
+                )
+            if len(fanin) == 1:
+                hi, lo = ("buf", [a_h]), ("buf", [a_l])
+            else:
+                b_h, b_l = fanin[-1]
+                hi = ("or", [add("and", [a_h, b_l]), add("and", [a_l, b_h])])
+                lo = ("or", [add("and", [a_h, b_h]), add("and", [a_l, b_l])])
+        if t in _inverting:
+            hi, lo = lo, hi
+        c.add(high, hi[0], fanin=hi[1], output=ckt.is_output(n))
+        c.add(low, lo[0], fanin=lo[1], output=ckt.is_output(n))
+    for o in ckt.outputs():
+        if ckt.type(o) in ["input", "0", "1", "x"]:
+            c.set_output(rails[o])
+    return c, rails
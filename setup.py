@@ -23,5 +23,5 @@ setuptools.setup(
         "Operating System :: OS Independent",
     ],
     python_requires=">=3.6",
-    install_requires=["circuitgraph>=0.2.0", "natsort"],
+    install_requires=["circuitgraph>=0.2.0", "natsort", "numpy>=1.17"],
 )
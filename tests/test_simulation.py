@@ -1,15 +1,47 @@
+import asyncio
+import itertools
 import random
 import shutil
 import tempfile
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
 import circuitgraph as cg
+import numpy as np
 
-from circuitsim import CircuitSimulator
+from circuitsim.costs import default_costs
+from circuitsim.codegen import generate_netlist, generate_testbench
+from circuitsim.simulators import (
+    _available_cpus,
+    _default_max_processes,
+    compile_commands,
+    nodes_per_thread,
+    reduce_bits,
+)
+from circuitsim import (
+    CircuitSimulator,
+    CompileCache,
+    CostModel,
+    NetlistSnapshot,
+    ResultCache,
+    check_equivalence,
+    set_max_processes,
+)
 
 
 class TestSimulation(unittest.TestCase):
-    def run_simulation_test(self, simulator, num_processes=1):
+    @classmethod
+    def setUpClass(cls):
+        cls.cache_dir = tempfile.mkdtemp(prefix="circuitsim_TestSimulation_cache")
+        cls.cache = CompileCache(cls.cache_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.cache_dir)
+
+    def run_simulation_test(self, simulator, num_processes=1, **kwargs):
         num_trials = 10
         num_vectors = 100
         # Exercise random inputs through simulation
@@ -17,7 +49,7 @@ class TestSimulation(unittest.TestCase):
             prefix=f"circuitsim_TestSimulation_test_simulate_{simulator}"
         )
         c = cg.from_lib("c880")
-        simulator = CircuitSimulator(c, tmpdir, simulator=simulator)
+        simulator = CircuitSimulator(c, tmpdir, simulator=simulator, **kwargs)
         for _ in range(num_trials):
             vectors = []
             for _ in range(num_vectors):
@@ -30,9 +62,10 @@ class TestSimulation(unittest.TestCase):
                 self.assertDictEqual(
                     {o: sat_result[o] for o in c.outputs()}, sim_result
                 )
+        simulator.close()
         shutil.rmtree(tmpdir)
 
-    def run_simulation_test_x(self, simulator, num_processes=1):
+    def run_simulation_test_x(self, simulator, num_processes=1, **kwargs):
         # Exercise random inputs through simulation
         tmpdir = tempfile.mkdtemp(
             prefix=f"circuitsim_TestSimulation_test_simulate_{simulator}"
@@ -45,7 +78,7 @@ class TestSimulation(unittest.TestCase):
         c.add("g1", "or", fanin=["i1", "i2"], output=True)
         c.add("o0", "xor", fanin=["g0", "g1"], output=True)
 
-        simulator = CircuitSimulator(c, tmpdir, simulator=simulator)
+        simulator = CircuitSimulator(c, tmpdir, simulator=simulator, **kwargs)
         vector = {"i0": "0", "i1": "0", "i2": "0"}
         result = {"g0": "0", "g1": "0", "o0": "0"}
         sim_result = simulator.simulate([vector], num_processes, allow_x=True)
@@ -66,6 +99,506 @@ class TestSimulation(unittest.TestCase):
 
         shutil.rmtree(tmpdir)
 
+    def run_simulation_array_test(
+        self, simulator, packed=False, num_processes=1, **kwargs
+    ):
+        num_vectors = 100
+        c = cg.from_lib("c880")
+        simulator = CircuitSimulator(c, simulator=simulator, **kwargs)
+        vectors = np.random.randint(0, 2, (num_vectors, len(simulator.inputs)))
+        if packed:
+            sim_results = simulator.simulate_array(
+                np.packbits(vectors, axis=1), num_processes, packed=True
+            )
+            sim_results = np.unpackbits(sim_results, axis=1)
+            sim_results = sim_results[:, : len(simulator.outputs)].astype(bool)
+        else:
+            sim_results = simulator.simulate_array(vectors, num_processes)
+        self.assertEqual(sim_results.shape, (num_vectors, len(simulator.outputs)))
+        for vector, sim_result in zip(vectors, sim_results):
+            sat_result = cg.sat.solve(c, dict(zip(simulator.inputs, vector)))
+            self.assertListEqual(
+                [sat_result[o] for o in simulator.outputs], sim_result.tolist()
+            )
+        simulator.close()
+
+    def run_simulation_observe_test(self, simulator, **kwargs):
+        num_vectors = 20
+        c = cg.from_lib("c880")
+        simulator = CircuitSimulator(c, simulator=simulator, **kwargs)
+        vectors = [
+            {i: random.choice([True, False]) for i in c.inputs()}
+            for _ in range(num_vectors)
+        ]
+        # Changing the observed nets reuses the same compiled simulation
+        for observe in [random.sample(list(c.nodes()), k) for k in [10, 50]]:
+            sim_results = simulator.simulate(vectors, num_processes=2, observe=observe)
+            array = np.array([[v[i] for i in simulator.inputs] for v in vectors])
+            array_results = simulator.simulate_array(array, observe=observe)
+            for vector, sim_result, array_result in zip(
+                vectors, sim_results, array_results
+            ):
+                sat_result = cg.sat.solve(c, vector)
+                names = simulator.outputs + observe
+                self.assertDictEqual({n: sat_result[n] for n in names}, sim_result)
+                self.assertListEqual(
+                    [sat_result[n] for n in names], array_result.tolist()
+                )
+        with self.assertRaises(ValueError):
+            simulator.simulate(vectors, observe=["not_a_net"])
+        simulator.close()
+
+    def run_sequence_test(self, simulator, **kwargs):
+        num_cycles = 50
+        c = cg.from_lib("s27")
+        simulator = CircuitSimulator(c, simulator=simulator, **kwargs)
+        vectors = [
+            {i: random.choice([True, False]) for i in c.inputs()}
+            for _ in range(num_cycles)
+        ]
+        initial_state = {f: random.choice([True, False]) for f in c.blackboxes}
+        sim_results = simulator.simulate_sequence(vectors, initial_state)
+        # Compare against an unrolled copy of the circuit
+        u, io = cg.tx.sequential_unroll(
+            c,
+            num_cycles,
+            "D",
+            "Q",
+            ignore_pins="CK",
+            initial_values={f: str(int(v)) for f, v in initial_state.items()},
+        )
+        unrolled_vector = {
+            io[i][t]: vectors[t][i]
+            for i in c.inputs()
+            if i in io
+            for t in range(num_cycles)
+        }
+        sat_result = cg.sat.solve(u, unrolled_vector)
+        self.assertEqual(len(sim_results), num_cycles)
+        for t, sim_result in enumerate(sim_results):
+            self.assertDictEqual(
+                {o: sat_result[io[o][t]] for o in c.outputs()}, sim_result
+            )
+        self.assertListEqual(simulator.simulate_sequence([]), [])
+        with self.assertRaises(ValueError):
+            simulator.simulate_sequence(vectors, {"not_a_flop": True})
+        simulator.close()
+
+    def run_equivalence_test(self, simulator, **kwargs):
+        c0 = cg.from_lib("c880")
+        self.assertIsNone(
+            check_equivalence(
+                c0, c0.copy(), num_vectors=5000, simulator=simulator, **kwargs
+            )
+        )
+        c1 = c0.copy()
+        gate = next(n for n in sorted(c1.outputs()) if c1.type(n) == "nand")
+        c1.set_type(gate, "and")
+        counterexample = check_equivalence(
+            c0, c1, num_vectors=5000, seed=1, simulator=simulator, **kwargs
+        )
+        self.assertSetEqual(set(counterexample), c0.inputs())
+        self.assertNotEqual(
+            cg.sat.solve(c0, counterexample)[gate],
+            cg.sat.solve(c1, counterexample)[gate],
+        )
+
+        # Only the last vector differs
+        inputs = CircuitSimulator(c0, simulator="native").inputs
+        vectors = np.zeros((3000, len(inputs)), dtype=np.uint8)
+        vectors[-1] = 1
+        c2 = c0.copy()
+        c2.disconnect(c2.fanin(gate), gate)
+        c2.set_type(gate, "1")
+        if cg.sat.solve(c0, dict(zip(inputs, vectors[-1])))[gate]:
+            c2.set_type(gate, "0")
+        self.assertDictEqual(
+            check_equivalence(c0, c2, vectors, simulator=simulator, **kwargs),
+            dict(zip(inputs, [True] * len(inputs))),
+        )
+        dict_vectors = [dict(zip(inputs, v)) for v in vectors.tolist()]
+        self.assertDictEqual(
+            check_equivalence(c0, c2, dict_vectors, simulator=simulator, **kwargs),
+            dict(zip(inputs, [True] * len(inputs))),
+        )
+        self.assertIsNone(
+            check_equivalence(c0, c2, vectors[:-1], simulator=simulator, **kwargs)
+        )
+        c1.add("extra", "input")
+        with self.assertRaises(ValueError):
+            check_equivalence(c0, c1, simulator=simulator, **kwargs)
+
+    def run_profile_test(self, simulator, **kwargs):
+        c = cg.from_lib("c880")
+        reference = CircuitSimulator(c, simulator="native")
+        vectors = np.random.default_rng(0).integers(0, 2, (100, len(reference.inputs)))
+        expected = reference.simulate_array(vectors)
+        for profile in ["fast-compile", "fast-run", {"threads": 2, "jobs": 2}]:
+            sim = CircuitSimulator(
+                c, simulator=simulator, compile_profile=profile, **kwargs
+            )
+            self.assertTrue(np.array_equal(sim.simulate_array(vectors), expected))
+            self.assertGreater(sim.stats.total["time"]["compile"], 0)
+            sim.close()
+
+    def run_auto_test(self, candidates, **kwargs):
+        c = cg.from_lib("c880")
+        reference = CircuitSimulator(c, simulator="native")
+        costs = CostModel(persist=False)
+        # Make the native simulator slow enough that compiling the other
+        # candidate pays off after a few calls
+        costs.costs["native"]["per_vector_node"] = 1e-2
+        simulator = CircuitSimulator(c, simulator="auto", costs=costs, **kwargs)
+        simulator.candidates = candidates
+        rng = np.random.default_rng(0)
+        used = []
+        for _ in range(20):
+            vectors = rng.integers(0, 2, (1, len(simulator.inputs)))
+            self.assertTrue(
+                np.array_equal(
+                    simulator.simulate_array(vectors),
+                    reference.simulate_array(vectors),
+                )
+            )
+            used.append(set(simulator.backends))
+        self.assertSetEqual(used[0], {"native"})
+        self.assertSetEqual(used[-1], set(candidates))
+        vectors = [
+            dict(zip(simulator.inputs, v))
+            for v in rng.integers(0, 2, (10, len(simulator.inputs))).tolist()
+        ]
+        self.assertListEqual(simulator.simulate(vectors), reference.simulate(vectors))
+        self.assertEqual(
+            simulator.simulate_random(100, reduce="signature"),
+            reference.simulate_random(100, reduce="signature"),
+        )
+        self.assertGreater(simulator.stats.total["time"]["compile"], 0)
+        simulator.close()
+
+        if "cache" in kwargs:
+            # Compilations copied from the cache are not recorded
+            costs = CostModel(persist=False)
+            costs.costs["native"]["per_vector_node"] = 1.0
+            simulator = CircuitSimulator(c, simulator="auto", costs=costs, **kwargs)
+            simulator.candidates = candidates
+            vectors = rng.integers(0, 2, (1000, len(simulator.inputs)))
+            self.assertTrue(
+                np.array_equal(
+                    simulator.simulate_array(vectors),
+                    reference.simulate_array(vectors),
+                )
+            )
+            self.assertSetEqual(set(simulator.backends), set(candidates) - {"native"})
+            for name in simulator.backends:
+                self.assertEqual(
+                    costs.costs[name]["compile_per_node"],
+                    default_costs[name]["compile_per_node"],
+                )
+            simulator.close()
+
+    def run_concurrency_test(self, simulator, **kwargs):
+        c = cg.from_lib("c880")
+        simulator = CircuitSimulator(c, simulator=simulator, **kwargs)
+        reference = CircuitSimulator(c, simulator="native")
+        rng = np.random.default_rng(0)
+        batches = [rng.integers(0, 2, (200, len(simulator.inputs))) for _ in range(8)]
+        expected = [reference.simulate_array(b) for b in batches]
+        vectors = [
+            [dict(zip(simulator.inputs, row)) for row in b.tolist()] for b in batches
+        ]
+
+        # Fewer slots than the processes requested by all the threads
+        set_max_processes(3)
+        try:
+            with ThreadPoolExecutor(len(batches)) as pool:
+                results = list(
+                    pool.map(lambda b: simulator.simulate_array(b, 2), batches)
+                )
+                dicts = list(pool.map(lambda v: simulator.simulate(v, 2), vectors))
+
+            async def gather():
+                return await asyncio.gather(
+                    *(simulator.simulate_async(v, 2) for v in vectors)
+                )
+
+            loop = asyncio.new_event_loop()
+            try:
+                async_results = loop.run_until_complete(gather())
+            finally:
+                loop.close()
+        finally:
+            set_max_processes(_default_max_processes())
+
+        for e, r, d, a in zip(expected, results, dicts, async_results):
+            self.assertTrue(np.array_equal(e, r))
+            self.assertListEqual(
+                [dict(zip(simulator.outputs, row)) for row in e.tolist()], d
+            )
+            self.assertListEqual(d, a)
+        # Job directories are removed
+        self.assertListEqual(list(simulator.working_dir.glob("job_*")), [])
+        simulator.close()
+
+    def run_dual_rail_test(self, simulator, **kwargs):
+        c = cg.Circuit()
+        for i in range(4):
+            c.add(f"i{i}", "input")
+        c.add("one", "1")
+        c.add("unknown", "x")
+        c.add("g0", "nand", fanin=["i0", "i1", "one"])
+        c.add("g1", "nor", fanin=["i1", "i2"])
+        c.add("g2", "xor", fanin=["i0", "i2", "i3"], output=True)
+        c.add("g3", "xnor", fanin=["g0", "g1"], output=True)
+        c.add("g4", "or", fanin=["g2", "unknown"], output=True)
+        c.add("g5", "and", fanin=["g3", "i3"])
+        c.add("g6", "not", fanin=["g5"], output=True)
+        c.add("g7", "buf", fanin=["i1"], output=True)
+
+        def evaluate(vector):
+            values = dict(vector)
+            for n in c.topo_sort():
+                t = c.type(n)
+                fanin = [values[f] for f in c.fanin(n)]
+                if t in ["0", "1", "x"]:
+                    values[n] = t
+                elif t in ["buf", "not"]:
+                    values[n] = fanin[0]
+                elif t in ["and", "nand"]:
+                    values[n] = "0" if "0" in fanin else "x" if "x" in fanin else "1"
+                elif t in ["or", "nor"]:
+                    values[n] = "1" if "1" in fanin else "x" if "x" in fanin else "0"
+                elif t in ["xor", "xnor"]:
+                    values[n] = "x" if "x" in fanin else str(fanin.count("1") % 2)
+                if t in ["not", "nand", "nor", "xnor"] and values[n] != "x":
+                    values[n] = "1" if values[n] == "0" else "0"
+            return values
+
+        simulator = CircuitSimulator(c, simulator=simulator, **kwargs)
+        vectors = [
+            dict(zip(simulator.inputs, values))
+            for values in itertools.product("01x", repeat=4)
+        ]
+        observe = ["g0", "g5", "i2", "unknown"]
+        results = simulator.simulate(vectors, allow_x=True, observe=observe)
+        self.assertEqual(len(results), len(vectors))
+        for vector, result in zip(vectors, results):
+            values = evaluate(vector)
+            self.assertDictEqual(
+                result, {n: values[n] for n in simulator.outputs + observe}
+            )
+        # "z" inputs are simulated as "x"
+        vectors = [dict(zip(simulator.inputs, v)) for v in ["1zZ0", "z01z", "0x1Z"]]
+        results = simulator.simulate(vectors, allow_x=True)
+        for vector, result in zip(vectors, results):
+            values = evaluate({i: "x" if v in "zZ" else v for i, v in vector.items()})
+            self.assertDictEqual(result, {n: values[n] for n in simulator.outputs})
+        # Two-state simulation is unaffected
+        values = evaluate({i: "1" for i in simulator.inputs})
+        result = simulator.simulate([{i: True for i in simulator.inputs}])[0]
+        for o in ["g2", "g3", "g6", "g7"]:
+            self.assertEqual(result[o], values[o] == "1")
+        simulator.close()
+
+    def names_circuit(self):
+        # Nets named like the generated gate instances
+        c = cg.Circuit(name="names")
+        c.add("a", "input")
+        c.add("b", "input")
+        c.add("g_0", "and", fanin=["a", "b"])
+        c.add("g_1", "or", fanin=["a", "g_0"], output=True)
+        c.add("g_0_0", "xor", fanin=["g_0", "b"], output=True)
+        return c
+
+    def run_snapshot_names_test(self, simulator, **kwargs):
+        c = self.names_circuit()
+        simulator = CircuitSimulator(
+            NetlistSnapshot.from_circuit(c), simulator=simulator, **kwargs
+        )
+        vectors = [
+            {"a": a, "b": b} for a, b in itertools.product([False, True], repeat=2)
+        ]
+        self.assertListEqual(
+            simulator.simulate(vectors),
+            CircuitSimulator(c, simulator="native").simulate(vectors),
+        )
+        simulator.close()
+
+    def run_snapshot_test(self, simulator, **kwargs):
+        c = cg.from_lib("c880")
+        snapshot = NetlistSnapshot.from_circuit(c)
+        with tempfile.TemporaryDirectory() as d:
+            snapshot.save(Path(d) / "c880.snap")
+            for mmap in [True, False]:
+                loaded = NetlistSnapshot.load(Path(d) / "c880.snap", mmap=mmap)
+                self.assertListEqual(loaded.nodes, snapshot.nodes)
+                self.assertTrue(np.array_equal(loaded.fanin, snapshot.fanin))
+            reference = CircuitSimulator(c, simulator=simulator, **kwargs)
+            simulator = CircuitSimulator.from_snapshot(
+                Path(d) / "c880.snap", simulator=simulator, **kwargs
+            )
+            self.assertListEqual(simulator.inputs, reference.inputs)
+            self.assertListEqual(simulator.outputs, reference.outputs)
+            self.assertListEqual(simulator.nets, reference.nets)
+            vectors = np.random.default_rng(0).integers(
+                0, 2, (100, len(simulator.inputs))
+            )
+            observe = simulator.nets[::20]
+            self.assertTrue(
+                np.array_equal(
+                    simulator.simulate_array(vectors, observe=observe),
+                    reference.simulate_array(vectors, observe=observe),
+                )
+            )
+            # The circuit is only rebuilt when it is needed
+            self.assertIsNone(simulator._ckt)
+            rebuilt = simulator.ckt
+            self.assertSetEqual(set(rebuilt.nodes()), set(c.nodes()))
+            for n in c.nodes():
+                self.assertEqual(rebuilt.type(n), c.type(n))
+                self.assertSetEqual(rebuilt.fanin(n), c.fanin(n))
+            self.assertSetEqual(rebuilt.outputs(), c.outputs())
+            simulator.close()
+            reference.close()
+        with self.assertRaises(ValueError):
+            NetlistSnapshot.from_circuit(cg.from_lib("s27"))
+
+    def run_specialize_test(self, simulator, **kwargs):
+        c = cg.from_lib("c880")
+        simulator = CircuitSimulator(c, simulator=simulator, **kwargs)
+        constants = {
+            i: random.choice([True, False])
+            for i in random.sample(simulator.inputs, len(simulator.inputs) // 2)
+        }
+        specialized = simulator.specialize(constants)
+        self.assertLess(len(specialized.ckt), len(c))
+        self.assertListEqual(
+            specialized.inputs, [i for i in simulator.inputs if i not in constants]
+        )
+        vectors = [
+            {i: random.choice([True, False]) for i in specialized.inputs}
+            for _ in range(100)
+        ]
+        self.assertListEqual(
+            specialized.simulate(vectors),
+            simulator.simulate([{**v, **constants} for v in vectors]),
+        )
+        with self.assertRaises(ValueError):
+            simulator.specialize({"not_an_input": True})
+        with self.assertRaises(ValueError):
+            simulator.specialize({i: True for i in simulator.inputs})
+        specialized.close()
+        simulator.close()
+
+    def run_generate_test(self, simulator, **kwargs):
+        c = cg.from_lib("c880")
+        simulator = CircuitSimulator(c, simulator=simulator, **kwargs)
+        patterns, sim_results = simulator.simulate_random(
+            200, seed=3, num_processes=3, return_patterns=True
+        )
+        self.assertEqual(patterns.shape, (200, len(simulator.inputs)))
+        for vector, sim_result in zip(patterns[:20], sim_results[:20]):
+            sat_result = cg.sat.solve(c, dict(zip(simulator.inputs, vector)))
+            self.assertListEqual(
+                [sat_result[o] for o in simulator.outputs], sim_result.tolist()
+            )
+        # The same seed gives the same patterns, however they are sharded
+        self.assertTrue(
+            np.array_equal(simulator.simulate_random(200, seed=3), sim_results)
+        )
+        self.assertFalse(
+            np.array_equal(simulator.simulate_random(200, seed=4), sim_results)
+        )
+        self.assertEqual(simulator.simulate_random(0).shape, (0, len(c.outputs())))
+        with self.assertRaises(ValueError):
+            simulator.simulate_exhaustive()
+        simulator.close()
+
+        c = cg.from_lib("c17")
+        simulator = CircuitSimulator(c, simulator=simulator.simulator, **kwargs)
+        patterns, sim_results = simulator.simulate_exhaustive(
+            num_processes=2, return_patterns=True
+        )
+        self.assertEqual(
+            {tuple(p) for p in patterns.tolist()},
+            set(itertools.product([False, True], repeat=len(simulator.inputs))),
+        )
+        for vector, sim_result in zip(patterns, sim_results):
+            sat_result = cg.sat.solve(c, dict(zip(simulator.inputs, vector)))
+            self.assertListEqual(
+                [sat_result[o] for o in simulator.outputs], sim_result.tolist()
+            )
+        simulator.close()
+
+    def run_reduce_names_test(self, simulator, **kwargs):
+        # Ports named like the generated identifiers
+        c = cg.Circuit(name="names")
+        for i in ["a", "generate_seed", "splitmix64"]:
+            c.add(i, "input")
+        c.add("reduce_hash", "and", fanin=["a", "generate_seed"], output=True)
+        c.add("reduce_j", "xor", fanin=["a", "splitmix64"], output=True)
+        simulator = CircuitSimulator(c, simulator=simulator, **kwargs)
+        reference = CircuitSimulator(c, simulator="native")
+        for reduce in ["ones", "signature"]:
+            self.assertDictEqual(
+                simulator.simulate_random(50, seed=1, reduce=reduce),
+                reference.simulate_random(50, seed=1, reduce=reduce),
+            )
+        simulator.close()
+
+    def run_reduce_test(self, simulator, **kwargs):
+        c = cg.from_lib("c880")
+        simulator = CircuitSimulator(c, simulator=simulator, **kwargs)
+        patterns, sim_results = simulator.simulate_random(
+            300, seed=2, return_patterns=True
+        )
+        expected = {o: sim_results[5, j] for j, o in enumerate(simulator.outputs[:4])}
+        matches = (sim_results[:, :4] == sim_results[5, :4]).all(axis=1)
+        self.assertDictEqual(
+            simulator.simulate_array(patterns, num_processes=3, reduce="ones"),
+            dict(zip(simulator.outputs, sim_results.sum(axis=0).tolist())),
+        )
+        self.assertListEqual(
+            simulator.simulate_array(
+                patterns, num_processes=3, reduce="match", expected=expected
+            ),
+            np.flatnonzero(matches).tolist(),
+        )
+        vectors = [dict(zip(simulator.inputs, p)) for p in patterns.tolist()]
+        self.assertListEqual(
+            simulator.simulate(
+                vectors, num_processes=2, reduce="mismatch", expected=expected
+            ),
+            np.flatnonzero(~matches).tolist(),
+        )
+        # Signatures do not depend on how the vectors are sharded or generated
+        signature = simulator.simulate_array(patterns, reduce="signature")
+        self.assertDictEqual(
+            signature,
+            dict(
+                zip(
+                    simulator.outputs,
+                    reduce_bits(sim_results, "signature").tolist(),
+                )
+            ),
+        )
+        self.assertDictEqual(
+            simulator.simulate_random(300, seed=2, num_processes=3, reduce="signature"),
+            signature,
+        )
+        self.assertDictEqual(
+            simulator.simulate(vectors, num_processes=2, reduce="signature"),
+            signature,
+        )
+        with self.assertRaises(ValueError):
+            simulator.simulate(vectors, reduce="sum")
+        with self.assertRaises(ValueError):
+            simulator.simulate(vectors, reduce="match")
+        with self.assertRaises(ValueError):
+            simulator.simulate(vectors, reduce="match", expected={"N1": 0})
+        with self.assertRaises(ValueError):
+            simulator.simulate(vectors, reduce="ones", observe=simulator.inputs)
+        simulator.close()
+
     @unittest.skipIf(shutil.which("vcs") is None, "VCS not installed")
     def test_simulate_vcs(self):
         self.run_simulation_test("vcs")
@@ -86,6 +619,15 @@ class TestSimulation(unittest.TestCase):
     def test_simulate_iverilog_multiproc(self):
         self.run_simulation_test("iverilog", num_processes=4)
 
+    @unittest.skipIf(shutil.which("iverilog") is None, "iverilog not installed")
+    def test_simulate_iverilog_persistent(self):
+        self.run_simulation_test("iverilog", persistent=True)
+
+    @unittest.skipIf(shutil.which("iverilog") is None, "iverilog not installed")
+    def test_simulate_iverilog_array(self):
+        self.run_simulation_array_test("iverilog", num_processes=4)
+        self.run_simulation_array_test("iverilog", packed=True)
+
     @unittest.skipIf(shutil.which("iverilog") is None, "iverilog not installed")
     def test_simulate_iverilog_x(self):
         self.run_simulation_test_x("iverilog")
@@ -94,10 +636,548 @@ class TestSimulation(unittest.TestCase):
     def test_simulate_verilator(self):
         self.run_simulation_test("verilator")
 
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_simulate_verilator_persistent(self):
+        self.run_simulation_test("verilator", persistent=True)
+
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_simulate_verilator_array(self):
+        self.run_simulation_array_test("verilator", num_processes=4, cache=self.cache)
+        self.run_simulation_array_test("verilator", packed=True, cache=self.cache)
+        self.run_simulation_array_test("verilator", persistent=True, cache=self.cache)
+
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_simulate_verilator_packed(self):
+        self.run_simulation_test(
+            "verilator", num_processes=4, wire_format="packed", cache=self.cache
+        )
+        self.run_simulation_test(
+            "verilator", persistent=True, wire_format="packed", cache=self.cache
+        )
+        for kwargs in [{}, {"packed": True}, {"persistent": True}]:
+            self.run_simulation_array_test(
+                "verilator", wire_format="packed", cache=self.cache, **kwargs
+            )
+
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_simulate_verilator_packed_wide(self):
+        # Exercise ports of each width class in the generated harness
+        for width in [5, 12, 30, 64, 100]:
+            c = cg.Circuit(f"wide_{width}")
+            for i in range(width):
+                c.add(f"i{i}", "input")
+                c.add(f"o{i}", "not", fanin=f"i{i}", output=True)
+            simulator = CircuitSimulator(
+                c, simulator="verilator", wire_format="packed", cache=self.cache
+            )
+            vectors = np.random.randint(0, 2, (20, width))
+            inputs = [f"i{i}" for i in range(width)]
+            vectors = vectors[:, [simulator.inputs.index(i) for i in inputs]]
+            results = simulator.simulate_array(vectors)
+            expected = {f"o{i}": 1 - vectors[:, i] for i in range(width)}
+            for k, o in enumerate(simulator.outputs):
+                self.assertListEqual(results[:, k].tolist(), expected[o].tolist())
+
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_simulate_verilator_hex(self):
+        self.run_simulation_test(
+            "verilator", num_processes=4, wire_format="hex", cache=self.cache
+        )
+        self.run_simulation_test(
+            "verilator", persistent=True, wire_format="hex", cache=self.cache
+        )
+        for kwargs in [{}, {"packed": True}, {"persistent": True}]:
+            self.run_simulation_array_test(
+                "verilator", wire_format="hex", cache=self.cache, **kwargs
+            )
+
+    @unittest.skipIf(shutil.which("iverilog") is None, "iverilog not installed")
+    def test_simulate_iverilog_hex(self):
+        self.run_simulation_test("iverilog", num_processes=4, wire_format="hex")
+        # x values fall back to the ascii format
+        self.run_simulation_test_x("iverilog", wire_format="hex")
+
+    def test_simulate_native_observe(self):
+        self.run_simulation_observe_test("native")
+
+    @unittest.skipIf(shutil.which("iverilog") is None, "iverilog not installed")
+    def test_simulate_iverilog_observe(self):
+        self.run_simulation_observe_test("iverilog", wire_format="hex")
+
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_simulate_verilator_observe(self):
+        self.run_simulation_observe_test("verilator", cache=self.cache)
+        self.run_simulation_observe_test(
+            "verilator", wire_format="packed", persistent=True, cache=self.cache
+        )
+
+    def test_simulate_native_sequence(self):
+        self.run_sequence_test("native")
+
+    @unittest.skipIf(shutil.which("iverilog") is None, "iverilog not installed")
+    def test_simulate_iverilog_sequence(self):
+        self.run_sequence_test("iverilog")
+
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_simulate_verilator_sequence(self):
+        self.run_sequence_test("verilator", wire_format="hex", cache=self.cache)
+        self.run_sequence_test("verilator", wire_format="packed", cache=self.cache)
+
+    def test_specialize_native(self):
+        self.run_specialize_test("native")
+
+    @unittest.skipIf(shutil.which("iverilog") is None, "iverilog not installed")
+    def test_specialize_iverilog(self):
+        self.run_specialize_test("iverilog", cache=self.cache)
+
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_specialize_verilator(self):
+        self.run_specialize_test("verilator", cache=self.cache)
+
+    def test_simulate_native_random(self):
+        self.run_generate_test("native")
+
+    @unittest.skipIf(shutil.which("iverilog") is None, "iverilog not installed")
+    def test_simulate_iverilog_random(self):
+        self.run_generate_test("iverilog", cache=self.cache, wire_format="hex")
+
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_simulate_verilator_random(self):
+        self.run_generate_test("verilator", cache=self.cache)
+        self.run_generate_test("verilator", cache=self.cache, wire_format="packed")
+
+    def test_compile_commands(self):
+        commands, key = compile_commands("verilator")
+        self.assertListEqual(
+            commands,
+            [
+                ["verilator", "--exe", "tb.cpp", "--cc"],
+                ["make", "-C", "obj_dir", "-f", "Vtb.mk"],
+            ],
+        )
+        self.assertListEqual(commands, key)
+        commands, key = compile_commands(
+            "verilator",
+            {"output_split": 1000, "jobs": 4, "threads": "auto", "opt_fast": "-O2"},
+            num_nodes=2 * nodes_per_thread,
+        )
+        self.assertIn("--output-split", commands[0])
+        self.assertIn("OPT_FAST=-O2", commands[1])
+        self.assertListEqual(commands[1][-2:], ["-j", "4"])
+        threads = min(2, _available_cpus())
+        if threads > 1:
+            i = commands[0].index("--threads")
+            self.assertEqual(commands[0][i + 1], str(threads))
+        else:
+            self.assertNotIn("--threads", commands[0])
+        # The number of parallel jobs does not change the compiled simulation
+        self.assertNotIn("-j", key[1])
+        self.assertListEqual(key[0], commands[0])
+        # Other simulators compile the same way with every profile
+        self.assertListEqual(
+            compile_commands("iverilog", "fast-run")[0], [["iverilog"], []]
+        )
+        with self.assertRaises(ValueError):
+            compile_commands("verilator", "fastest")
+        with self.assertRaises(ValueError):
+            compile_commands("verilator", {"jobz": 4})
+        with self.assertRaises(ValueError):
+            CircuitSimulator(cg.from_lib("c17"), compile_profile="fastest")
+
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_profile_verilator(self):
+        self.run_profile_test("verilator", cache=self.cache)
+        self.run_profile_test("verilator", cache=self.cache, wire_format="packed")
+
+    def test_cost_model(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = Path(d) / "costs.json"
+            costs = CostModel(path, save_interval=0)
+            before = costs.compile_time("verilator", 1000)
+            costs.record_compile("verilator", 1000, before * 10)
+            self.assertGreater(costs.compile_time("verilator", 1000), before)
+            before = costs.run_time("verilator", 1000, 10000)
+            costs.record_run("verilator", 1000, 10000, 1, before * 10 + 1)
+            self.assertGreater(costs.run_time("verilator", 1000, 10000), before)
+            # Measurements are loaded by later sessions
+            loaded = CostModel(path)
+            self.assertDictEqual(loaded.costs, costs.costs)
+            self.assertEqual(costs.num_processes("native", 1000, 10**6, 8), 1)
+            self.assertEqual(costs.num_processes("verilator", 1000, 1, 8), 1)
+            self.assertEqual(costs.num_processes("verilator", 10**6, 10**6, 8), 8)
+
+    def test_auto_native(self):
+        self.run_auto_test(["native"])
+
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_auto_verilator(self):
+        self.run_auto_test(["native", "verilator"], cache=self.cache)
+
+    @unittest.skipIf(shutil.which("iverilog") is None, "iverilog not installed")
+    def test_auto_iverilog(self):
+        self.run_auto_test(["native", "iverilog"], cache=self.cache)
+
+    def test_set_max_processes(self):
+        with self.assertRaises(ValueError):
+            set_max_processes(0)
+
+    @unittest.skipIf(shutil.which("iverilog") is None, "iverilog not installed")
+    def test_concurrency_iverilog(self):
+        self.run_concurrency_test("iverilog", cache=self.cache)
+
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_concurrency_verilator(self):
+        self.run_concurrency_test("verilator", cache=self.cache)
+        self.run_concurrency_test("verilator", cache=self.cache, wire_format="packed")
+        self.run_concurrency_test("verilator", cache=self.cache, persistent=True)
+
+    def test_dual_rail_native(self):
+        self.run_dual_rail_test("native")
+
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_dual_rail_verilator(self):
+        self.run_dual_rail_test("verilator", cache=self.cache)
+        self.run_dual_rail_test("verilator", cache=self.cache, wire_format="packed")
+
+    def test_snapshot_netlist_names(self):
+        snapshot = NetlistSnapshot.from_circuit(self.names_circuit())
+        netlists = []
+        for _ in range(2):
+            with tempfile.TemporaryDirectory() as d:
+                generate_netlist(Path(d), snapshot)
+                netlists.append((Path(d) / "names.v").read_text())
+        # Names are deterministic and legal identifiers
+        self.assertEqual(netlists[0], netlists[1])
+        self.assertIn(" g_0_1(", netlists[0])
+        self.assertNotIn("-", netlists[0])
+
+    def test_testbench_names(self):
+        # Ports named like the generated identifiers
+        inputs = ["a", "generate_seed", "splitmix64"]
+        outputs = ["generate_count", "reduce_hash", "reduce_j"]
+        testbenches = []
+        for _ in range(2):
+            with tempfile.TemporaryDirectory() as d:
+                generate_testbench(Path(d), "names", inputs, outputs, "iverilog")
+                testbenches.append((Path(d) / "tb.v").read_text())
+        # Names are deterministic and legal identifiers
+        self.assertEqual(testbenches[0], testbenches[1])
+        for n in inputs[1:] + outputs:
+            self.assertIn(f" {n}_0;", testbenches[0])
+
+    def test_snapshot_native(self):
+        self.run_snapshot_test("native")
+
+    @unittest.skipIf(shutil.which("iverilog") is None, "iverilog not installed")
+    def test_snapshot_iverilog(self):
+        self.run_snapshot_names_test("iverilog", cache=self.cache)
+        self.run_snapshot_test("iverilog", cache=self.cache)
+
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_snapshot_verilator(self):
+        self.run_snapshot_names_test("verilator", cache=self.cache)
+        self.run_snapshot_test("verilator", cache=self.cache, wire_format="hex")
+        self.run_snapshot_test("verilator", cache=self.cache, wire_format="packed")
+
+    def test_equivalence_native(self):
+        self.run_equivalence_test("native")
+
+    @unittest.skipIf(shutil.which("iverilog") is None, "iverilog not installed")
+    def test_equivalence_iverilog(self):
+        self.run_equivalence_test("iverilog", cache=self.cache)
+
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_equivalence_verilator(self):
+        self.run_equivalence_test("verilator", cache=self.cache, wire_format="packed")
+
+    def test_simulate_native_reduce(self):
+        self.run_reduce_test("native")
+
+    @unittest.skipIf(shutil.which("iverilog") is None, "iverilog not installed")
+    def test_simulate_iverilog_reduce(self):
+        self.run_reduce_test("iverilog", cache=self.cache)
+        self.run_reduce_names_test("iverilog", cache=self.cache)
+
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_simulate_verilator_reduce(self):
+        self.run_reduce_test("verilator", cache=self.cache, wire_format="hex")
+        self.run_reduce_names_test("verilator", cache=self.cache, wire_format="hex")
+        self.run_reduce_test("verilator", cache=self.cache, wire_format="packed")
+
+    def test_invalid_wire_format(self):
+        c = cg.from_lib("c17")
+        with self.assertRaises(ValueError):
+            CircuitSimulator(c, simulator="iverilog", wire_format="packed")
+        with self.assertRaises(ValueError):
+            CircuitSimulator(c, simulator="verilator", wire_format="bytes")
+
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_simulate_verilator_shards(self):
+        c = cg.from_lib("c880")
+        simulator = CircuitSimulator(c, simulator="verilator", cache=self.cache)
+        self.assertListEqual(simulator.simulate([], num_processes=4), [])
+        vectors = [
+            {i: random.choice([True, False]) for i in c.inputs()} for _ in range(3)
+        ]
+        sim_results = simulator.simulate(vectors, num_processes=8)
+        self.assertEqual(len(sim_results), 3)
+        for vector, sim_result in zip(vectors, sim_results):
+            sat_result = cg.sat.solve(c, vector)
+            self.assertDictEqual({o: sat_result[o] for o in c.outputs()}, sim_result)
+
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_simulate_verilator_async(self):
+        c = cg.from_lib("c880")
+        simulators = [
+            CircuitSimulator(c, simulator="verilator", cache=self.cache)
+            for _ in range(2)
+        ]
+        vectors = [
+            [{i: random.choice([True, False]) for i in c.inputs()} for _ in range(50)]
+            for _ in simulators
+        ]
+
+        async def simulate():
+            return await asyncio.gather(
+                *(
+                    s.simulate_async(v, num_processes=3)
+                    for s, v in zip(simulators, vectors)
+                )
+            )
+
+        loop = asyncio.new_event_loop()
+        all_results = loop.run_until_complete(simulate())
+        loop.close()
+        for simulator, v, sim_results in zip(simulators, vectors, all_results):
+            self.assertListEqual(sim_results, simulator.simulate(v))
+
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_stats(self):
+        c = cg.from_lib("c17")
+        events = []
+        simulator = CircuitSimulator(
+            c,
+            simulator="verilator",
+            wire_format="hex",
+            on_phase=lambda phase, seconds: events.append(phase),
+        )
+        vectors = [{i: True for i in c.inputs()}] * 10
+        simulator.simulate(vectors, num_processes=2)
+        stats = simulator.stats
+        self.assertEqual(stats.calls, 1)
+        for phase in ["testbench", "netlist", "compile", "execute", "decode"]:
+            self.assertIn(phase, events)
+            self.assertGreater(stats.last["time"][phase], 0)
+        self.assertEqual(stats.last["processes"], 2)
+        self.assertEqual(stats.last["bytes_written"], 10 * 3)
+        self.assertEqual(stats.last["bytes_read"], 10 * 2)
+
+        simulator.simulate(vectors[:1])
+        self.assertEqual(stats.calls, 2)
+        self.assertEqual(stats.last["time"]["compile"], 0)
+        self.assertEqual(stats.last["processes"], 1)
+        self.assertEqual(stats.total["processes"], 3)
+        self.assertEqual(stats.total["bytes_written"], 11 * 3)
+
+        # Each chunk continues the same call
+        list(simulator.simulate_iter(vectors, chunk_size=3))
+        self.assertEqual(stats.calls, 3)
+        self.assertEqual(stats.last["processes"], 4)
+        self.assertEqual(stats.last["bytes_written"], 10 * 3)
+
+        # Concurrent tasks are counted as separate calls
+        async def gather():
+            return await asyncio.gather(
+                simulator.simulate_async(vectors, 2),
+                simulator.simulate_async(vectors[:1], 1),
+            )
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(gather())
+        finally:
+            loop.close()
+        self.assertEqual(stats.calls, 5)
+        self.assertEqual(stats.total["processes"], 10)
+        simulator.simulate(vectors, num_processes=2)
+        self.assertEqual(stats.calls, 6)
+        self.assertEqual(stats.last["processes"], 2)
+
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_memo(self):
+        c = cg.from_lib("c880")
+        simulator = CircuitSimulator(
+            c, simulator="verilator", cache=self.cache, memo=True
+        )
+        reference = CircuitSimulator(c, simulator="native")
+        vectors = [
+            {i: random.choice([True, False]) for i in simulator.inputs}
+            for _ in range(20)
+        ]
+        self.assertListEqual(
+            simulator.simulate(vectors[:10] + vectors[:5]),
+            reference.simulate(vectors[:10] + vectors[:5]),
+        )
+        self.assertEqual(
+            simulator.stats.last["bytes_written"], 10 * (len(c.inputs()) + 1)
+        )
+        self.assertEqual(simulator.memo.hits, 0)
+        self.assertEqual(len(simulator.memo), 10)
+
+        # Only the misses are simulated, and results keep their order
+        self.assertListEqual(
+            simulator.simulate(vectors[::-1]), reference.simulate(vectors[::-1])
+        )
+        self.assertEqual(
+            simulator.stats.last["bytes_written"], 10 * (len(c.inputs()) + 1)
+        )
+        self.assertEqual(simulator.memo.hits, 10)
+        self.assertEqual(len(simulator.memo), 20)
+        self.assertListEqual(
+            simulator.simulate(vectors[3:4]), reference.simulate(vectors[3:4])
+        )
+        self.assertEqual(simulator.stats.last["processes"], 0)
+
+        # The least recently used results are evicted
+        simulator.memo = ResultCache(max_size=simulator.memo.size // 2)
+        simulator.simulate(vectors)
+        self.assertLessEqual(simulator.memo.size, simulator.memo.max_size)
+        self.assertListEqual(
+            list(simulator.memo.entries.values()),
+            [
+                np.packbits(list(r.values())).tobytes()
+                for r in reference.simulate(vectors[-len(simulator.memo) :])
+            ],
+        )
+
     @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
     def test_simulate_verilator_x(self):
+        self.run_simulation_test_x("verilator")
+
+    def test_simulate_native(self):
+        self.run_simulation_test("native")
+
+    def test_simulate_native_array(self):
+        self.run_simulation_array_test("native")
+        self.run_simulation_array_test("native", packed=True)
+
+    def test_simulate_incremental(self):
+        c = cg.from_lib("c880")
+        simulator = CircuitSimulator(c, simulator="native")
+        inputs = list(c.inputs())
+        vectors = [{i: random.choice([True, False]) for i in inputs}]
+        changes = [{}]
+        for _ in range(200):
+            flips = random.sample(inputs, random.randint(0, 2))
+            changes.append({i: not vectors[-1][i] for i in flips})
+            vectors.append({**vectors[-1], **changes[-1]})
+        expected = simulator.simulate(vectors)
+        self.assertListEqual(
+            simulator.simulate_incremental(vectors[:100]), expected[:100]
+        )
+        # Values are kept across calls, so only changed inputs are needed
+        self.assertListEqual(
+            simulator.simulate_incremental(changes[100:]), expected[100:]
+        )
+        with self.assertRaises(ValueError):
+            simulator.simulate_incremental([{c.outputs().pop(): True}])
         with self.assertRaises(ValueError):
-            self.run_simulation_test_x("verilator")
+            simulator.simulate_incremental([changes[1]], reset=True)
+
+    def test_simulate_faults(self):
+        c = cg.from_lib("c880")
+        simulator = CircuitSimulator(c, simulator="native")
+        vectors = np.random.randint(0, 2, (100, len(simulator.inputs)))
+        good = simulator.simulate_array(vectors)
+        faults = [(n, v) for n in random.sample(list(c.nodes()), 20) for v in [0, 1]]
+        detections = simulator.simulate_faults(vectors, faults, drop=False)
+        first_detections = simulator.simulate_faults(vectors, faults)
+        # Compare against simulating a mutated copy of the circuit
+        for n, v in faults:
+            m = c.copy()
+            m.disconnect(m.fanin(n), n)
+            m.set_type(n, str(v))
+            m_simulator = CircuitSimulator(m, simulator="native")
+            m_vectors = vectors[
+                :, [simulator.inputs.index(i) for i in m_simulator.inputs]
+            ]
+            bad = m_simulator.simulate_array(m_vectors)
+            bad = bad[:, [m_simulator.outputs.index(o) for o in simulator.outputs]]
+            expected = np.flatnonzero((bad != good).any(axis=1)).tolist()
+            self.assertListEqual(
+                [k for k, d in enumerate(detections) if (n, v) in d], expected
+            )
+            self.assertListEqual(
+                [k for k, d in enumerate(first_detections) if (n, v) in d],
+                expected[:1],
+            )
+        all_faults = simulator.simulate_faults(vectors[:10])
+        self.assertEqual(len(all_faults), 10)
+        with self.assertRaises(ValueError):
+            simulator.simulate_faults(vectors, [("not_a_node", 0)])
+        # The fault simulator can still be used as a native simulator
+        dict_vectors = [dict(zip(simulator.inputs, v)) for v in vectors.tolist()]
+        self.assertListEqual(
+            simulator.fault_simulator.simulate(dict_vectors),
+            simulator.simulate(dict_vectors),
+        )
+
+    def test_simulate_activity(self):
+        c = cg.from_lib("c880")
+        simulator = CircuitSimulator(c, simulator="native")
+        vectors = np.random.randint(0, 2, (300, len(simulator.inputs)))
+        vectors[::3] = vectors[0]
+        values = simulator.simulate_array(vectors, observe=simulator.nets)
+        values = values[:, len(simulator.outputs) :].astype(int)
+        # Use chunks that split words to exercise carrying values across them
+        toggles, probabilities = simulator.simulate_activity(vectors, chunk_size=100)
+        self.assertListEqual(
+            [toggles[n] for n in simulator.nets],
+            np.abs(np.diff(values, axis=0)).sum(axis=0).tolist(),
+        )
+        self.assertTrue(
+            np.allclose([probabilities[n] for n in simulator.nets], values.mean(axis=0))
+        )
+
+    def test_simulate_iter(self):
+        c = cg.from_lib("c880")
+        simulator = CircuitSimulator(c, simulator="native")
+        vectors = [
+            {i: random.choice([True, False]) for i in c.inputs()} for _ in range(250)
+        ]
+        consumed = []
+
+        def generate():
+            for vector in vectors:
+                consumed.append(vector)
+                yield vector
+
+        results = simulator.simulate_iter(generate(), chunk_size=100)
+        self.assertEqual(len(consumed), 0)
+        self.assertEqual(next(results), simulator.simulate(vectors[:1])[0])
+        self.assertEqual(len(consumed), 100)
+        self.assertListEqual(
+            [next(results)] + list(results), simulator.simulate(vectors[1:])
+        )
+        self.assertEqual(len(consumed), 250)
+
+    def test_simulate_native_x(self):
+        self.run_simulation_test_x("native")
+
+    def test_simulate_native_constants(self):
+        c = cg.Circuit()
+        c.add("i0", "input")
+        c.add("one", "1")
+        c.add("zero", "0")
+        c.add("g0", "and", fanin=["i0", "one"], output=True)
+        c.add("g1", "or", fanin=["i0", "zero"], output=True)
+        c.add("g2", "nand", fanin=["one", "zero"], output=True)
+        simulator = CircuitSimulator(c, simulator="native")
+        vectors = [{"i0": i % 3 == 0} for i in range(130)]
+        for vector, sim_result in zip(vectors, simulator.simulate(vectors)):
+            self.assertDictEqual(
+                {"g0": vector["i0"], "g1": vector["i0"], "g2": True}, sim_result
+            )
 
     @unittest.skipIf(shutil.which("iverilog") is None, "iverilog not installed")
     def test_bad_vectors(self):
@@ -107,3 +1187,53 @@ class TestSimulation(unittest.TestCase):
         simulator = CircuitSimulator(c, tmpdir)
         self.assertRaises(ValueError, simulator.simulate, [{i: True}])
         shutil.rmtree(tmpdir)
+
+    def test_bad_vectors_native(self):
+        c = cg.from_lib("c880")
+        i = c.inputs().pop()
+        simulator = CircuitSimulator(c, simulator="native")
+        self.assertRaises(ValueError, simulator.simulate, [{i: True}])
+        self.assertRaises(
+            ValueError, simulator.simulate, [{i: "2" for i in c.inputs()}]
+        )
+
+    @unittest.skipIf(shutil.which("verilator") is None, "verilator not installed")
+    def test_compile_cache(self):
+        tmpdir = tempfile.mkdtemp(prefix="circuitsim_TestSimulation_test_compile_cache")
+        cache = CompileCache(f"{tmpdir}/cache")
+        c = cg.from_lib("c17")
+        vectors = [{i: random.choice([True, False]) for i in c.inputs()}]
+        results = []
+        for p in range(2):
+            simulator = CircuitSimulator(
+                c, f"{tmpdir}/sim_{p}", simulator="verilator", cache=cache
+            )
+            results.append(simulator.simulate(vectors))
+        self.assertEqual(results[0], results[1])
+        self.assertTrue(Path(f"{tmpdir}/sim_0/compile.log").exists())
+        self.assertFalse(Path(f"{tmpdir}/sim_1/compile.log").exists())
+        self.assertEqual(len(list(cache.path.iterdir())), 1)
+        shutil.rmtree(tmpdir)
+
+    def test_compile_cache_eviction(self):
+        tmpdir = Path(
+            tempfile.mkdtemp(prefix="circuitsim_TestSimulation_test_compile_cache")
+        )
+        cache = CompileCache(tmpdir / "cache", max_size=250)
+        for key in ["a", "b", "c"]:
+            (tmpdir / key).mkdir()
+            with open(tmpdir / key / "a.out", "w") as f:
+                f.write(key * 100)
+        cache.store("a", "iverilog", tmpdir / "a")
+        time.sleep(0.01)
+        cache.store("b", "iverilog", tmpdir / "b")
+        time.sleep(0.01)
+        # Using "a" makes "b" the least recently used entry
+        self.assertTrue(cache.fetch("a", "iverilog", tmpdir / "c"))
+        time.sleep(0.01)
+        cache.store("c", "iverilog", tmpdir / "b")
+        self.assertEqual({e.name for e in cache.path.iterdir()}, {"a", "c"})
+        with open(tmpdir / "c" / "a.out") as f:
+            self.assertEqual(f.read(), "a" * 100)
+        self.assertFalse(cache.fetch("b", "iverilog", tmpdir / "c"))
+        shutil.rmtree(tmpdir)